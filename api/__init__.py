@@ -2,3 +2,4 @@
 Implement a REST-ful API interface.
 
 """
+default_app_config = 'api.apps.Config'
@@ -0,0 +1,46 @@
+"""
+Default settings values for the :py:mod:`api` application.
+
+"""
+# Variables whose names are in upper case and do not start with an underscore from this module are
+# used as default settings for the api application. See apps.Config for how this is achieved. This
+# is a bit mucky but, at the moment, Django does not have a standard way to specify default values
+# for settings. See: https://stackoverflow.com/questions/8428556/
+
+API_RESPONSE_CACHE_ALIAS = 'default'
+"""
+Name of the Django cache used to share API responses to anonymous users between requests. The
+cache must be shared by all web and Celery worker processes since responses are invalidated by
+whichever process changes the objects they depend on. See :py:mod:`api.responsecache`.
+
+"""
+
+API_RESPONSE_CACHE_TTL = 60
+"""
+Number of seconds a response to an anonymous user is cached for. Cached responses are invalidated
+when the objects they depend on change and so this bounds how long changes made outside of the
+ORM may take to appear. Setting this to zero disables the response cache.
+
+"""
+
+API_SEARCH_CACHE_ALIAS = 'default'
+"""
+Name of the Django cache used to share ranked search results between requests. See
+:py:class:`api.views.FullTextSearchFilter`.
+
+"""
+
+API_SEARCH_CACHE_TTL = 60
+"""
+Number of seconds the ranked list of matches for a search is cached for. Subsequent pages of
+results for the same search are served from this list and so objects which start to match a
+search may take this long to appear in its results. Setting this to zero disables the cache.
+
+"""
+
+API_SEARCH_MAX_CANDIDATES = 1000
+"""
+Maximum number of matching objects which are returned for a search. All matching objects are
+ranked and, if more objects match, only the highest ranked are returned.
+
+"""
@@ -0,0 +1,181 @@
+"""
+The ``benchmarkqueries`` management command times the main querysets used by the API views and
+records the query plan of each as reported by ``EXPLAIN (ANALYZE, BUFFERS)``. Each queryset is
+run as a number of personas:
+
+anonymous
+    A user who has not signed in.
+
+signed_in
+    A signed in user who is a member of a handful of lookup groups and a single institution.
+
+group_heavy
+    A signed in user who is a member of many lookup groups and institutions.
+
+superuser
+    A user who can view and edit everything.
+
+Group and institution memberships are drawn from those used by ``generate_synthetic_catalogue``
+and so the benchmark is most meaningful when run against a database populated by that command.
+Lookup is not consulted; memberships are provided by the local lookup stand-in. See
+:py:data:`~mediaplatform.defaultsettings.IDENTITY_LOCAL_PEOPLE`.
+
+Results are written as JSON so that they may be compared between commits.
+
+"""
+import json
+import statistics
+import time
+import types
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from api import views
+from mediaplatform import models as mpmodels
+from mediaplatform.management.commands import generate_synthetic_catalogue as catalogue
+
+
+#: The lookup person resources for the signed in personas.
+PEOPLE = {
+    catalogue.CRSIDS[0]: {
+        'groups': [{'groupid': groupid} for groupid in catalogue.GROUPIDS[:5]],
+        'institutions': [{'instid': catalogue.INSTIDS[0]}],
+    },
+    catalogue.CRSIDS[1]: {
+        'groups': [{'groupid': groupid} for groupid in catalogue.GROUPIDS[:200]],
+        'institutions': [{'instid': instid} for instid in catalogue.INSTIDS[:10]],
+    },
+}
+
+#: Number of objects fetched by the list querysets. This matches the API page size.
+PAGE_SIZE = views.ListPagination.page_size
+
+
+def _personas():
+    """
+    Return a sequence of persona name, user pairs. Users are unsaved. Signed in personas are
+    inactive so that checking their Django permissions needs no database queries.
+
+    """
+    User = get_user_model()
+    return [
+        ('anonymous', AnonymousUser()),
+        ('signed_in', User(username=catalogue.CRSIDS[0], is_active=False)),
+        ('group_heavy', User(username=catalogue.CRSIDS[1], is_active=False)),
+        ('superuser', User(username='synadmin', is_active=True, is_superuser=True)),
+    ]
+
+
+def _querysets(view):
+    """
+    Return a sequence of name, queryset pairs for the querysets used by the API views when
+    accessed by the request user of *view*.
+
+    """
+    return [
+        ('media_item_list', (
+            view.filter_media_item_qs(mpmodels.MediaItem.objects)
+            .order_by('-published_at', '-id')[:PAGE_SIZE]
+        )),
+        ('channel_list', (
+            view.add_channel_detail(view.filter_channel_qs(mpmodels.Channel.objects))
+            .order_by('-updated_at', '-id')[:PAGE_SIZE]
+        )),
+        ('playlist_list', (
+            view.add_playlist_detail(view.filter_playlist_qs(mpmodels.Playlist.objects))
+            .order_by('-updated_at', '-id')[:PAGE_SIZE]
+        )),
+        ('profile_channels', view.get_profile_channels()),
+    ]
+
+
+class Command(BaseCommand):
+    help = 'Time the API view querysets and record their query plans.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--repeat', type=int, default=10,
+            help='Number of times each queryset is timed (default: 10)')
+        parser.add_argument(
+            '--label', default='',
+            help='Label recorded in the results, e.g. a commit id (default: none)')
+        parser.add_argument(
+            '--output', default='-',
+            help='File to write JSON results to or "-" for standard output (default: "-")')
+        parser.add_argument(
+            '--no-explain', action='store_false', dest='explain',
+            help='Do not record query plans')
+
+    def handle(self, *args, **options):
+        if options['repeat'] < 1:
+            raise CommandError('--repeat must be at least 1')
+
+        results = {
+            'label': options['label'],
+            'created_at': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'media_item_viewable_strategy': settings.MEDIA_ITEM_VIEWABLE_STRATEGY,
+            'counts': {
+                'media_items': mpmodels.MediaItem.objects.count(),
+                'channels': mpmodels.Channel.objects.count(),
+                'playlists': mpmodels.Playlist.objects.count(),
+            },
+            'benchmarks': [],
+        }
+
+        with override_settings(IDENTITY_LOCAL_PEOPLE=PEOPLE, IDENTITY_CACHE_TTL=0):
+            for persona, user in _personas():
+                view = views.ViewMixinBase()
+                view.request = types.SimpleNamespace(user=user)
+                for name, qs in _querysets(view):
+                    results['benchmarks'].append(
+                        self._benchmark(persona, name, qs, options['repeat'], options['explain']))
+
+        out = json.dumps(results, indent=2)
+        if options['output'] == '-':
+            self.stdout.write(out)
+        else:
+            with open(options['output'], 'w') as fobj:
+                fobj.write(out)
+
+        for benchmark in results['benchmarks']:
+            self.stderr.write(
+                '{persona:>12} {query:<18} {median_ms:9.2f}ms ({rows} rows)'.format(**benchmark))
+
+    def _benchmark(self, persona, name, qs, repeat, explain):
+        """
+        Time evaluating *qs* *repeat* times and return a dictionary describing the result.
+
+        """
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            rows = len(qs.all())
+            timings.append(1e3 * (time.perf_counter() - start))
+
+        benchmark = {
+            'persona': persona,
+            'query': name,
+            'rows': rows,
+            'timings_ms': timings,
+            'median_ms': statistics.median(timings),
+            'min_ms': min(timings),
+            'sql': str(qs.query),
+        }
+
+        if explain:
+            # QuerySet.explain() formats each row of output as text which mangles JSON plans and so
+            # we run EXPLAIN ourselves.
+            sql, params = qs.query.sql_with_params()
+            with connection.cursor() as cursor:
+                cursor.execute('EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) ' + sql, params)
+                plan = cursor.fetchone()[0]
+            benchmark['plan'] = json.loads(plan) if isinstance(plan, str) else plan
+
+        return benchmark
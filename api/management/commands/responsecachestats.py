@@ -0,0 +1,30 @@
+"""
+The ``responsecachestats`` management command prints the counters recorded by the shared API
+response cache. See :py:mod:`api.responsecache`. The counters cover all processes which share the
+cache.
+
+"""
+from django.core.management.base import BaseCommand
+
+from api import responsecache
+
+
+class Command(BaseCommand):
+    help = 'Print hit, miss and invalidation counts for the API response cache.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reset', action='store_true', default=False,
+            help='Reset the counters after printing them')
+
+    def handle(self, *args, **options):
+        stats = responsecache.get_stats()
+        hit_ratio = stats['hit_ratio']
+        self.stdout.write(f'Hits: {stats["hits"]}')
+        self.stdout.write(f'Misses: {stats["misses"]}')
+        self.stdout.write(
+            'Hit ratio: ' + (f'{hit_ratio:.3f}' if hit_ratio is not None else 'n/a'))
+        self.stdout.write(f'Invalidations: {stats["invalidations"]}')
+
+        if options['reset']:
+            responsecache.reset_stats()
@@ -0,0 +1,42 @@
+import json
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+
+class BenchmarkQueriesTest(TestCase):
+    """
+    Tests for the benchmarkqueries management command.
+
+    """
+    fixtures = ['mediaplatform/tests/fixtures/test_data.yaml']
+
+    def test_benchmark(self):
+        """Each queryset is benchmarked for each persona and a query plan recorded."""
+        out = StringIO()
+        call_command('benchmarkqueries', '--repeat=2', '--label=test', stdout=out,
+                     stderr=StringIO())
+        results = json.loads(out.getvalue())
+
+        self.assertEqual(results['label'], 'test')
+        self.assertEqual(
+            {(benchmark['persona'], benchmark['query']) for benchmark in results['benchmarks']},
+            {
+                (persona, query)
+                for persona in ['anonymous', 'signed_in', 'group_heavy', 'superuser']
+                for query in [
+                    'media_item_list', 'channel_list', 'playlist_list', 'profile_channels']
+            }
+        )
+        for benchmark in results['benchmarks']:
+            self.assertEqual(len(benchmark['timings_ms']), 2)
+            self.assertIn('Plan', benchmark['plan'][0])
+
+    def test_no_explain(self):
+        """Query plans are not recorded if --no-explain is passed."""
+        out = StringIO()
+        call_command('benchmarkqueries', '--repeat=1', '--no-explain', stdout=out,
+                     stderr=StringIO())
+        for benchmark in json.loads(out.getvalue())['benchmarks']:
+            self.assertNotIn('plan', benchmark)
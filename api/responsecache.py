@@ -0,0 +1,291 @@
+"""
+A cache of API responses to anonymous users shared by all processes.
+
+Most API traffic is anonymous browsing of the media item, channel and playlist endpoints. All
+anonymous users are shown the same representation of a resource and so views which use
+:py:class:`api.views.ResponseCacheMixin` store their rendered responses to anonymous GET requests
+in the Django cache named by :py:data:`API_RESPONSE_CACHE_ALIAS
+<api.defaultsettings.API_RESPONSE_CACHE_ALIAS>` for :py:data:`API_RESPONSE_CACHE_TTL
+<api.defaultsettings.API_RESPONSE_CACHE_TTL>` seconds. Responses are keyed by the absolute URL
+of the request with a normalised query string and by the negotiated media type.
+
+Each cached response is associated with one or more *tags* naming the kinds of object it depends
+on. The cache key includes the current version of each tag and so changing the version of a tag
+invalidates every response associated with it. Versions are changed by :py:func:`invalidate`
+which is called automatically:
+
+1. when a :py:class:`~mediaplatform.models.MediaItem`, :py:class:`~mediaplatform.models.Channel`,
+   :py:class:`~mediaplatform.models.Playlist` or :py:class:`~mediaplatform.models.Permission` is
+   saved or deleted, and
+
+2. when the :py:data:`mediaplatform.signals.bulk_change` or
+   :py:data:`mediaplatform.signals.media_items_changed` signals are sent, for example at the end of
+   the JWP sync.
+
+Invalidations are made by whichever process changes the objects, including Celery workers, and
+so the cache must be shared by every process. The default cache configured by the project settings
+is stored in the database. A per-process cache, such as Django's local memory cache, would
+continue to serve responses after they had been invalidated by another process.
+
+Hits, misses and invalidations are counted in the cache so that the counts cover all processes
+which share it. See :py:func:`get_stats`.
+
+"""
+import hashlib
+import secrets
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+
+from mediaplatform import models as mpmodels
+from mediaplatform import signals as mpsignals
+
+
+#: Tag for responses which depend on media items.
+TAG_MEDIA = 'media'
+
+#: Tag for responses which depend on channels.
+TAG_CHANNELS = 'channels'
+
+#: Tag for responses which depend on playlists.
+TAG_PLAYLISTS = 'playlists'
+
+#: All tags.
+ALL_TAGS = (TAG_MEDIA, TAG_CHANNELS, TAG_PLAYLISTS)
+
+#: Names of the counters returned by get_stats().
+_STAT_NAMES = ('hits', 'misses', 'invalidations')
+
+
+def is_cacheable(request):
+    """
+    Return True if the response to the passed DRF request may be served from, and stored in, the
+    response cache.
+
+    """
+    return (
+        _enabled() and request.method in ('GET', 'HEAD') and
+        (request.user is None or request.user.is_anonymous)
+    )
+
+
+def get(request, tags):
+    """
+    Look up the response to the passed DRF request, which must be cacheable, in the response
+    cache. *tags* is a sequence of tags which the response depends on.
+
+    Returns a tuple giving the key which should be passed to :py:func:`store` and a Django
+    response or ``None`` if there was no cached response. If the request is a conditional GET
+    which matches the cached response, a "304 Not Modified" response is returned.
+
+    """
+    key = _response_key(request, tags)
+    cached = _cache().get(key)
+    if cached is None:
+        _count('misses')
+        return key, None
+
+    _count('hits')
+
+    headers = dict(cached['headers'])
+    last_modified = headers.get('Last-Modified')
+    conditional_response = get_conditional_response(
+        request, etag=headers.get('ETag'),
+        last_modified=parse_http_date_safe(last_modified) if last_modified is not None else None)
+    if conditional_response is not None:
+        return key, conditional_response
+
+    response = HttpResponse(cached['content'], status=cached['status'])
+    for name, value in headers.items():
+        response[name] = value
+    return key, response
+
+
+def store(key, response):
+    """
+    Store a rendered response under a key returned by :py:func:`get`. Only successful responses
+    are stored.
+
+    """
+    if response.status_code != 200:
+        return
+
+    _cache().set(key, {
+        'status': response.status_code,
+        'content': response.content,
+        'headers': list(response.items()),
+    }, settings.API_RESPONSE_CACHE_TTL)
+
+
+def invalidate(tags=ALL_TAGS):
+    """
+    Invalidate all cached responses associated with any of the passed tags.
+
+    If called within a transaction, the tags are invalidated immediately and again once the
+    transaction commits. This discards responses rendered by other processes from the data as it
+    was before the commit.
+
+    """
+    if not _enabled():
+        return
+
+    _count('invalidations')
+    _bump_versions(tags)
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(lambda: _bump_versions(tags))
+
+
+def get_stats():
+    """
+    Return a dictionary of counters recording how the response cache has been used by all
+    processes which share it. The keys are "hits", "misses", "invalidations" and "hit_ratio". The
+    hit ratio is ``None`` if there have been no lookups.
+
+    """
+    cache = _cache()
+    counts = cache.get_many([_stat_key(name) for name in _STAT_NAMES])
+    stats = {name: counts.get(_stat_key(name), 0) for name in _STAT_NAMES}
+    lookups = stats['hits'] + stats['misses']
+    stats['hit_ratio'] = stats['hits'] / lookups if lookups > 0 else None
+    return stats
+
+
+def reset_stats():
+    """
+    Reset the counters returned by :py:func:`~.get_stats`.
+
+    """
+    _cache().delete_many([_stat_key(name) for name in _STAT_NAMES])
+
+
+@receiver(post_save, sender=mpmodels.MediaItem)
+@receiver(post_delete, sender=mpmodels.MediaItem)
+@receiver(post_save, sender=mpmodels.Channel)
+@receiver(post_delete, sender=mpmodels.Channel)
+def _media_item_or_channel_changed_handler(*args, **kwargs):
+    """
+    Called when a media item or channel is saved or deleted. Channel representations include their
+    item counts and media item and playlist representations include their channel and so all
+    responses are invalidated.
+
+    """
+    invalidate(ALL_TAGS)
+
+
+@receiver(post_save, sender=mpmodels.Playlist)
+@receiver(post_delete, sender=mpmodels.Playlist)
+def _playlist_changed_handler(*args, **kwargs):
+    """
+    Called when a playlist is saved or deleted.
+
+    """
+    invalidate([TAG_PLAYLISTS])
+
+
+@receiver(post_save, sender=mpmodels.Permission)
+@receiver(post_delete, sender=mpmodels.Permission)
+def _permission_changed_handler(*args, instance, **kwargs):
+    """
+    Called when a permission is saved or deleted. Only responses depending on the object the
+    permission belongs to are invalidated.
+
+    """
+    if instance.allows_view_playlist_id is not None:
+        invalidate([TAG_PLAYLISTS])
+    elif instance.allows_create_channel_on_billing_account_id is not None:
+        # Billing accounts are not cached.
+        pass
+    else:
+        invalidate(ALL_TAGS)
+
+
+@receiver(mpsignals.bulk_change)
+@receiver(mpsignals.media_items_changed)
+def _bulk_change_handler(*args, **kwargs):
+    """
+    Called when objects have been changed in bulk. Anything may have changed and so all responses
+    are invalidated.
+
+    """
+    invalidate(ALL_TAGS)
+
+
+def _enabled():
+    """Return True if the response cache is enabled."""
+    return settings.API_RESPONSE_CACHE_TTL > 0
+
+
+def _cache():
+    """Return the Django cache used to share responses between requests."""
+    return caches[settings.API_RESPONSE_CACHE_ALIAS]
+
+
+def _response_key(request, tags):
+    """
+    Return the key used to cache the response to the passed request given the current versions of
+    the passed tags. The query string is normalised by sorting it by parameter name.
+
+    """
+    query = urlencode(sorted(request.GET.lists()), doseq=True)
+    versions = _tag_versions(tags)
+    digest = hashlib.sha1(repr((
+        request.build_absolute_uri(request.path), query, request.accepted_media_type,
+        [versions[tag] for tag in sorted(tags)],
+    )).encode('utf8')).hexdigest()
+    return f'api:responsecache:response:{digest}'
+
+
+def _tag_versions(tags):
+    """
+    Return a dictionary mapping each of the passed tags to its current version. Tags which have no
+    version are given one.
+
+    """
+    cache = _cache()
+    keys = {tag: _tag_key(tag) for tag in tags}
+    versions = cache.get_many(keys.values())
+    for key in keys.values():
+        if key not in versions:
+            # Another process may set the version at the same time and so re-read it.
+            cache.add(key, _new_version(), None)
+            versions[key] = cache.get(key)
+    return {tag: versions[key] for tag, key in keys.items()}
+
+
+def _bump_versions(tags):
+    """Give each of the passed tags a new version."""
+    _cache().set_many({_tag_key(tag): _new_version() for tag in tags}, None)
+
+
+def _new_version():
+    """Return a new random tag version."""
+    return secrets.token_hex(8)
+
+
+def _tag_key(tag):
+    """Return the key used to store the version of the passed tag."""
+    return f'api:responsecache:tag:{tag}'
+
+
+def _count(name):
+    """Increment the shared counter with the passed name."""
+    cache = _cache()
+    key = _stat_key(name)
+    if not cache.add(key, 1, None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            # The counter was evicted between add() and incr(). Losing one count is harmless.
+            pass
+
+
+def _stat_key(name):
+    """Return the key used to store the shared counter with the passed name."""
+    return f'api:responsecache:stats:{name}'
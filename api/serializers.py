@@ -33,7 +33,20 @@ class RelatedBillingAccountIdField(serializers.PrimaryKeyRelatedField):
         return mpmodels.BillingAccount.objects.all().channels_creatable_by_user(user)
 
 
-class ChannelSerializer(serializers.HyperlinkedModelSerializer):
+class SparseFieldsetMixin:
+    """
+    A mixin for serializers which accepts an additional *fields* keyword argument. If passed, it is
+    a collection of field names and only those fields are present on the serializer.
+
+    """
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
+class ChannelSerializer(SparseFieldsetMixin, serializers.HyperlinkedModelSerializer):
     """
     An individual channel.
 
@@ -109,7 +122,8 @@ class RelatedChannelIdField(serializers.PrimaryKeyRelatedField):
         return mpmodels.Channel.objects.all().editable_by_user(user)
 
 
-class ChannelOwnedResourceModelSerializer(serializers.HyperlinkedModelSerializer):
+class ChannelOwnedResourceModelSerializer(
+        SparseFieldsetMixin, serializers.HyperlinkedModelSerializer):
     """
     Shared ModelSerializer between Media Items and Playlists as both are owned by a channel
 
@@ -240,7 +254,7 @@ class MediaItemSerializer(ChannelOwnedResourceModelSerializer):
         return uri
 
 
-class BillingAccountSerializer(serializers.HyperlinkedModelSerializer):
+class BillingAccountSerializer(SparseFieldsetMixin, serializers.HyperlinkedModelSerializer):
     """
     An individual billing account.
 
@@ -435,6 +449,84 @@ class ProfileSerializer(serializers.Serializer):
         return None
 
 
+class BatchPermissionCheckSerializer(serializers.Serializer):
+    """
+    A request to check the permissions of the current user on a batch of objects. The response is
+    rendered by :py:class:`~.BatchPermissionCheckResultSerializer`.
+
+    """
+    #: Maximum number of ids of each type which may be checked in one request.
+    MAX_IDS = 300
+
+    mediaItems = serializers.ListField(
+        child=serializers.CharField(), default=list, help_text='Ids of media items to check')
+    channels = serializers.ListField(
+        child=serializers.CharField(), default=list, help_text='Ids of channels to check')
+    playlists = serializers.ListField(
+        child=serializers.CharField(), default=list, help_text='Ids of playlists to check')
+
+    def validate(self, data):
+        for name, ids in data.items():
+            if len(ids) > self.MAX_IDS:
+                raise serializers.ValidationError(
+                    {name: f'At most {self.MAX_IDS} ids may be checked at once.'})
+        return data
+
+
+class PermissionFlagsSerializer(serializers.Serializer):
+    """
+    The permissions the current user has on a channel or playlist.
+
+    """
+    viewable = serializers.BooleanField(help_text='Can the user view the object?')
+    editable = serializers.BooleanField(help_text='Can the user edit the object?')
+
+
+class MediaItemPermissionFlagsSerializer(PermissionFlagsSerializer):
+    """
+    The permissions the current user has on a media item.
+
+    """
+    downloadable = serializers.BooleanField(help_text='Can the user download the media item?')
+
+
+class BatchPermissionCheckResultSerializer(serializers.Serializer):
+    """
+    The result of checking the permissions of the current user on a batch of objects. Each field
+    is a map from requested id to the permissions the user has on that object.
+
+    """
+    mediaItems = serializers.DictField(
+        child=MediaItemPermissionFlagsSerializer(),
+        help_text='Map of media item id to permission flags')
+    channels = serializers.DictField(
+        child=PermissionFlagsSerializer(), help_text='Map of channel id to permission flags')
+    playlists = serializers.DictField(
+        child=PermissionFlagsSerializer(), help_text='Map of playlist id to permission flags')
+
+
+class SearchSuggestionSerializer(serializers.Serializer):
+    """
+    A suggested title for a search.
+
+    """
+    id = serializers.CharField(help_text='Unique id of the object with this title')
+    title = serializers.CharField()
+
+
+class SearchSuggestionsSerializer(serializers.Serializer):
+    """
+    Suggested completions for a partially typed search.
+
+    """
+    mediaItems = SearchSuggestionSerializer(
+        source='media_items', many=True, help_text='Media items whose titles match')
+    channels = SearchSuggestionSerializer(many=True, help_text='Channels whose titles match')
+    playlists = SearchSuggestionSerializer(many=True, help_text='Playlists whose titles match')
+    tags = serializers.ListField(
+        child=serializers.CharField(), help_text='Tags which match, most used first')
+
+
 class BillingAccountDetailSerializer(BillingAccountSerializer):
     """
     An individual billing account including related resources.
@@ -0,0 +1,142 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+import mediaplatform.models as mpmodels
+from mediaplatform import signals as mpsignals
+
+from .. import responsecache, views
+
+
+@override_settings(API_RESPONSE_CACHE_TTL=60)
+class ResponseCacheTestCase(TestCase):
+    fixtures = ['api/tests/fixtures/mediaitems.yaml']
+
+    def setUp(self):
+        cache.clear()
+        self.factory = APIRequestFactory()
+        self.user = get_user_model().objects.get(pk=1)
+        self.view = views.ChannelListView().as_view()
+
+        self.get_person_patcher = mock.patch('automationlookup.get_person')
+        self.get_person = self.get_person_patcher.start()
+        self.get_person.return_value = {
+            'institutions': [{'instid': 'UIS'}],
+            'groups': [{'groupid': '12345', 'name': 'uis-members'}]
+        }
+        self.addCleanup(self.get_person_patcher.stop)
+
+    def test_anonymous_responses_cached(self):
+        """A second anonymous request is served from the cache."""
+        first = self.view(self.factory.get('/'))
+        self.assertEqual(first.status_code, 200)
+        first.render()
+        self.assertEqual(responsecache.get_stats()['misses'], 1)
+
+        second = self.view(self.factory.get('/'))
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second['ETag'], first['ETag'])
+        self.assertEqual(responsecache.get_stats()['hits'], 1)
+        self.assertEqual(responsecache.get_stats()['hit_ratio'], 0.5)
+
+    def test_query_string_normalised(self):
+        """The order of query parameters does not affect the cache key."""
+        self.view(self.factory.get('/?ordering=title&page_size=2'))
+        self.view(self.factory.get('/?page_size=2&ordering=title'))
+        self.assertEqual(responsecache.get_stats()['hits'], 1)
+
+    def test_signed_in_responses_not_cached(self):
+        """Requests from signed in users do not use the cache."""
+        for _ in range(2):
+            request = self.factory.get('/')
+            force_authenticate(request, user=self.user)
+            self.view(request)
+        stats = responsecache.get_stats()
+        self.assertEqual(stats['hits'] + stats['misses'], 0)
+
+    def test_conditional_get_on_hit(self):
+        """A cached response answers conditional requests."""
+        etag = self.view(self.factory.get('/'))['ETag']
+        response = self.view(self.factory.get('/', HTTP_IF_NONE_MATCH=etag))
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(responsecache.get_stats()['hits'], 1)
+
+    def test_invalidated_on_save(self):
+        """Saving a channel invalidates cached responses."""
+        self.view(self.factory.get('/'))
+        channel = mpmodels.Channel.objects.get(id='channel1')
+        channel.title = 'changed'
+        channel.save()
+
+        response = self.view(self.factory.get('/'))
+        self.assertIn('changed', [c['title'] for c in response.data['results']])
+        self.assertEqual(responsecache.get_stats()['hits'], 0)
+        self.assertGreater(responsecache.get_stats()['invalidations'], 0)
+
+    def test_playlist_save_does_not_invalidate_channels(self):
+        """Saving a playlist does not invalidate channel responses."""
+        self.view(self.factory.get('/'))
+        mpmodels.Playlist.objects.get(id='public').save()
+        self.view(self.factory.get('/'))
+        self.assertEqual(responsecache.get_stats()['hits'], 1)
+
+    def test_invalidated_on_bulk_change(self):
+        """The bulk change signal invalidates cached responses."""
+        self.view(self.factory.get('/'))
+        mpmodels.Channel.objects.filter(id='channel1').update(title='changed')
+        mpsignals.bulk_change.send(sender=self.__class__)
+        response = self.view(self.factory.get('/'))
+        self.assertIn('changed', [c['title'] for c in response.data['results']])
+
+    def test_disabled(self):
+        """Setting the TTL to zero disables the cache."""
+        with self.settings(API_RESPONSE_CACHE_TTL=0):
+            for _ in range(2):
+                self.view(self.factory.get('/'))
+        stats = responsecache.get_stats()
+        self.assertEqual(stats['hits'] + stats['misses'], 0)
+
+
+@override_settings(API_RESPONSE_CACHE_TTL=60)
+class ResponseCacheCommitTestCase(TransactionTestCase):
+    """
+    Tests of the invalidation made when a transaction commits. These need real transactions and so
+    cannot use TestCase which wraps each test in a transaction which is never committed.
+
+    """
+    fixtures = ['api/tests/fixtures/mediaitems.yaml']
+
+    def setUp(self):
+        cache.clear()
+        self.factory = APIRequestFactory()
+        self.view = views.ChannelListView().as_view()
+
+    def test_invalidated_again_on_commit(self):
+        """Responses stored while an invalidating transaction is open are discarded on commit."""
+        with transaction.atomic():
+            responsecache.invalidate()
+
+            # Simulate another process storing a response rendered before the commit.
+            self.view(self.factory.get('/'))
+            self.view(self.factory.get('/'))
+            self.assertEqual(responsecache.get_stats()['hits'], 1)
+
+        self.view(self.factory.get('/'))
+        stats = responsecache.get_stats()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 2))
+
+    def test_not_invalidated_again_on_rollback(self):
+        """A transaction which is rolled back does not invalidate responses again."""
+        with transaction.atomic():
+            responsecache.invalidate()
+            self.view(self.factory.get('/'))
+            transaction.set_rollback(True)
+
+        self.view(self.factory.get('/'))
+        stats = responsecache.get_stats()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 1))
@@ -4,9 +4,12 @@ from unittest import mock
 from dateutil import parser as dateparser
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
 from django.http import QueryDict
-from django.test import TestCase
+from django.test import Client, TestCase, override_settings
 from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import http_date
 from rest_framework.authtoken.models import Token
 from rest_framework.test import APIRequestFactory, force_authenticate
 
@@ -14,7 +17,7 @@ import mediaplatform_jwp.api.delivery as api
 import mediaplatform.models as mpmodels
 
 from . import create_stats_table, delete_stats_table, add_stat
-from .. import views
+from .. import serializers, views
 
 
 class ViewTestCase(TestCase):
@@ -133,6 +136,63 @@ class ProfileViewTestCase(ViewTestCase):
         self.assertEqual(expected_ids, received_ids)
 
 
+class SearchSuggestViewTestCase(ViewTestCase):
+    def setUp(self):
+        super().setUp()
+        self.view = views.SearchSuggestView().as_view()
+
+    def test_titles(self):
+        """Titles containing a word starting with the search are suggested if visible."""
+        visible = self.viewable_by_anon.first()
+        visible.title = 'Introduction to bananas'
+        visible.save()
+        hidden = self.non_deleted_media.exclude(
+            id__in=self.viewable_by_anon.values('id')).first()
+        hidden.title = 'Advanced bananas'
+        hidden.save()
+        channel = self.channels.first()
+        channel.title = 'Banana channel'
+        channel.save()
+
+        response = self.view(self.factory.get('/', {'q': 'BANAN'}))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.data['mediaItems'], [{'id': visible.id, 'title': visible.title}])
+        self.assertEqual(
+            response.data['channels'], [{'id': channel.id, 'title': channel.title}])
+
+        # Only matches at the start of a word are suggested.
+        response = self.view(self.factory.get('/', {'q': 'anana'}))
+        self.assertEqual(response.data['mediaItems'], [])
+
+    def test_tags(self):
+        """Tags are suggested from the tag dictionary by visibility."""
+        mpmodels.MediaItemTag.objects.create(
+            key='bananas', name='Bananas', public_count=1, signed_in_count=3)
+        mpmodels.MediaItemTag.objects.create(
+            key='banana bread', name='banana bread', public_count=0, signed_in_count=5)
+
+        response = self.view(self.factory.get('/', {'q': 'ban'}))
+        self.assertEqual(response.data['tags'], ['Bananas'])
+
+        request = self.factory.get('/', {'q': 'ban'})
+        force_authenticate(request, user=self.user)
+        response = self.view(request)
+        self.assertEqual(response.data['tags'], ['banana bread', 'Bananas'])
+
+    def test_short_search(self):
+        """Searches which are too short have no suggestions."""
+        mpmodels.MediaItemTag.objects.create(key='bananas', name='bananas', public_count=1)
+        response = self.view(self.factory.get('/', {'q': 'ba'}))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['tags'], [])
+
+    def test_bad_limit(self):
+        """A non-integer limit is a bad request."""
+        response = self.view(self.factory.get('/', {'q': 'banana', 'limit': 'x'}))
+        self.assertEqual(response.status_code, 400)
+
+
 class MediaItemListViewTestCase(ViewTestCase):
     def setUp(self):
         super().setUp()
@@ -170,6 +230,139 @@ class MediaItemListViewTestCase(ViewTestCase):
         for item in response_data['results']:
             self.assertIn(item['id'], expected_ids)
 
+    def test_conditional_get(self):
+        """A list request with a matching ETag is answered with 304 until the list changes."""
+        response = self.view(self.get_request)
+        self.assertEqual(response.status_code, 200)
+        request = self.factory.get('/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(self.view(request).status_code, 304)
+
+        item = self.viewable_by_anon.first()
+        item.deleted_at = item.created_at
+        item.save()
+        self.assertEqual(self.view(request).status_code, 200)
+
+    def test_conditional_get_permission_change(self):
+        """
+        A list request with a matching ETag is answered with 200 if a permission change changes
+        which items are visible.
+
+        """
+        response = self.view(self.get_request)
+        request = self.factory.get('/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(self.view(request).status_code, 304)
+
+        item = self.viewable_by_anon.first()
+        updated_at = item.updated_at
+        item.view_permission.reset()
+        item.view_permission.save()
+        self.assertEqual(mpmodels.MediaItem.objects.get(id=item.id).updated_at, updated_at)
+
+        response = self.view(request)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn(item.id, [result['id'] for result in response.data['results']])
+
+    def test_no_last_modified(self):
+        """
+        List responses have no Last-Modified time and so If-Modified-Since is not answered with
+        304 after an item is hidden.
+
+        """
+        response = self.view(self.get_request)
+        self.assertNotIn('Last-Modified', response)
+
+        item = self.viewable_by_anon.order_by('updated_at').first()
+        item.view_permission.reset()
+        item.view_permission.save()
+        request = self.factory.get(
+            '/', HTTP_IF_MODIFIED_SINCE=http_date(timezone.now().timestamp()))
+        response = self.view(request)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn(item.id, [result['id'] for result in response.data['results']])
+
+    def test_etag_depends_on_user(self):
+        """Anonymous and signed in users get different ETags."""
+        anon_etag = self.view(self.get_request)['ETag']
+        request = self.factory.get('/')
+        force_authenticate(request, user=self.user)
+        self.assertNotEqual(self.view(request)['ETag'], anon_etag)
+
+    def test_sparse_fieldset(self):
+        """Only the fields named in the fields parameter are rendered."""
+        request = self.factory.get('/', {'fields': 'id, title'})
+        response = self.view(request)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(len(response.data['results']), 0)
+        expected_titles = {o.id: o.title for o in self.viewable_by_anon}
+        for item in response.data['results']:
+            self.assertEqual(set(item.keys()), {'id', 'title'})
+            self.assertEqual(item['title'], expected_titles[item['id']])
+
+    def test_sparse_fieldset_unknown_field(self):
+        """Requesting an unknown field is a bad request."""
+        request = self.factory.get('/', {'fields': 'id,not-a-field'})
+        self.assertEqual(self.view(request).status_code, 400)
+
+    def test_sparse_fieldset_write_only_field(self):
+        """Requesting a write-only field, which is never rendered, is a bad request."""
+        request = self.factory.get('/', {'fields': 'id,channelId'})
+        response = self.view(request)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('channelId', response.data['detail'])
+
+    def test_facets(self):
+        """Facet counts cover all items visible to the user."""
+        request = self.factory.get('/', {'facets': 'type,language,tags,channel', 'page_size': 1})
+        response = self.view(request)
+        self.assertEqual(response.status_code, 200)
+        facets = response.data['facets']
+        self.assertEqual(set(facets.keys()), {'type', 'language', 'tags', 'channel'})
+
+        expected = {'type': {}, 'language': {}, 'tags': {}, 'channel': {}}
+        for item in self.viewable_by_anon:
+            for facet, values in (
+                    ('type', [item.type]), ('language', [item.language]),
+                    ('tags', set(item.tags)), ('channel', [item.channel_id])):
+                for value in values:
+                    if value is not None:
+                        expected[facet][value] = expected[facet].get(value, 0) + 1
+
+        for facet, counts in expected.items():
+            self.assertEqual(
+                {entry['value']: entry['count'] for entry in facets[facet]}, counts)
+            self.assertEqual(
+                [entry['count'] for entry in facets[facet]],
+                sorted((entry['count'] for entry in facets[facet]), reverse=True))
+
+    def test_facets_not_requested(self):
+        """Facets are not counted unless requested."""
+        self.assertNotIn('facets', self.view(self.get_request).data)
+
+    def test_unknown_facet(self):
+        """Requesting an unknown facet is a bad request."""
+        request = self.factory.get('/', {'facets': 'type,not-a-facet'})
+        self.assertEqual(self.view(request).status_code, 400)
+
+    def test_batch_get(self):
+        """Media items may be fetched by id in the requested order with missing ids reported."""
+        viewable_ids = [o.id for o in self.viewable_by_anon.order_by('published_at')]
+        hidden = self.non_deleted_media.exclude(id__in=viewable_ids).first()
+        self.assertIsNotNone(hidden)
+        ids = viewable_ids[:2] + [hidden.id, 'not-an-id']
+
+        request = self.factory.get('/', {'id': ','.join(ids)})
+        response = self.view(request)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item['id'] for item in response.data['results']], viewable_ids[:2])
+        self.assertEqual(response.data['missing'], [hidden.id, 'not-an-id'])
+        self.assertNotIn('Last-Modified', response)
+
+    def test_batch_get_too_many_ids(self):
+        """Requesting more ids than the maximum page size is a bad request."""
+        ids = [f'item{i}' for i in range(views.ListPagination.max_page_size + 1)]
+        request = self.factory.get('/', {'id': ','.join(ids)})
+        self.assertEqual(self.view(request).status_code, 400)
+
     def test_create(self):
         """Basic creation of a media item succeeds."""
         request = self.factory.post('/', {'title': 'foo', 'channelId': self.channel.id})
@@ -319,9 +512,8 @@ class MediaItemListViewTestCase(ViewTestCase):
         results = self.get_search_results('Banana')
         self.assertEqual(results[0]['id'], items[0].id)
 
-        # make item 1 more relevant
-        items[1].description = (
-            'Bananas with bananas can banana the banana. Bruce Banana is not the Hulk')
+        # make item 1 more relevant. Matches in the title are weighted above other matches.
+        items[1].title = 'Bananas: bananas with bananas can banana the banana'
         items[1].save()
 
         # both items should still appear in results
@@ -332,6 +524,80 @@ class MediaItemListViewTestCase(ViewTestCase):
         results = self.get_search_results('Banana')
         self.assertEqual(results[0]['id'], items[1].id)
 
+    def test_search_title_weighted_above_description(self):
+        """Matches in the title rank above matches in the description."""
+        items = mpmodels.MediaItem.objects.all()[:2]
+        for item in items:
+            item.view_permission.is_public = True
+            item.view_permission.save()
+        items[0].description = 'bananas bananas bananas'
+        items[0].save()
+        items[1].title = 'bananas'
+        items[1].save()
+
+        results = self.get_search_results('banana')
+        self.assertEqual(results[0]['id'], items[1].id)
+
+    def test_search_web_syntax(self):
+        """Searches support phrases, negation and prefix matching."""
+        item = mpmodels.MediaItem.objects.first()
+        item.title = 'ripe yellow bananas'
+        item.view_permission.is_public = True
+        item.view_permission.save()
+        item.save()
+        self.assert_search_result(item, positive_query='"yellow banana"')
+        self.assert_search_result(item, negative_query='"banana yellow"')
+        self.assert_search_result(item, negative_query='banana -ripe')
+        self.assert_search_result(item, positive_query='ripe yel', negative_query='ripe yeti')
+
+    def test_search_or(self):
+        """A trailing word which follows "or" is an alternative rather than a required prefix."""
+        items = mpmodels.MediaItem.objects.all()[:2]
+        for item, title in zip(items, ['cats', 'dogs']):
+            item.title = title
+            item.view_permission.is_public = True
+            item.view_permission.save()
+            item.save()
+
+        for item in items:
+            self.assert_search_result(item, positive_query='cats or dogs')
+
+    @override_settings(API_SEARCH_MAX_CANDIDATES=1)
+    def test_search_returns_highest_ranked(self):
+        """If the number of matches is bounded, the highest ranked match is returned."""
+        items = mpmodels.MediaItem.objects.all()[:2]
+        for item, title in zip(items, ['Bananas with bananas', 'some bananas']):
+            item.title = title
+            item.view_permission.is_public = True
+            item.view_permission.save()
+            item.save()
+
+        # item 0 is the older of the two but is the more relevant
+        items[1].save()
+        results = self.get_search_results('banana')
+        self.assertEqual([result['id'] for result in results], [items[0].id])
+
+    @override_settings(API_SEARCH_CACHE_TTL=60)
+    def test_search_ranking_cached(self):
+        """Subsequent pages are served from the cached ranking."""
+        cache.clear()
+        items = mpmodels.MediaItem.objects.all()[:2]
+        for item in items:
+            item.title = 'bananas'
+            item.view_permission.is_public = True
+            item.view_permission.save()
+            item.save()
+
+        request = self.factory.get('/', {'search': 'banana', 'page_size': 1})
+        response = self.view(request)
+        self.assertEqual(len(response.data['results']), 1)
+
+        with mock.patch('api.views.SearchRank') as search_rank:
+            response = self.view(self.factory.get(response.data['next']))
+            search_rank.assert_not_called()
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertIn(response.data['results'][0]['id'], {item.id for item in items})
+
     def assert_search_result(self, item, positive_query=None, negative_query=None):
         # Item should appear in relevant query
         if positive_query is not None:
@@ -364,6 +630,29 @@ class MediaItemViewTestCase(ViewTestCase):
         self.dv_from_key.return_value = api.DeliveryVideo(DELIVERY_VIDEO_FIXTURE)
         self.addCleanup(self.dv_from_key_patcher.stop)
 
+    def test_conditional_get(self):
+        """A request with a matching ETag is answered with 304 without rendering the item."""
+        item = self.non_deleted_media.get(id='populated')
+        response = self.view(self.get_request, pk=item.id)
+        self.assertEqual(response.status_code, 200)
+        self.dv_from_key.reset_mock()
+
+        request = self.factory.get('/', HTTP_IF_NONE_MATCH=response['ETag'])
+        response = self.view(request, pk=item.id)
+        self.assertEqual(response.status_code, 304)
+        self.dv_from_key.assert_not_called()
+
+        item.title = 'changed'
+        item.save()
+        self.assertEqual(self.view(request, pk=item.id).status_code, 200)
+
+    def test_conditional_get_if_modified_since(self):
+        """A request which is not modified since the Last-Modified time is answered with 304."""
+        item = self.non_deleted_media.get(id='populated')
+        response = self.view(self.get_request, pk=item.id)
+        request = self.factory.get('/', HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(self.view(request, pk=item.id).status_code, 304)
+
     def test_success(self):
         """Check that a media item is successfully returned"""
         item = self.non_deleted_media.get(id='populated')
@@ -383,6 +672,16 @@ class MediaItemViewTestCase(ViewTestCase):
         self.assertIsNotNone(response.data['posterImageUrl'])
         self.assertIsNotNone(response.data['duration'])
 
+    def test_sparse_fieldset(self):
+        """Sources are not fetched unless they are requested."""
+        item = self.non_deleted_media.get(id='populated')
+        request = self.factory.get('/', {'fields': 'id,title,channel'})
+        response = self.view(request, pk=item.id)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.data.keys()), {'id', 'title', 'channel'})
+        self.assertEqual(response.data['channel']['id'], item.channel.id)
+        self.dv_from_key.assert_not_called()
+
     def test_video_not_found(self):
         """Check that a 404 is returned if no media is found"""
         response = self.view(self.get_request, pk='this-media-id-does-not-exist')
@@ -546,6 +845,89 @@ class MediaItemViewTestCase(ViewTestCase):
             getattr(self.non_deleted_media.get(id='populated'), model_field_name), original_value)
 
 
+class MediaItemBatchViewTestCase(ViewTestCase):
+    def setUp(self):
+        super().setUp()
+        self.view = views.MediaItemBatchView().as_view()
+        self.item = self.non_deleted_media.get(id='populated')
+        # Remove the associated SMS media items so that editing succeeds
+        self.item.sms.delete()
+        self.channel = self.item.channel
+        self.channel.edit_permission.crsids.append(self.user.username)
+        self.channel.edit_permission.save()
+
+        self.schedule_item_update_patcher = mock.patch(
+            'mediaplatform_jwp.api.management.schedule_item_update')
+        self.schedule_item_update = self.schedule_item_update_patcher.start()
+        self.addCleanup(self.schedule_item_update_patcher.stop)
+
+    def post(self, changes):
+        request = self.factory.post('/', changes, format='json')
+        force_authenticate(request, user=self.user)
+        return self.view(request)
+
+    def test_requires_sign_in(self):
+        """Anonymous users cannot change media items in bulk."""
+        request = self.factory.post('/', [{'title': 'foo', 'channelId': self.channel.id}],
+                                    format='json')
+        self.assertEqual(self.view(request).status_code, 403)
+
+    def test_create_and_update(self):
+        """Items are created and updated with per-item results and no direct JWP update."""
+        response = self.post([
+            {'title': 'new 1', 'channelId': self.channel.id},
+            {'id': self.item.id, 'title': 'changed', 'tags': ['a', 'b']},
+            {'title': 'new 2', 'channelId': self.channel.id},
+        ])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([result['status'] for result in response.data], [201, 200, 201])
+        self.assertEqual(
+            [result['item']['title'] for result in response.data], ['new 1', 'changed', 'new 2'])
+
+        for result in response.data:
+            item = mpmodels.MediaItem.objects.get(id=result['item']['id'])
+            self.assertEqual(item.title, result['item']['title'])
+            self.assertEqual(item.channel.id, self.channel.id)
+        self.assertEqual(mpmodels.MediaItem.objects.get(id=self.item.id).tags, ['a', 'b'])
+
+        new_item = mpmodels.MediaItem.objects.get(id=response.data[0]['item']['id'])
+        self.assertIn(self.user.username, new_item.view_permission.crsids)
+
+        self.schedule_item_update.assert_not_called()
+
+    def test_invalid_change_applies_nothing(self):
+        """If any change is invalid, no change is made."""
+        original_title = self.item.title
+        item_count = mpmodels.MediaItem.objects.count()
+        response = self.post([
+            {'id': self.item.id, 'title': 'changed'},
+            {'title': 'no channel'},
+            {'id': 'not-an-item', 'title': 'changed'},
+        ])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([result['status'] for result in response.data], [424, 400, 400])
+        self.assertIn('channelId', response.data[1]['errors'])
+        self.assertIn('id', response.data[2]['errors'])
+
+        self.assertEqual(mpmodels.MediaItem.objects.get(id=self.item.id).title, original_title)
+        self.assertEqual(mpmodels.MediaItem.objects.count(), item_count)
+
+    def test_cannot_change_channel(self):
+        """The channel of an existing item cannot be changed."""
+        new_channel = mpmodels.Channel.objects.create(
+            title='new channel', billing_account=self.channel.billing_account)
+        new_channel.edit_permission.crsids.append(self.user.username)
+        new_channel.edit_permission.save()
+        response = self.post([{'id': self.item.id, 'channelId': new_channel.id}])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('channelId', response.data[0]['errors'])
+
+    def test_too_many_items(self):
+        """There is a limit on the number of changes in one batch."""
+        response = self.post([{'title': 'x'}] * (views.MediaItemBatchView.max_items + 1))
+        self.assertEqual(response.status_code, 400)
+
+
 class MediaItemSourceViewTestCase(ViewTestCase):
     def setUp(self):
         super().setUp()
@@ -856,6 +1238,15 @@ class ChannelListViewTestCase(ViewTestCase):
         for item in response_data['results']:
             self.assertIn(item['id'], expected_ids)
 
+    def test_batch_get(self):
+        """Channels may be fetched by id in the requested order."""
+        ids = [o.id for o in self.channels.order_by('-id')]
+        request = self.factory.get('/', {'id': ','.join(ids)})
+        response = self.view(request)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item['id'] for item in response.data['results']], ids)
+        self.assertEqual(response.data['missing'], [])
+
     def test_search_by_title(self):
         """Channels can be searched by title."""
         channel = mpmodels.Channel.objects.first()
@@ -888,9 +1279,8 @@ class ChannelListViewTestCase(ViewTestCase):
         results = self.get_search_results('Banana')
         self.assertEqual(results[0]['id'], channel1.id)
 
-        # make channel2 more relevant
-        channel2.description = (
-            'Bananas with bananas can banana the banana. Bruce Banana is not the Hulk')
+        # make channel2 more relevant. Matches in the title are weighted above other matches.
+        channel2.title = 'Bananas: bananas with bananas can banana the banana'
         channel2.save()
         self.assert_search_result(channel2, positive_query='Banana')
 
@@ -981,6 +1371,13 @@ class ChannelViewTestCase(ViewTestCase):
         self.assertEqual(response.data['id'], self.channel.id)
         self.assertEqual(response.data['title'], self.channel.title)
 
+    def test_sparse_fieldset(self):
+        """The media count is not rendered unless it is requested."""
+        request = self.factory.get('/', {'fields': 'id,title'})
+        response = self.view(request, pk=self.channel.id)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {'id': self.channel.id, 'title': self.channel.title})
+
     def test_not_found(self):
         """Check that a 404 is returned if no channel is found"""
         response = self.view(self.get_request, pk='this-channel-id-does-not-exist')
@@ -1069,6 +1466,22 @@ class ChannelViewTestCase(ViewTestCase):
         response = self.view(self.get_request, pk=self.channel.id)
         self.assertEqual(response.data['mediaCount'], signed_in_count)
 
+    def test_media_item_count_for_editor(self):
+        """Check that an editor's count of media items includes unpublished items"""
+        self.channel.edit_permission.crsids.append(self.user.username)
+        self.channel.edit_permission.save()
+        item = mpmodels.MediaItem.objects.filter(is_sms_derived=False)[0]
+        item.channel = self.channel
+        item.published_at = item.published_at + datetime.timedelta(days=365 * 100)
+        item.save()
+
+        editor_count = self.channel.items.all().viewable_by_user(self.user).count()
+        self.assertGreater(editor_count, self.channel.items.all().viewable_by_user(None).count())
+
+        force_authenticate(self.get_request, user=self.user)
+        response = self.view(self.get_request, pk=self.channel.id)
+        self.assertEqual(response.data['mediaCount'], editor_count)
+
     def assert_field_mutable(
             self, field_name, new_value='testvalue', model_field_name=None, expected_value=None):
         expected_value = expected_value or new_value
@@ -1212,9 +1625,8 @@ class PlaylistListViewTestCase(ViewTestCase):
         results = self.get_search_results('Banana')
         self.assertEqual(results[0]['id'], playlists[0].id)
 
-        # make item 1 more relevant
-        playlists[1].description = (
-            'Bananas with bananas can banana the banana. Bruce Banana is not the Hulk')
+        # make item 1 more relevant. Matches in the title are weighted above other matches.
+        playlists[1].title = 'Bananas: bananas with bananas can banana the banana'
         playlists[1].save()
 
         # both items should still appear in results
@@ -1518,6 +1930,80 @@ class BillingAccountViewTestCase(ViewTestCase):
     # TODO: test mutable/immutable fields when billing account becomes mutable.
 
 
+class BatchPermissionCheckViewTestCase(ViewTestCase):
+    def setUp(self):
+        super().setUp()
+        self.view = views.BatchPermissionCheckView().as_view()
+
+    def test_anonymous(self):
+        """Anonymous users may check permissions."""
+        request = self.factory.post('/', {
+            'mediaItems': ['populated', 'useronly'], 'channels': ['channel1'],
+        }, format='json')
+        response = self.view(request)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['mediaItems'], {
+            'populated': {'viewable': True, 'editable': False, 'downloadable': True},
+            'useronly': {'viewable': False, 'editable': False, 'downloadable': False},
+        })
+        self.assertEqual(response.data['channels'], {
+            'channel1': {'viewable': True, 'editable': False},
+        })
+        self.assertEqual(response.data['playlists'], {})
+
+    def test_anonymous_via_url(self):
+        """Anonymous users may POST to the endpoint without a CSRF token."""
+        client = Client(enforce_csrf_checks=True)
+        response = client.post(
+            reverse('api:permissions_batch_check'), {'playlists': ['public']},
+            content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {
+            'mediaItems': {}, 'channels': {},
+            'playlists': {'public': {'viewable': True, 'editable': False}},
+        })
+
+    def test_authenticated(self):
+        """Permissions are checked for the request user."""
+        request = self.factory.post('/', {
+            'mediaItems': ['useronly'], 'playlists': ['signedin', 'emptyperm'],
+        }, format='json')
+        force_authenticate(request, user=self.user)
+        response = self.view(request)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data['mediaItems']['useronly']['viewable'])
+        self.assertTrue(response.data['playlists']['signedin']['viewable'])
+        self.assertFalse(response.data['playlists']['emptyperm']['viewable'])
+
+    def test_missing_and_deleted(self):
+        """Ids of missing or deleted objects are reported as having no permissions."""
+        request = self.factory.post('/', {
+            'mediaItems': ['deleted', 'this-id-does-not-exist'], 'channels': ['delchan'],
+        }, format='json')
+        response = self.view(request)
+        self.assertEqual(response.status_code, 200)
+        for flags in response.data['mediaItems'].values():
+            self.assertFalse(any(flags.values()))
+        self.assertFalse(any(response.data['channels']['delchan'].values()))
+
+    def test_too_many_ids(self):
+        """Checking too many ids at once is an error."""
+        request = self.factory.post('/', {
+            'mediaItems': ['a'] * (serializers.BatchPermissionCheckSerializer.MAX_IDS + 1),
+        }, format='json')
+        response = self.view(request)
+        self.assertEqual(response.status_code, 400)
+
+    def test_single_query_per_type(self):
+        """Permissions for each type of object are checked in a single query."""
+        request = self.factory.post('/', {
+            'mediaItems': ['a', 'populated', 'useronly'], 'channels': ['channel1', 'channel2'],
+            'playlists': ['public', 'signedin'],
+        }, format='json')
+        with self.assertNumQueries(3):
+            self.view(request)
+
+
 DELIVERY_VIDEO_FIXTURE = {
     'key': 'mock1',
     'title': 'Mock 1',
@@ -11,6 +11,7 @@ app_name = 'api'
 
 urlpatterns = [
     path('media/', views.MediaItemListView.as_view(), name='media_list'),
+    path('media:batch', views.MediaItemBatchView.as_view(), name='media_batch'),
     path('media/<pk>', views.MediaItemView.as_view(), name='media_item'),
     path('media/<pk>/upload', views.MediaItemUploadView.as_view(), name='media_upload'),
     path('media/<pk>/analytics', views.MediaItemAnalyticsView.as_view(),
@@ -30,6 +31,9 @@ urlpatterns = [
     path('playlists/', views.PlaylistListView.as_view(), name='playlist_list'),
     path('playlists/<pk>', views.PlaylistView.as_view(), name='playlist'),
     path('profile/', views.ProfileView.as_view(), name='profile'),
+    path('search:suggest', views.SearchSuggestView.as_view(), name='search_suggest'),
+    path('permissions:batchCheck', views.BatchPermissionCheckView.as_view(),
+         name='permissions_batch_check'),
 
     path('billingAccounts/', views.BillingAccountListView.as_view(), name='billing_account_list'),
     path('billingAccounts/<slug:pk>', views.BillingAccountView.as_view(), name='billing_account'),
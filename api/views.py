@@ -2,24 +2,34 @@
 Views implementing the API endpoints.
 
 """
+import hashlib
+import itertools
 import logging
+import re
 
 import automationlookup
 from django.conf import settings
-from django.contrib.postgres.search import SearchRank, SearchQuery
-from django.db import models
+from django.contrib.postgres.search import SearchQueryField, SearchRank
+from django.core.cache import caches
+from django.db import models, transaction
+from django.db.models import functions
 from django.http import Http404
 from django.shortcuts import redirect
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
 from django_filters import rest_framework as df_filters
 from drf_yasg import inspectors, openapi
 from rest_framework import generics, pagination, filters
 from rest_framework.exceptions import ParseError
+from rest_framework.permissions import AllowAny
+from rest_framework.response import Response
 import requests
 
 import mediaplatform.models as mpmodels
 from mediaplatform_jwp.api import delivery
 
 from . import permissions
+from . import responsecache
 from . import serializers
 
 
@@ -33,6 +43,22 @@ POSTER_IMAGE_DEFAULT_WIDTH = 720
 #: Allowed poster image extensions
 POSTER_IMAGE_VALID_EXTENSIONS = ['jpg']
 
+#: MediaItem columns which are required to render each field of MediaItemDetailSerializer. Fields
+#: which are not listed need no columns beyond those always fetched.
+MEDIA_ITEM_FIELD_COLUMNS = {
+    'title': ['title'],
+    'description': ['description'],
+    'duration': ['duration'],
+    'type': ['type'],
+    'publishedAt': ['published_at'],
+    'downloadable': ['downloadable'],
+    'language': ['language'],
+    'copyright': ['copyright'],
+    'tags': ['tags'],
+    'createdAt': ['created_at'],
+    'channel': ['channel'],
+}
+
 
 class ListPagination(pagination.CursorPagination):
     page_size = 50
@@ -40,19 +66,88 @@ class ListPagination(pagination.CursorPagination):
     max_page_size = 300
 
 
+#: A trailing bare word in a search. The word is matched as a prefix.
+_SEARCH_PREFIX_WORD_RE = re.compile(r'(^|\s)(?P<word>\w+)$')
+
+
+class WebSearchQuery(models.Func):
+    """
+    A text search query for a search string in "web search" syntax. Words are ANDed together,
+    "quoted phrases" match phrases, "or" separates alternatives and a leading "-" negates a word.
+    See the documentation of websearch_to_tsquery() in PostgreSQL. If *prefix* is not empty, it is
+    a single word which is matched as a prefix and ANDed with the rest of the query.
+
+    """
+    template = (
+        "(websearch_to_tsquery('pg_catalog.english', %(expressions)s) && "
+        "to_tsquery('pg_catalog.english', %(prefix_query)s))"
+    )
+    output_field = SearchQueryField()
+
+    def __init__(self, text, prefix=''):
+        super().__init__(models.Value(text))
+        self.prefix = prefix
+
+    def as_sql(self, compiler, connection, **extra_context):
+        sql, params = super().as_sql(
+            compiler, connection, prefix_query='%s', **extra_context)
+        # The prefix query is the final parameter.
+        return sql, params + [f'{self.prefix}:*' if self.prefix != '' else '']
+
+
+class CachedSearchRank(models.Func):
+    """
+    The search rank of an object looked up from a ranked list of (id, rank) pairs computed by an
+    earlier query. Objects which are not in the list have a NULL rank.
+
+    """
+    output_field = models.FloatField()
+
+    def __init__(self, ranked, expression='pk'):
+        super().__init__(models.F(expression))
+        self.ranked = ranked
+
+    def as_sql(self, compiler, connection, **extra_context):
+        sql, params = compiler.compile(self.get_source_expressions()[0])
+        return (
+            f'(%s::float8[])[array_position(%s::text[], ({sql})::text)]',
+            [[rank for _, rank in self.ranked], [str(pk) for pk, _ in self.ranked]] + params
+        )
+
+
 class FullTextSearchFilter(filters.SearchFilter):
     """
     Custom filter based on :py:class:`rest_framework.filters.SearchFilter` specialised to search
     object with a full-text search SearchVectorField. Unlike the standard search filter, this class
     accepts only one search field to be set in search_fields.
 
+    The search is in "web search" syntax (see :py:class:`~.WebSearchQuery`) and a trailing word is
+    matched as a prefix unless it follows an "or". Objects which contain the trailing word as a
+    complete word are ranked as if it were not a prefix so that, for example, a search for "banana"
+    does not rank "banana-y" above "banana".
+
     The filter *always* annotates the objects with a search rank. The name is "search_rank" by
     default but can be overridden by setting search_rank_annotation on the view. If the search is
     empty then this rank will always be zero.
 
+    All matching objects are ranked but only the :py:data:`API_SEARCH_MAX_CANDIDATES
+    <api.defaultsettings.API_SEARCH_MAX_CANDIDATES>` highest ranked are returned. The ranked list
+    of matches is cached for :py:data:`API_SEARCH_CACHE_TTL
+    <api.defaultsettings.API_SEARCH_CACHE_TTL>` seconds so that subsequent pages of results do not
+    re-rank the matches. Since the results are bounded, this filter should come after any other
+    filters which narrow the queryset.
+
     """
+    def get_search_text(self, request):
+        """
+        Return the search string from the request query parameters with whitespace and any null
+        characters stripped.
+
+        """
+        return request.query_params.get(self.search_param, '').replace('\x00', '').strip()
+
     def filter_queryset(self, request, queryset, view):
-        search_terms = self.get_search_terms(request)
+        search_text = self.get_search_text(request)
         search_fields = getattr(view, 'search_fields', None)
         search_rank_annotation = getattr(view, 'search_rank_annotation', 'search_rank')
 
@@ -61,19 +156,61 @@ class FullTextSearchFilter(filters.SearchFilter):
 
         # If there are no search terms, shortcut the search to return the entire query set but
         # annotate it with a fake rank.
-        if not search_fields or not search_terms:
+        if not search_fields or not search_text:
             return queryset.annotate(**{
                 search_rank_annotation: models.Value(0, output_field=models.FloatField())
             })
 
-        # Otherwise, form a query which is the logical OR of all the query terms.
-        query = SearchQuery(search_terms[0])
-        for t in search_terms[1:]:
-            query = query | SearchQuery(t)
+        # Match a trailing bare word as a prefix unless it is, or is an alternative to, "or".
+        match = _SEARCH_PREFIX_WORD_RE.search(search_text)
+        if match is not None and 'or' not in search_text.lower().split()[-2:]:
+            query = WebSearchQuery(search_text[:match.start('word')], match.group('word'))
+            exact_query = WebSearchQuery(search_text)
+        else:
+            query = exact_query = WebSearchQuery(search_text)
+
+        ranked = self._get_ranked(
+            queryset.filter(**{search_fields[0]: query}), search_fields[0], query, exact_query)
+        return queryset.filter(pk__in=[pk for pk, _ in ranked]).annotate(**{
+            search_rank_annotation: CachedSearchRank(ranked)
+        })
+
+    def _get_ranked(self, matches, search_field, query, exact_query):
+        """
+        Return a list of (pk, rank) pairs for the highest ranked objects in the *matches* queryset
+        ordered by decreasing rank. Objects which match *exact_query* are ranked by it and others
+        are ranked by *query*. The list is cached under a key derived from the matches query.
+
+        """
+        cache = caches[settings.API_SEARCH_CACHE_ALIAS]
+        sql, params = matches.values('pk').query.sql_with_params()
+        key = 'api:search:ranked:' + hashlib.sha1(
+            repr((matches.model._meta.label, sql, params)).encode('utf8')).hexdigest()
+
+        if settings.API_SEARCH_CACHE_TTL > 0:
+            ranked = cache.get(key)
+            if ranked is not None:
+                return ranked
+
+        rank = SearchRank(models.F(search_field), query)
+        if exact_query is not query:
+            rank = models.Case(
+                models.When(
+                    **{search_field: exact_query},
+                    then=SearchRank(models.F(search_field), exact_query)),
+                default=rank)
+
+        # Only the highest ranked matches are kept. This bounds the size of the cached ranking and
+        # of the id list used to filter the queryset.
+        ranked = list(
+            matches.annotate(_search_rank=rank).order_by('-_search_rank', 'pk')
+            .values_list('pk', '_search_rank')[:settings.API_SEARCH_MAX_CANDIDATES]
+        )
+
+        if settings.API_SEARCH_CACHE_TTL > 0:
+            cache.set(key, ranked, settings.API_SEARCH_CACHE_TTL)
 
-        return queryset.annotate(**{
-            search_rank_annotation: SearchRank(models.F(search_fields[0]), query)
-        }).filter(**{search_fields[0]: query})
+        return ranked
 
 
 class ViewMixinBase:
@@ -91,19 +228,96 @@ class ViewMixinBase:
     """
     permission_classes = [permissions.MediaPlatformPermission]
 
-    def filter_media_item_qs(self, qs):
+    #: If not None, the name of a query parameter which clients may use to request a sparse
+    #: fieldset, i.e. a comma-separated list of the fields which should be rendered.
+    fields_query_param = None
+
+    @property
+    def capabilities(self):
+        """
+        The :py:class:`mediaplatform.models.Capabilities` of the request user. These are computed
+        at most once per request and should be passed to queryset methods in preference to the
+        user.
+
+        """
+        return mpmodels.capabilities_for_user(self.request.user)
+
+    def get_requested_fields(self):
+        """
+        Return the set of field names requested via :py:attr:`~.fields_query_param` or ``None``
+        if all fields should be rendered. Sparse fieldsets are only honoured for GET and HEAD
+        requests. Unknown field names and the names of write-only fields, which are never
+        rendered, result in a 400 response.
+
+        """
+        if hasattr(self, '_requested_fields'):
+            return self._requested_fields
+
+        value = None
+        if self.fields_query_param is not None and self.request.method in ('GET', 'HEAD'):
+            value = self.request.query_params.get(self.fields_query_param)
+
+        fields = None
+        if value is not None:
+            fields = {name.strip() for name in value.split(',') if name.strip() != ''}
+            serializer_fields = self.get_serializer_class()(
+                context=self.get_serializer_context()).fields
+            unknown_fields = fields - set(serializer_fields)
+            if len(unknown_fields) != 0:
+                raise ParseError('Unknown fields: ' + ', '.join(sorted(unknown_fields)))
+            write_only_fields = {name for name in fields if serializer_fields[name].write_only}
+            if len(write_only_fields) != 0:
+                raise ParseError('Write-only fields: ' + ', '.join(sorted(write_only_fields)))
+
+        self._requested_fields = fields
+        return fields
+
+    def is_field_requested(self, name):
+        """
+        Return True if the field *name* should be rendered. See
+        :py:meth:`~.get_requested_fields`.
+
+        """
+        fields = self.get_requested_fields()
+        return fields is None or name in fields
+
+    def get_serializer(self, *args, **kwargs):
+        fields = self.get_requested_fields()
+        if fields is not None:
+            kwargs.setdefault('fields', fields)
+        return super().get_serializer(*args, **kwargs)
+
+    def filter_media_item_qs(self, qs, fields=None):
         """
         Filters a MediaItem queryset so that only the appropriate objects are returned for the
         user, annotates the objects with any fields required by the serialisers and selects any
         related objects used by the serialisers.
 
+        If *fields* is not None, it is a set of MediaItemDetailSerializer field names and only the
+        columns, related objects and annotations needed to render those fields are fetched.
+
         """
-        return (
-            self._filter_permissions(qs)
-            .select_related('sms')
-            .select_related('jwp')
-            .annotate_downloadable(self.request.user)
-        )
+        qs = self._filter_permissions(qs)
+
+        if fields is None:
+            return (
+                qs
+                .select_related('sms')
+                .select_related('jwp')
+                .annotate_downloadable(self.capabilities)
+            )
+
+        # The primary key and update time are always needed for URLs and validators.
+        qs = qs.only('id', 'updated_at', *itertools.chain.from_iterable(
+            MEDIA_ITEM_FIELD_COLUMNS.get(name, []) for name in fields
+        ))
+        if 'legacyStatisticsUrl' in fields:
+            qs = qs.select_related('sms')
+        if fields & {'sources', 'bestSourceUrl'}:
+            qs = qs.select_related('jwp')
+        if fields & {'downloadableByUser', 'sources', 'bestSourceUrl'}:
+            qs = qs.annotate_downloadable(self.capabilities)
+        return qs
 
     def filter_channel_qs(self, qs):
         """
@@ -139,12 +353,15 @@ class ViewMixinBase:
             editable=models.Value(False, output_field=models.BooleanField()),
         )
 
-    def add_media_item_detail(self, qs):
+    def add_media_item_detail(self, qs, fields=None):
         """
         Add any extra annotations to a MediaItem query set which are required to render the detail
-        view via MediaItemDetailSerializer.
+        view via MediaItemDetailSerializer. If *fields* is not None, only the annotations required
+        to render those fields are added.
 
         """
+        if fields is not None and 'channel' not in fields:
+            return qs
         return qs.select_related('channel')
 
     def add_channel_detail(self, qs, name='item_count'):
@@ -152,7 +369,19 @@ class ViewMixinBase:
         Add any extra annotations to a Channel query set which are required to render the detail
         view via ChannelDetailSerializer.
 
+        Where the request user's item count is one of those materialised in
+        :py:class:`mediaplatform.models.ChannelItemCount`, it is read from there. Otherwise the
+        count is computed by filtering the channel's items for the user.
+
         """
+        capabilities = self.capabilities
+
+        # Users who can view all items and anonymous users have materialised counts.
+        if capabilities.can_view_all_media_items:
+            return qs.annotate(**{name: models.F('item_counts__total_count')})
+        if capabilities.is_anonymous:
+            return qs.annotate(**{name: models.F('item_counts__public_count')})
+
         items_qs = (
             self.filter_media_item_qs(mpmodels.MediaItem.objects.all())
             .filter(channel=models.OuterRef('pk'))
@@ -160,8 +389,19 @@ class ViewMixinBase:
             .annotate(count=models.Count('*'))
             .values('count')
         )
-        return qs.annotate(**{
-            name: models.Subquery(items_qs, output_field=models.BigIntegerField())
+
+        # An editor of a channel can view every item in it which is not SMS-derived and so, if the
+        # channel has no SMS-derived items, they can view all of its items.
+        editable_name = '_' + name + '_editable'
+        return qs.annotate_editable(capabilities, name=editable_name).annotate(**{
+            name: models.Case(
+                models.When(
+                    models.Q(**{editable_name: True, 'item_counts__sms_derived_count': 0}),
+                    then=models.F('item_counts__total_count')
+                ),
+                default=models.Subquery(items_qs, output_field=models.BigIntegerField()),
+                output_field=models.BigIntegerField()
+            )
         })
 
     def add_playlist_detail(self, qs):
@@ -183,9 +423,20 @@ class ViewMixinBase:
         # to be passed as well.
         return (
             qs.all()
-            .viewable_by_user(self.request.user)
-            .annotate_viewable(self.request.user)
-            .annotate_editable(self.request.user)
+            .viewable_by_user(self.capabilities)
+            .annotate_viewable(self.capabilities)
+            .annotate_editable(self.capabilities)
+        )
+
+    def get_profile_channels(self):
+        """
+        Return a queryset of the channels which the request user may edit annotated with all of the
+        fields required by the detail serialisers.
+
+        """
+        return self.add_channel_detail(
+            self.filter_channel_qs(mpmodels.Channel.objects.all())
+            .editable_by_user(self.capabilities)
         )
 
     def get_profile(self):
@@ -196,10 +447,7 @@ class ViewMixinBase:
         """
         obj = {
             'user': self.request.user,
-            'channels': self.add_channel_detail(
-                self.filter_channel_qs(mpmodels.Channel.objects.all())
-                .editable_by_user(self.request.user)
-            ),
+            'channels': self.get_profile_channels(),
         }
         if not self.request.user.is_anonymous:
             try:
@@ -213,6 +461,213 @@ class ViewMixinBase:
         return obj
 
 
+class ConditionalGetMixin:
+    """
+    A mixin class for API views which adds ETag and Last-Modified validators to GET responses and
+    which answers conditional GET requests whose validators match with "304 Not Modified" before
+    any serialiser is run.
+
+    The ETag is a digest of values which together identify the representation returned to the
+    request user. These always include the permission class of the request user, i.e. everything
+    about the user which may change which objects they can see, and the negotiated media type of
+    the response.
+
+    """
+    def get_permission_class(self):
+        """
+        Return a string identifying the permission class of the request user. Users in the same
+        permission class are shown the same objects.
+
+        """
+        capabilities = self.capabilities
+        return repr((
+            capabilities.is_anonymous, sorted(capabilities.principals),
+            capabilities.can_view_all_media_items, capabilities.can_download_all_media_items,
+        ))
+
+    def get_conditional_response(self, etag_parts, last_modified):
+        """
+        Return a tuple giving the ETag and Last-Modified header values derived from the list
+        *etag_parts* and the datetime *last_modified*, which may be ``None``, along with a
+        response which should be returned in preference to rendering the resource or ``None`` if
+        the resource should be rendered.
+
+        """
+        etag_parts = [self.get_permission_class(), self.request.accepted_media_type] + etag_parts
+        etag = quote_etag(hashlib.sha1(repr(etag_parts).encode('utf8')).hexdigest())
+        last_modified = (
+            int(last_modified.timestamp()) if last_modified is not None else None
+        )
+        response = get_conditional_response(
+            self.request, etag=etag, last_modified=last_modified)
+        return etag, last_modified, response
+
+    def add_validators(self, response, etag, last_modified):
+        """
+        Add ETag and Last-Modified headers to a response.
+
+        """
+        response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+        return response
+
+
+class ResponseCacheMixin:
+    """
+    A mixin class for DRF generic views which serves GET requests from anonymous users from the
+    shared response cache and stores the responses to those requests in it. See
+    :py:mod:`api.responsecache`.
+
+    """
+    #: Tags naming the kinds of object which responses from this view depend on.
+    response_cache_tags = responsecache.ALL_TAGS
+
+    def get(self, request, *args, **kwargs):
+        self._response_cache_key = None
+        if responsecache.is_cacheable(request):
+            key, response = responsecache.get(request, self.response_cache_tags)
+            if response is not None:
+                return response
+            self._response_cache_key = key
+
+        return super().get(request, *args, **kwargs)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if getattr(self, '_response_cache_key', None) is not None:
+            responsecache.store(self._response_cache_key, response.render())
+        return response
+
+
+class ConditionalRetrieveMixin(ConditionalGetMixin):
+    """
+    A mixin class for DRF generic views which adds conditional GET support to retrieving
+    individual objects. Use this mixin with RetrieveAPIView or one of its subclasses.
+
+    """
+    def get_object_etag_parts(self, obj):
+        """
+        Return a list of values which together identify the representation of *obj* for the
+        request user. Views whose representation depends on related objects should extend this
+        list. The default implementation uses the object's primary key, update time and any
+        permission annotations since permission changes do not alter the update time.
+
+        """
+        return [obj.pk, obj.updated_at] + [
+            getattr(obj, name, None) for name in ('viewable', 'editable', 'downloadable_by_user')
+        ]
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        etag, last_modified, response = self.get_conditional_response(
+            self.get_object_etag_parts(instance), instance.updated_at)
+        if response is not None:
+            return self.add_validators(response, etag, last_modified)
+
+        serializer = self.get_serializer(instance)
+        return self.add_validators(Response(serializer.data), etag, last_modified)
+
+
+class ConditionalListMixin(ConditionalGetMixin):
+    """
+    A mixin class for DRF generic views which adds conditional GET support to listing objects.
+    Use this mixin with ListAPIView or one of its subclasses.
+
+    The ETag is derived from the ids and update times of the objects on the requested page along
+    with the links to the neighbouring pages. The page is fetched before the ETag is computed and
+    so no query beyond the one fetching the page is needed. Permission changes which change which
+    objects are visible to the user change the ids on the page and so change the ETag.
+
+    No Last-Modified header is sent. Objects which are deleted or hidden disappear from the list
+    without changing the latest update time of the objects which remain and so a Last-Modified
+    time derived from them would answer If-Modified-Since requests with a stale "304 Not
+    Modified".
+
+    """
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+
+        page = self.paginate_queryset(queryset)
+        objects = list(page if page is not None else queryset)
+
+        etag_parts = [[(obj.pk, obj.updated_at) for obj in objects]]
+        if page is not None:
+            etag_parts.append([self.paginator.get_next_link(), self.paginator.get_previous_link()])
+        etag, last_modified, response = self.get_conditional_response(etag_parts, None)
+        if response is not None:
+            return self.add_validators(response, etag, last_modified)
+
+        serializer = self.get_serializer(objects, many=True)
+        if page is not None:
+            response = self.get_paginated_response(serializer.data)
+        else:
+            response = Response(serializer.data)
+
+        return self.add_validators(response, etag, last_modified)
+
+
+class BatchGetMixin(ConditionalGetMixin):
+    """
+    A mixin class for DRF generic list views which allows several objects to be fetched by id in
+    one request. Use this mixin with ListAPIView or one of its subclasses.
+
+    If the query parameter named by :py:attr:`~.id_list_query_param` is present, it is a
+    comma-separated list of ids. The objects with those ids are fetched in one query from the
+    filtered queryset and returned, unpaginated, in the order they were requested. The response
+    has the form ``{"results": [...], "missing": [...]}`` where "missing" lists the requested ids
+    which do not exist or which are not visible to the user. No more ids may be requested than the
+    maximum page size of the view's paginator.
+
+    """
+    #: Name of the query parameter holding a comma-separated list of ids to fetch.
+    id_list_query_param = 'id'
+
+    def get_requested_ids(self):
+        """
+        Return a list of the distinct ids requested via :py:attr:`~.id_list_query_param` in the
+        order they were given or ``None`` if the parameter is not present.
+
+        """
+        value = self.request.query_params.get(self.id_list_query_param)
+        if value is None:
+            return None
+
+        ids = []
+        for pk in (pk.strip() for pk in value.split(',')):
+            if pk != '' and pk not in ids:
+                ids.append(pk)
+
+        max_ids = getattr(self.paginator, 'max_page_size', None)
+        if max_ids is not None and len(ids) > max_ids:
+            raise ParseError(f'At most {max_ids} ids may be requested at once')
+
+        return ids
+
+    def list(self, request, *args, **kwargs):
+        ids = self.get_requested_ids()
+        if ids is None:
+            return super().list(request, *args, **kwargs)
+
+        objects = {
+            obj.pk: obj
+            for obj in self.filter_queryset(self.get_queryset()).filter(pk__in=ids)
+        }
+        results = [objects[pk] for pk in ids if pk in objects]
+        missing = [pk for pk in ids if pk not in objects]
+
+        # As with lists, no Last-Modified time is sent since objects which become missing do not
+        # change the latest update time of those which remain.
+        etag, last_modified, response = self.get_conditional_response(
+            [[(obj.pk, obj.updated_at) for obj in results], missing], None)
+        if response is not None:
+            return self.add_validators(response, etag, last_modified)
+
+        serializer = self.get_serializer(results, many=True)
+        return self.add_validators(
+            Response({'results': serializer.data, 'missing': missing}), etag, last_modified)
+
+
 class ProfileView(ViewMixinBase, generics.RetrieveAPIView):
     """
     Endpoint to retrieve the profile of the current user.
@@ -224,6 +679,70 @@ class ProfileView(ViewMixinBase, generics.RetrieveAPIView):
         return self.get_profile()
 
 
+class SearchSuggestView(ViewMixinBase, ResponseCacheMixin, generics.RetrieveAPIView):
+    """
+    Endpoint to suggest completions for a partially typed search. The "q" parameter is the search
+    typed so far. Titles of media items, channels and playlists visible to the user which contain
+    a word starting with the search are returned along with matching tags from the tag
+    dictionary. Searches shorter than three characters have no suggestions.
+
+    This endpoint is intended to be called on each keystroke and uses trigram indexes rather than
+    the full text search used by the list endpoints.
+
+    """
+    serializer_class = serializers.SearchSuggestionsSerializer
+
+    #: Minimum length of a search which has suggestions. Trigram indexes cannot be used for shorter
+    #: searches.
+    min_search_length = 3
+
+    #: Default and maximum number of suggestions of each kind.
+    default_limit = 5
+    max_limit = 20
+
+    def get_object(self):
+        search = self.request.query_params.get('q', '').strip()
+        try:
+            limit = min(self.max_limit, int(self.request.query_params.get(
+                'limit', self.default_limit)))
+        except ValueError:
+            raise ParseError('limit must be an integer')
+        if limit < 1:
+            raise ParseError('limit must be positive')
+
+        if len(search) < self.min_search_length:
+            return {'media_items': [], 'channels': [], 'playlists': [], 'tags': []}
+
+        # Match titles containing a word which starts with the search. Shorter titles are
+        # suggested first.
+        title_regex = r'\m' + re.escape(search)
+        querysets = {
+            'media_items': mpmodels.MediaItem.objects.all(),
+            'channels': mpmodels.Channel.objects.all(),
+            'playlists': mpmodels.Playlist.objects.all(),
+        }
+        suggestions = {
+            name: list(
+                qs.viewable_by_user(self.capabilities)
+                .filter(title__iregex=title_regex)
+                .order_by(functions.Length('title'), 'title')
+                .values('id', 'title')[:limit]
+            )
+            for name, qs in querysets.items()
+        }
+
+        # Tags of items only visible to particular users are not in the dictionary.
+        count_field = 'public_count' if self.capabilities.is_anonymous else 'signed_in_count'
+        suggestions['tags'] = list(
+            mpmodels.MediaItemTag.objects
+            .filter(key__startswith=search.lower(), **{count_field + '__gt': 0})
+            .order_by('-' + count_field, 'key')
+            .values_list('name', flat=True)[:limit]
+        )
+
+        return suggestions
+
+
 class MediaItemListMixin(ViewMixinBase):
     """
     A mixin class for DRF generic views which has all of the specialisations necessary for listing
@@ -234,7 +753,8 @@ class MediaItemListMixin(ViewMixinBase):
     queryset = mpmodels.MediaItem.objects
 
     def get_queryset(self):
-        return self.filter_media_item_qs(super().get_queryset())
+        return self.filter_media_item_qs(
+            super().get_queryset(), fields=self.get_requested_fields())
 
 
 class MediaItemMixin(MediaItemListMixin):
@@ -245,7 +765,8 @@ class MediaItemMixin(MediaItemListMixin):
 
     """
     def get_queryset(self):
-        return self.add_media_item_detail(super().get_queryset())
+        return self.add_media_item_detail(
+            super().get_queryset(), fields=self.get_requested_fields())
 
 
 def _user_playlists(request):
@@ -277,15 +798,25 @@ class MediaItemFilter(df_filters.FilterSet):
         return queryset.filter(id__in=value.media_items)
 
 
-class MediaItemListView(MediaItemListMixin, generics.ListCreateAPIView):
+class MediaItemListView(
+        MediaItemListMixin, ResponseCacheMixin, BatchGetMixin, ConditionalListMixin,
+        generics.ListCreateAPIView):
     """
     List and search Media items. If no other ordering is specified, results are returned in order
     of decreasing search relevance (if there is any search) and then by decreasing publication
-    date.
+    date. Several media items may be fetched at once by passing a comma-separated list of ids as
+    the "id" parameter.
+
+    Passing a comma-separated list of facet names as the "facets" parameter adds a "facets" object
+    to the response giving the number of matching items with each value of the named facets. The
+    facets are "type", "language", "tags" and "channel" (counted by channel id). Each facet lists
+    at most :py:attr:`~.max_facet_values` values in order of decreasing count. The counts cover all
+    pages of results and are computed in a single query.
 
     """
-    filter_backends = (filters.OrderingFilter, FullTextSearchFilter,
-                       df_filters.DjangoFilterBackend)
+    # The search filter bounds the number of matches and so must come after the other filters.
+    filter_backends = (filters.OrderingFilter, df_filters.DjangoFilterBackend,
+                       FullTextSearchFilter)
     # The default ordering is by search rank first and then publication date. If no search is used,
     # the rank is a fixed value and the publication date dominates.
     ordering = ('-search_rank', '-publishedAt')
@@ -293,19 +824,193 @@ class MediaItemListView(MediaItemListMixin, generics.ListCreateAPIView):
     pagination_class = ListPagination
     search_fields = ('text_search_vector',)
     serializer_class = serializers.MediaItemSerializer
+    fields_query_param = 'fields'
+    # Items may be filtered by playlist.
+    response_cache_tags = (responsecache.TAG_MEDIA, responsecache.TAG_PLAYLISTS)
     filterset_class = MediaItemFilter
 
+    #: Name of the query parameter holding a comma-separated list of facets to count.
+    facets_query_param = 'facets'
+
+    #: Maximum number of values returned for each facet.
+    max_facet_values = 20
+
     def get_queryset(self):
         qs = super().get_queryset()
         return qs.annotate(publishedAt=models.F('published_at'), updatedAt=models.F('updated_at'))
 
+    def get_requested_facets(self):
+        """
+        Return a list of the distinct facet names requested via :py:attr:`~.facets_query_param`.
+        Raises ParseError if an unknown facet is requested.
 
-class MediaItemView(MediaItemMixin, generics.RetrieveUpdateAPIView):
+        """
+        value = self.request.query_params.get(self.facets_query_param, '')
+        facets = []
+        for name in (name.strip() for name in value.split(',')):
+            if name != '' and name not in facets:
+                facets.append(name)
+
+        facet_columns = mpmodels.MediaItemQuerySet.facet_columns
+        unknown = [name for name in facets if name not in facet_columns]
+        if len(unknown) > 0:
+            raise ParseError(f'Unknown facets: {", ".join(unknown)}')
+
+        return facets
+
+    def paginate_queryset(self, queryset):
+        # Facets are counted over the filtered queryset before it is paginated. This is only
+        # called once the conditional GET check has failed and so counts are never computed for
+        # "304 Not Modified" responses. Responses to anonymous users, including the facet counts,
+        # are stored in the response cache.
+        facets = self.get_requested_facets()
+        self._facet_counts = queryset.facet_counts(facets) if len(facets) > 0 else None
+        return super().paginate_queryset(queryset)
+
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        if getattr(self, '_facet_counts', None) is not None:
+            response.data['facets'] = {
+                facet: [
+                    {'value': value, 'count': count}
+                    for value, count in sorted(
+                        counts.items(), key=lambda item: (-item[1], item[0])
+                    )[:self.max_facet_values]
+                ]
+                for facet, counts in self._facet_counts.items()
+            }
+        return response
+
+
+class MediaItemView(
+        MediaItemMixin, ResponseCacheMixin, ConditionalRetrieveMixin,
+        generics.RetrieveUpdateAPIView):
     """
     Endpoint to retrieve a single media item.
 
     """
     serializer_class = serializers.MediaItemDetailSerializer
+    fields_query_param = 'fields'
+    response_cache_tags = (responsecache.TAG_MEDIA, responsecache.TAG_CHANNELS)
+
+    def get_object_etag_parts(self, obj):
+        # The detail representation includes the channel and the JWP video's sources.
+        # Related objects are only fetched if a field which depends on them was requested.
+        parts = super().get_object_etag_parts(obj)
+        if self.is_field_requested('channel'):
+            parts.append(obj.channel.updated_at if obj.channel is not None else None)
+        if self.is_field_requested('sources') or self.is_field_requested('bestSourceUrl'):
+            jwp = getattr(obj, 'jwp', None)
+            parts.append(jwp.updated if jwp is not None else None)
+        return parts
+
+
+class MediaItemBatchView(MediaItemListMixin, generics.GenericAPIView):
+    """
+    Endpoint to create and update several media items at once. The request body is a list of
+    media items. Items with an "id" are partial updates of an existing item which the user can edit
+    and items without one are created. The changes are all validated before any is applied and are
+    then applied in a single transaction with a single synchronisation job for JWP. If any change
+    is invalid, no change is applied.
+
+    The response is a list with one result for each change in the request. Each result has a
+    "status" which is the HTTP status code for that change. Successful changes have the resulting
+    media item as "item" and invalid changes have their validation errors as "errors". If some
+    changes were invalid, the valid changes have status 424 and the response status is 400.
+
+    """
+    serializer_class = serializers.MediaItemSerializer
+
+    #: Maximum number of media items which may be changed in one request.
+    max_items = 300
+
+    def post(self, request, *args, **kwargs):
+        changes = request.data
+        if not isinstance(changes, list):
+            raise ParseError('Expected a list of media items')
+        if len(changes) > self.max_items:
+            raise ParseError(f'At most {self.max_items} media items may be changed at once')
+
+        # Fetch all of the items to be updated in one query.
+        update_ids = [
+            change['id'] for change in changes
+            if isinstance(change, dict) and isinstance(change.get('id'), str)
+        ]
+        instances = {item.id: item for item in self.get_queryset().filter(id__in=update_ids)}
+
+        seen_ids = set()
+        validated = [self._validate_change(change, instances, seen_ids) for change in changes]
+
+        if any(errors is not None for _, errors in validated):
+            return Response([
+                {'status': 424} if errors is None else {'status': 400, 'errors': errors}
+                for _, errors in validated
+            ], status=400)
+
+        # A list of (item, status) pairs in the order of the changes in the request.
+        results = []
+        with transaction.atomic():
+            created = iter(mpmodels.MediaItem.objects.bulk_create_for_user(request.user, [
+                mpmodels.MediaItem(**serializer.validated_data)
+                for serializer, _ in validated if serializer.instance is None
+            ]))
+
+            updated, updated_fields = [], set()
+            for serializer, _ in validated:
+                if serializer.instance is None:
+                    results.append((next(created), 201))
+                    continue
+
+                for name, value in serializer.validated_data.items():
+                    setattr(serializer.instance, name, value)
+                    updated_fields.add(name)
+                updated.append(serializer.instance)
+                results.append((serializer.instance, 200))
+
+            mpmodels.MediaItem.objects.bulk_update_fields(updated, updated_fields)
+
+        # Re-fetch the changed items in one query so that they have the annotations needed by the
+        # serializer.
+        items = {
+            item.id: item
+            for item in self.get_queryset().filter(id__in=[item.id for item, _ in results])
+        }
+        return Response([
+            {'status': status, 'item': self.get_serializer(items.get(item.id, item)).data}
+            for item, status in results
+        ])
+
+    def _validate_change(self, change, instances, seen_ids):
+        """
+        Validate one change from a batch. *instances* maps ids to the items which may be updated
+        and *seen_ids* is the set of ids updated by earlier changes in the batch. Returns a tuple
+        giving a validated serializer or ``None`` and a dictionary of validation errors or
+        ``None``.
+
+        """
+        if not isinstance(change, dict):
+            return None, {'non_field_errors': ['Expected a media item.']}
+
+        pk = change.get('id')
+        if pk is None:
+            serializer = self.get_serializer(data=change)
+        else:
+            instance = instances.get(pk)
+            if instance is None or not instance.editable:
+                return None, {'id': ['No such media item or you may not edit it.']}
+            if pk in seen_ids:
+                return None, {'id': ['A media item may only be changed once per batch.']}
+            seen_ids.add(pk)
+            serializer = self.get_serializer(instance, data=change, partial=True)
+
+        if not serializer.is_valid():
+            return None, serializer.errors
+
+        # Mirror ChannelOwnedResourceModelSerializer.update() which is not called for batches.
+        if serializer.instance is not None and 'channel' in serializer.validated_data:
+            return None, {'channelId': ['This field cannot be changed']}
+
+        return serializer, None
 
 
 class MediaItemUploadView(MediaItemMixin, generics.RetrieveUpdateAPIView):
@@ -491,7 +1196,10 @@ class ChannelMixin(ChannelListMixin):
 
     """
     def get_queryset(self):
-        return self.add_channel_detail(super().get_queryset())
+        qs = super().get_queryset()
+        if not self.is_field_requested('mediaCount'):
+            return qs
+        return self.add_channel_detail(qs)
 
 
 class ChannelListFilterSet(df_filters.FilterSet):
@@ -503,16 +1211,20 @@ class ChannelListFilterSet(df_filters.FilterSet):
         label='Editable', help_text='Filter by whether the user can edit this channel')
 
 
-class ChannelListView(ChannelListMixin, generics.ListCreateAPIView):
+class ChannelListView(
+        ChannelListMixin, ResponseCacheMixin, BatchGetMixin, ConditionalListMixin,
+        generics.ListCreateAPIView):
     """
     Endpoint to retrieve a list of channels.
     List and search Channels. If no other ordering is specified, results are returned in order
     of decreasing search relevance (if there is any search) and then by decreasing update
-    date.
+    date. Several channels may be fetched at once by passing a comma-separated list of ids as the
+    "id" parameter.
 
     """
+    # The search filter bounds the number of matches and so must come after the other filters.
     filter_backends = (
-        filters.OrderingFilter, FullTextSearchFilter, df_filters.DjangoFilterBackend)
+        filters.OrderingFilter, df_filters.DjangoFilterBackend, FullTextSearchFilter)
     # The default ordering is by search rank first and then update date. If no search is used,
     # the rank is a fixed value and the update date dominates.
     ordering = ('-search_rank', '-updatedAt')
@@ -520,6 +1232,8 @@ class ChannelListView(ChannelListMixin, generics.ListCreateAPIView):
     pagination_class = ListPagination
     search_fields = ('text_search_vector',)
     serializer_class = serializers.ChannelSerializer
+    fields_query_param = 'fields'
+    response_cache_tags = (responsecache.TAG_CHANNELS,)
     filterset_class = ChannelListFilterSet
 
     def get_queryset(self):
@@ -527,12 +1241,20 @@ class ChannelListView(ChannelListMixin, generics.ListCreateAPIView):
         return qs.annotate(createdAt=models.F('created_at'), updatedAt=models.F('updated_at'))
 
 
-class ChannelView(ChannelMixin, generics.RetrieveUpdateAPIView):
+class ChannelView(
+        ChannelMixin, ResponseCacheMixin, ConditionalRetrieveMixin,
+        generics.RetrieveUpdateAPIView):
     """
     Endpoint to retrieve an individual channel.
 
     """
     serializer_class = serializers.ChannelDetailSerializer
+    fields_query_param = 'fields'
+    response_cache_tags = (responsecache.TAG_CHANNELS, responsecache.TAG_MEDIA)
+
+    def get_object_etag_parts(self, obj):
+        # The item count is only annotated if the mediaCount field was requested.
+        return super().get_object_etag_parts(obj) + [getattr(obj, 'item_count', None)]
 
 
 class PlaylistListMixin(ViewMixinBase):
@@ -576,16 +1298,20 @@ class PlaylistListFilterSet(df_filters.FilterSet):
         label='Editable', help_text='Filter by whether the user can edit this channel')
 
 
-class PlaylistListView(PlaylistListMixin, generics.ListCreateAPIView):
+class PlaylistListView(
+        PlaylistListMixin, ResponseCacheMixin, BatchGetMixin, ConditionalListMixin,
+        generics.ListCreateAPIView):
     """
     Endpoint to retrieve a list of playlists.
     List and search Playlists. If no other ordering is specified, results are returned in order
     of decreasing search relevance (if there is any search) and then by decreasing update
-    date.
+    date. Several playlists may be fetched at once by passing a comma-separated list of ids as the
+    "id" parameter.
 
     """
+    # The search filter bounds the number of matches and so must come after the other filters.
     filter_backends = (
-        filters.OrderingFilter, FullTextSearchFilter, df_filters.DjangoFilterBackend)
+        filters.OrderingFilter, df_filters.DjangoFilterBackend, FullTextSearchFilter)
     # The default ordering is by search rank first and then update date. If no search is used,
     # the rank is a fixed value and the update date dominates.
     ordering = ('-search_rank', '-updatedAt')
@@ -593,6 +1319,8 @@ class PlaylistListView(PlaylistListMixin, generics.ListCreateAPIView):
     pagination_class = ListPagination
     search_fields = ('text_search_vector',)
     serializer_class = serializers.PlaylistSerializer
+    fields_query_param = 'fields'
+    response_cache_tags = (responsecache.TAG_PLAYLISTS,)
     filter_fields = ('channel',)
     filterset_class = PlaylistListFilterSet
 
@@ -601,22 +1329,69 @@ class PlaylistListView(PlaylistListMixin, generics.ListCreateAPIView):
         return qs.annotate(createdAt=models.F('created_at'), updatedAt=models.F('updated_at'))
 
 
-class PlaylistView(PlaylistMixin, generics.RetrieveUpdateDestroyAPIView):
+class PlaylistView(
+        PlaylistMixin, ResponseCacheMixin, ConditionalRetrieveMixin,
+        generics.RetrieveUpdateDestroyAPIView):
     """
     Endpoint to retrieve an individual playlists.
 
     """
     serializer_class = serializers.PlaylistDetailSerializer
+    fields_query_param = 'fields'
+
+    def get_object_etag_parts(self, obj):
+        # The detail representation includes the channel and the viewable media items.
+        parts = super().get_object_etag_parts(obj) + [obj.channel.updated_at]
+        if self.is_field_requested('media'):
+            # obj.media carries list-valued annotations which cannot be grouped by and so the
+            # aggregate is computed over a plain queryset of the same items.
+            media = (
+                mpmodels.MediaItem.objects.filter(id__in=obj.media.order_by().values('id'))
+                .aggregate(count=models.Count('pk'), last_updated_at=models.Max('updated_at'))
+            )
+            parts.extend([media['count'], media['last_updated_at']])
+        return parts
 
     def get_object(self):
         obj = super().get_object()
 
         # Add a list of all the media which is viewable by the current user. This is used by the
         # detail serialiser.
-        obj.media = obj.ordered_media_item_queryset.viewable_by_user(self.request.user)
+        obj.media = obj.ordered_media_item_queryset.viewable_by_user(self.capabilities)
         return obj
 
 
+class BatchPermissionCheckView(ViewMixinBase, generics.GenericAPIView):
+    """
+    Endpoint to check the permissions the current user has on a batch of media items, channels and
+    playlists. The permissions for each type of object are computed in a single query. Ids of
+    objects which do not exist or which the user cannot view are reported as having no
+    permissions.
+
+    """
+    # Checking permissions modifies nothing and so this endpoint is available to anonymous users
+    # even though it is POST-ed to. MediaPlatformPermission would forbid anonymous POSTs.
+    permission_classes = [AllowAny]
+
+    serializer_class = serializers.BatchPermissionCheckSerializer
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        querysets = {
+            'mediaItems': mpmodels.MediaItem.objects.all(),
+            'channels': mpmodels.Channel.objects.all(),
+            'playlists': mpmodels.Playlist.objects.all(),
+        }
+        result = {
+            name: qs.permissions_for_user(self.capabilities, serializer.validated_data[name])
+            for name, qs in querysets.items()
+        }
+
+        return Response(serializers.BatchPermissionCheckResultSerializer(result).data)
+
+
 class BillingAccountListMixin(ViewMixinBase):
     """
     A mixin class for DRF generic views which has all of the specialisations necessary for listing
@@ -661,6 +1436,7 @@ class BillingAccountListView(BillingAccountListMixin, generics.ListAPIView):
     ordering_fields = ('updatedAt', 'createdAt', 'lookupInstid')
     pagination_class = ListPagination
     serializer_class = serializers.BillingAccountSerializer
+    fields_query_param = 'fields'
     filterset_class = BillingAccountListFilterSet
 
     def get_queryset(self):
@@ -671,7 +1447,7 @@ class BillingAccountListView(BillingAccountListMixin, generics.ListAPIView):
             .annotate(createdAt=models.F('created_at'))
             .annotate(lookupInstid=models.F('lookup_instid'))
             # Required for canCreateChannels filter
-            .annotate_can_create_channels(self.request.user)
+            .annotate_can_create_channels(self.capabilities)
         )
 
 
@@ -681,3 +1457,4 @@ class BillingAccountView(BillingAccountMixin, generics.RetrieveAPIView):
 
     """
     serializer_class = serializers.BillingAccountDetailSerializer
+    fields_query_param = 'fields'
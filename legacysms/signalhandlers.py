@@ -0,0 +1,45 @@
+"""
+Register and handle signals for the legacy SMS application. This module is import-ed from
+:py:class:`legacysms.apps.Config.ready` so all models should be registered at import time.
+
+"""
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from mediaplatform import models as mpmodels
+
+from . import models
+
+
+@receiver(post_save, sender=models.MediaItem)
+@receiver(post_delete, sender=models.MediaItem)
+def media_item_post_save_or_delete_handler(*args, instance, **kwargs):
+    """
+    Called after a :py:class:`legacysms.models.MediaItem` is saved or deleted. Updates the
+    denormalised :py:attr:`mediaplatform.models.MediaItem.is_sms_derived` flag of the associated
+    media item (if any).
+
+    This is also run for "raw" saves so that fixtures have the correct state.
+
+    """
+    if instance.item_id is None:
+        return
+
+    mpmodels.MediaItem.objects_including_deleted.filter(id=instance.item_id).update_sms_derived()
+
+
+@receiver(post_save, sender=models.Collection)
+@receiver(post_delete, sender=models.Collection)
+def collection_post_save_or_delete_handler(*args, instance, **kwargs):
+    """
+    Called after a :py:class:`legacysms.models.Collection` is saved or deleted. Updates the
+    denormalised :py:attr:`mediaplatform.models.Channel.is_sms_derived` flag of the associated
+    channel (if any).
+
+    This is also run for "raw" saves so that fixtures have the correct state.
+
+    """
+    if instance.channel_id is None:
+        return
+
+    mpmodels.Channel.objects_including_deleted.filter(id=instance.channel_id).update_sms_derived()
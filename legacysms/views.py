@@ -88,7 +88,7 @@ def media(request, media_id):
 
     """
     item = (
-        mpmodels.MediaItem.objects.all().viewable_by_user(request.user)
+        mpmodels.MediaItem.objects.all().viewable_by_user(request.capabilities)
         .filter(sms__id=media_id).first()
     )
 
@@ -116,7 +116,7 @@ def _find_media_item(media_id, request):
 
     """
     return (
-        mpmodels.MediaItem.objects.all().viewable_by_user(request.user)
+        mpmodels.MediaItem.objects.all().viewable_by_user(request.capabilities)
         .filter(sms__id=media_id).first()
     )
 
@@ -132,6 +132,6 @@ def _find_collection_playlist(collection_id, request):
         return None
 
     return (
-        mpmodels.Playlist.objects.all().viewable_by_user(request.user)
+        mpmodels.Playlist.objects.all().viewable_by_user(request.capabilities)
         .filter(id=collection.playlist.id).first()
     )
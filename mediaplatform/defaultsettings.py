@@ -0,0 +1,46 @@
+"""
+Default settings values for the :py:mod:`mediaplatform` application.
+
+"""
+# Variables whose names are in upper case and do not start with an underscore from this module are
+# used as default settings for the mediaplatform application. See apps.Config for how this is
+# achieved. This is a bit mucky but, at the moment, Django does not have a standard way to specify
+# default values for settings. See: https://stackoverflow.com/questions/8428556/
+
+IDENTITY_CACHE_ALIAS = 'default'
+"""
+Name of the Django cache used to share the lookup groups and institutions of users between
+requests. The cache must be shared by the web and Celery worker processes since stale identities
+are refreshed by a Celery task. See :py:mod:`mediaplatform.identity`.
+
+"""
+
+IDENTITY_CACHE_TTL = 300
+"""
+Number of seconds a user's lookup groups and institutions are cached for before they are
+re-fetched. Setting this to zero disables sharing identities between requests.
+
+"""
+
+IDENTITY_CACHE_STALE_TTL = 3600
+"""
+Number of seconds after :py:data:`~.IDENTITY_CACHE_TTL` has passed during which a cached identity
+is still used while a fresh one is fetched in the background.
+
+"""
+
+IDENTITY_LOCAL_PEOPLE = None
+"""
+If not None, a dictionary mapping usernames to lookup person resources which is used instead of
+querying lookup. This is intended for developing and testing without access to lookup.
+
+"""
+
+MEDIA_ITEM_VIEWABLE_STRATEGY = 'overlap'
+"""
+Strategy used to determine which media items a user has view permission for. If "overlap", each
+item's view permission is checked against the user's principals. If "index", the
+:py:class:`~mediaplatform.models.MediaItemViewPrincipal` index is searched for the user's
+principals. The index is always maintained and so this setting may be changed at any time.
+
+"""
@@ -0,0 +1,253 @@
+"""
+Resolution of the lookup groups and institutions which a user is a member of.
+
+Permission checks for signed in users need to know which lookup groups and institutions the user
+belongs to. Fetching this from lookup is comparatively slow and a single page may result in many
+permission checks so resolved identities are cached at two levels:
+
+1. The identity is memoised on the user object itself. Since Django creates a new user object for
+   each request, this acts as a per-request cache and ensures that lookup is consulted at most
+   once per request.
+
+2. The identity is stored in the Django cache named by :py:data:`IDENTITY_CACHE_ALIAS
+   <mediaplatform.defaultsettings.IDENTITY_CACHE_ALIAS>` for :py:data:`IDENTITY_CACHE_TTL
+   <mediaplatform.defaultsettings.IDENTITY_CACHE_TTL>` seconds. After that, it is served stale
+   for up to a further :py:data:`IDENTITY_CACHE_STALE_TTL
+   <mediaplatform.defaultsettings.IDENTITY_CACHE_STALE_TTL>` seconds while the
+   :py:func:`mediaplatform.tasks.refresh_identity` task re-fetches it in the background.
+
+   Since the refreshed identity is stored by a Celery worker, this cache must be shared by the
+   web and Celery worker processes. The default cache configured by the project settings is
+   stored in the database. With a per-process cache, such as Django's local memory cache, web
+   workers would never see the refreshed identity and would serve a stale one until it expired.
+
+Cached identities are invalidated via :py:func:`invalidate` which is called automatically when a
+user signs in.
+
+"""
+import collections
+import logging
+import time
+
+import automationlookup
+from django.conf import settings
+from django.contrib.auth.signals import user_logged_in
+from django.core.cache import caches
+from django.dispatch import receiver
+from requests import HTTPError
+
+
+LOG = logging.getLogger(__name__)
+
+#: Name of the attribute on user objects used to memoise their identity for the current request.
+_MEMO_ATTRIBUTE = '_mediaplatform_identity'
+
+#: Counters recording how identities were resolved by this process. The keys are "request_hits",
+#: "cache_hits", "stale_hits" and "misses".
+_STATS = collections.Counter()
+
+
+class Identity(collections.namedtuple('Identity', 'groupids groupnames instids')):
+    """
+    The lookup group and institution memberships of a user. *groupids* and *groupnames* are
+    parallel lists giving the id and name of each group. *instids* is a list of institution ids.
+
+    """
+    @classmethod
+    def from_person(cls, person):
+        """
+        Construct an identity from a lookup person resource which was fetched with the
+        "all_groups" and "all_insts" fetch options.
+
+        """
+        # "be liberal in what you accept" - do not assume that all the fields we expect to be
+        # present in the result will be
+        groups = [
+            group for group in person.get('groups', []) if group.get('groupid') is not None
+        ]
+        return cls(
+            groupids=[group['groupid'] for group in groups],
+            groupnames=[group.get('name') for group in groups],
+            instids=[
+                inst.get('instid') for inst in person.get('institutions', [])
+                if inst.get('instid') is not None
+            ],
+        )
+
+
+#: The identity of a user with no entry in lookup.
+EMPTY_IDENTITY = Identity(groupids=[], groupnames=[], instids=[])
+
+
+def get_identity(user):
+    """
+    Return the :py:class:`~.Identity` of the passed non-anonymous Django user. The result is
+    cached as described in the module documentation so it is safe to call this multiple times.
+
+    """
+    identity = getattr(user, _MEMO_ATTRIBUTE, None)
+    if isinstance(identity, Identity):
+        _STATS['request_hits'] += 1
+        return identity
+
+    identity = _get_shared_identity(user.username)
+    setattr(user, _MEMO_ATTRIBUTE, identity)
+    return identity
+
+
+def invalidate(user_or_username):
+    """
+    Discard any cached identity for the passed Django user or username. If a user object is
+    passed, its per-request memo is also discarded.
+
+    """
+    if isinstance(user_or_username, str):
+        username = user_or_username
+    else:
+        username = user_or_username.username
+        try:
+            delattr(user_or_username, _MEMO_ATTRIBUTE)
+        except AttributeError:
+            pass
+
+    if _shared_cache_enabled():
+        _cache().delete(_cache_key(username))
+
+
+def refresh(username):
+    """
+    Re-fetch the identity of the passed username from lookup and store it in the shared cache
+    whether or not a cached value exists. Returns the fresh :py:class:`~.Identity`.
+
+    """
+    identity = _fetch_identity(username)
+    if _shared_cache_enabled():
+        _cache().set(
+            _cache_key(username), {'identity': tuple(identity), 'fetched_at': time.time()},
+            settings.IDENTITY_CACHE_TTL + settings.IDENTITY_CACHE_STALE_TTL
+        )
+    return identity
+
+
+def get_stats():
+    """
+    Return a dictionary of counters recording how identities have been resolved by this process.
+    The keys are "request_hits", "cache_hits", "stale_hits" and "misses".
+
+    """
+    return {
+        key: _STATS[key] for key in ('request_hits', 'cache_hits', 'stale_hits', 'misses')
+    }
+
+
+def reset_stats():
+    """
+    Reset the counters returned by :py:func:`~.get_stats`.
+
+    """
+    _STATS.clear()
+
+
+def get_local_person(identifier, scheme, fetch=None):
+    """
+    A stand-in for :py:func:`automationlookup.get_person` which returns person resources from the
+    :py:data:`IDENTITY_LOCAL_PEOPLE <mediaplatform.defaultsettings.IDENTITY_LOCAL_PEOPLE>`
+    setting. An unknown identifier raises the same 404 :py:class:`requests.HTTPError` which lookup
+    would.
+
+    """
+    try:
+        return settings.IDENTITY_LOCAL_PEOPLE[identifier]
+    except KeyError:
+        error = HTTPError(f'No such person: {scheme}/{identifier}')
+        error.response = collections.namedtuple('Response', 'status_code')(404)
+        raise error
+
+
+@receiver(user_logged_in)
+def _user_logged_in_handler(*args, user, **kwargs):
+    """
+    Called after a user signs in. Group and institution membership may have changed since we last
+    saw the user and so any cached identity is discarded.
+
+    """
+    invalidate(user)
+
+
+def _get_shared_identity(username):
+    """
+    Return the identity for the passed username from the shared cache if possible, scheduling a
+    refresh if the cached value is stale. If there is no cached value, fetch it from lookup.
+
+    """
+    if not _shared_cache_enabled():
+        _STATS['misses'] += 1
+        return _fetch_identity(username)
+
+    cache = _cache()
+    cached = cache.get(_cache_key(username))
+    if cached is None:
+        _STATS['misses'] += 1
+        return refresh(username)
+
+    identity = Identity(*cached['identity'])
+    if time.time() - cached['fetched_at'] <= settings.IDENTITY_CACHE_TTL:
+        _STATS['cache_hits'] += 1
+        return identity
+
+    _STATS['stale_hits'] += 1
+
+    # Only schedule one refresh per user per TTL period, even if many requests see the stale value
+    # before the refresh completes.
+    if cache.add(_cache_key(username) + ':refreshing', True, settings.IDENTITY_CACHE_TTL):
+        from . import tasks
+        try:
+            tasks.refresh_identity.delay(username)
+        except Exception as e:
+            # Serving a stale identity is better than failing the request.
+            LOG.warning('Could not schedule refresh of identity for %s: %s', username, e)
+
+    return identity
+
+
+def _fetch_identity(username):
+    """
+    Fetch the identity for the passed username from lookup or from the local stand-in if
+    :py:data:`IDENTITY_LOCAL_PEOPLE <mediaplatform.defaultsettings.IDENTITY_LOCAL_PEOPLE>` is
+    set.
+
+    """
+    get_person = (
+        automationlookup.get_person if settings.IDENTITY_LOCAL_PEOPLE is None
+        else get_local_person
+    )
+    try:
+        person = get_person(
+            identifier=username, scheme=getattr(settings, 'LOOKUP_SCHEME', 'crsid'),
+            fetch=['all_groups', 'all_insts']
+        )
+    except HTTPError as e:
+        if e.response.status_code == 404:
+            # A user with no entry in lookup should not be treated as an error - simply return
+            # an empty identity.
+            return EMPTY_IDENTITY
+        else:
+            raise e
+
+    return Identity.from_person(person)
+
+
+def _shared_cache_enabled():
+    """Return True if resolved identities should be stored in the shared cache."""
+    return settings.IDENTITY_CACHE_TTL > 0
+
+
+def _cache():
+    """Return the Django cache used to share resolved identities between requests."""
+    return caches[settings.IDENTITY_CACHE_ALIAS]
+
+
+def _cache_key(username):
+    """Return the key used to cache the identity for the passed username."""
+    return 'mediaplatform:identity:{}:{}'.format(
+        getattr(settings, 'LOOKUP_SCHEME', 'crsid'), username)
@@ -0,0 +1,169 @@
+"""
+The ``benchmarkeditable`` management command times the media item editable querysets,
+:py:meth:`~mediaplatform.models.MediaItemQuerySet.annotate_editable` and
+:py:meth:`~mediaplatform.models.MediaItemQuerySet.editable_by_user`, for a signed in user. It
+compares the denormalised ``is_sms_derived`` flags with the previous condition which joined the
+legacy SMS tables to determine if an item or its channel is SMS-derived.
+
+A synthetic catalogue is generated by ``generate_synthetic_catalogue`` and a fraction of its
+items and channels are marked as being derived from the legacy SMS. The catalogue is generated
+within a transaction which is rolled back once the benchmark completes unless ``--keep`` is
+passed. This command should never be run against a production database.
+
+Lookup is not consulted; the signed in user's groups and institutions are provided by the local
+lookup stand-in. See :py:data:`~mediaplatform.defaultsettings.IDENTITY_LOCAL_PEOPLE`.
+
+"""
+import random
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, models, transaction
+from django.test.utils import override_settings
+
+from legacysms import models as legacymodels
+from mediaplatform import models as mpmodels
+from mediaplatform.management.commands import generate_synthetic_catalogue as catalogue
+
+
+#: The lookup person resource for the signed in user.
+PERSON = {
+    'groups': [{'groupid': groupid} for groupid in catalogue.GROUPIDS[:5]],
+    'institutions': [{'instid': catalogue.INSTIDS[0]}],
+}
+
+
+class LegacyMediaItemQuerySet(mpmodels.MediaItemQuerySet):
+    """
+    A media item queryset whose editable condition joins the legacy SMS tables rather than using
+    the denormalised ``is_sms_derived`` flags. This is the condition used before those flags were
+    introduced.
+
+    """
+    def _editable_condition(self, user):
+        if mpmodels.capabilities_for_user(user).is_anonymous:
+            return ~models.Q(id=models.F('id'))
+
+        return (
+            self._permission_condition('channel__edit_permission', user) &
+            models.Q(sms__isnull=True) &
+            models.Q(channel__sms__isnull=True)
+        )
+
+
+class Command(BaseCommand):
+    help = 'Time the media item editable querysets with and without the is_sms_derived flags.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--items', type=int, default=500000, help='Number of media items (default: 500000)')
+        parser.add_argument(
+            '--channels', type=int, default=5000, help='Number of channels (default: 5000)')
+        parser.add_argument(
+            '--sms-fraction', type=float, default=0.5, dest='sms_fraction',
+            help='Fraction of items and channels which are SMS-derived (default: 0.5)')
+        parser.add_argument(
+            '--repeat', type=int, default=3,
+            help='Number of times each queryset is timed (default: 3)')
+        parser.add_argument(
+            '--seed', type=int, default=0, help='Random seed (default: 0)')
+        parser.add_argument(
+            '--keep', action='store_true',
+            help='Keep the generated catalogue rather than rolling it back')
+
+    def handle(self, *args, **options):
+        if options['repeat'] < 1:
+            raise CommandError('--repeat must be at least 1')
+        if not 0 <= options['sms_fraction'] <= 1:
+            raise CommandError('--sms-fraction must be between 0 and 1')
+
+        with transaction.atomic():
+            self._create_catalogue(options)
+
+            synthetic = models.Q(title__startswith=catalogue.TITLE_PREFIX)
+            user = get_user_model()(username=catalogue.CRSIDS[0], is_active=False)
+
+            with override_settings(
+                    IDENTITY_LOCAL_PEOPLE={catalogue.CRSIDS[0]: PERSON}, IDENTITY_CACHE_TTL=0):
+                for label, qs in [
+                        ('join', LegacyMediaItemQuerySet(model=mpmodels.MediaItem)),
+                        ('flag', mpmodels.MediaItem.objects.all())]:
+                    qs = qs.filter(synthetic)
+                    self._benchmark(
+                        label, 'editable_by_user',
+                        qs.editable_by_user(user).values_list('id'), options['repeat'])
+                    self._benchmark(
+                        label, 'annotate_editable',
+                        qs.annotate_editable(user).values_list('id', 'editable'),
+                        options['repeat'])
+
+            if not options['keep']:
+                transaction.set_rollback(True)
+
+    def _create_catalogue(self, options):
+        """
+        Generate a synthetic catalogue and mark a random fraction of its items and channels as
+        being derived from the legacy SMS.
+
+        """
+        rng = random.Random(options['seed'])
+        call_command(
+            'generate_synthetic_catalogue', items=options['items'], channels=options['channels'],
+            playlists=0, seed=options['seed'], stdout=self.stdout)
+
+        items = mpmodels.MediaItem.objects.filter(title__startswith=catalogue.TITLE_PREFIX)
+        channels = mpmodels.Channel.objects.filter(title__startswith=catalogue.TITLE_PREFIX)
+
+        # Legacy SMS ids are allocated after any which already exist.
+        first_sms_id = 1 + max(
+            legacymodels.MediaItem.objects.aggregate(max_id=models.Max('id'))['max_id'] or 0,
+            legacymodels.Collection.objects.aggregate(max_id=models.Max('id'))['max_id'] or 0)
+
+        item_ids = list(items.values_list('id', flat=True))
+        sms_item_ids = rng.sample(item_ids, int(len(item_ids) * options['sms_fraction']))
+        legacymodels.MediaItem.objects.bulk_create([
+            legacymodels.MediaItem(id=first_sms_id + index, item_id=item_id)
+            for index, item_id in enumerate(sms_item_ids)
+        ], batch_size=2000)
+
+        channel_ids = list(channels.values_list('id', flat=True))
+        sms_channel_ids = rng.sample(channel_ids, int(len(channel_ids) * options['sms_fraction']))
+        legacymodels.Collection.objects.bulk_create([
+            legacymodels.Collection(id=first_sms_id + index, channel_id=channel_id)
+            for index, channel_id in enumerate(sms_channel_ids)
+        ], batch_size=2000)
+
+        # Signal handlers are not run by bulk_create() and so compute the flags now.
+        items.update_sms_derived()
+        channels.update_sms_derived()
+        self.stdout.write(
+            f'Marked {len(sms_item_ids)} media items and {len(sms_channel_ids)} channels as '
+            f'SMS-derived')
+
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def _benchmark(self, label, name, qs, repeat):
+        """
+        Time evaluating *qs* *repeat* times and write the best and median times along with the
+        query plan.
+
+        """
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            rows = len(qs.all())
+            timings.append(1e3 * (time.perf_counter() - start))
+
+        self.stdout.write(
+            f'{label:>4} {name:<18} best {min(timings):9.2f}ms '
+            f'median {statistics.median(timings):9.2f}ms ({rows} rows)')
+
+        sql, params = qs.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN (ANALYZE, BUFFERS) ' + sql, params)
+            for line, in cursor.fetchall():
+                self.stdout.write(f'    {line}')
@@ -0,0 +1,193 @@
+"""
+The ``generate_synthetic_catalogue`` management command populates the database with a synthetic
+catalogue of channels, media items and playlists. It is intended for measuring how permission
+queries scale and should never be run against a production database.
+
+Objects are generated with distributions of permissions and JWP video statuses which approximate
+those of the real catalogue. Most media is public, a minority is restricted to signed in users
+and the remainder is restricted to lookup institutions, lookup groups or individual users drawn
+from :py:data:`~.INSTIDS`, :py:data:`~.GROUPIDS` and :py:data:`~.CRSIDS`. The number of items in
+each channel follows a long-tailed distribution.
+
+All generated objects have titles starting with :py:data:`~.TITLE_PREFIX`.
+
+"""
+import datetime
+import itertools
+import random
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from mediaplatform import models
+from mediaplatform_jwp import models as jwpmodels
+
+
+#: Prefix of the titles of all generated objects.
+TITLE_PREFIX = '[synthetic]'
+
+#: Lookup institutions, lookup groups and users which appear in generated permissions.
+INSTIDS = ['SYNINST{:03d}'.format(i) for i in range(200)]
+GROUPIDS = ['9{:05d}'.format(i) for i in range(2000)]
+CRSIDS = ['syn{}'.format(i) for i in range(5000)]
+
+#: Relative weights of JWP video statuses. Items with a status of None have no JWP video.
+JWP_STATUS_DISTRIBUTION = [
+    (90, 'ready'), (3, 'processing'), (1, 'failed'), (1, 'created'), (5, None),
+]
+
+#: Fraction of items with a publication date in the future.
+FUTURE_PUBLICATION_FRACTION = 0.02
+
+#: Tags which generated items are tagged with.
+TAGS = ['lecture', 'seminar', 'interview', 'research', 'outreach', 'training', 'event']
+
+
+def _public(rng, permission):
+    permission.is_public = True
+
+
+def _signed_in(rng, permission):
+    permission.is_signed_in = True
+
+
+def _inst(rng, permission):
+    permission.lookup_insts = [rng.choice(INSTIDS)]
+
+
+def _group(rng, permission):
+    permission.lookup_groups = [rng.choice(GROUPIDS)]
+
+
+def _crsids(rng, permission):
+    permission.crsids = rng.sample(CRSIDS, rng.randint(1, 5))
+
+
+def _mixed(rng, permission):
+    permission.lookup_insts = [rng.choice(INSTIDS)]
+    permission.lookup_groups = rng.sample(GROUPIDS, rng.randint(1, 3))
+    permission.crsids = [rng.choice(CRSIDS)]
+
+
+#: Relative weights of functions which set up a media item view permission.
+VIEW_PERMISSION_DISTRIBUTION = [
+    (70, _public), (15, _signed_in), (6, _inst), (4, _group), (3, _crsids), (2, _mixed),
+]
+
+#: Relative weights of functions which set up a channel edit permission.
+EDIT_PERMISSION_DISTRIBUTION = [(60, _crsids), (25, _group), (15, _mixed)]
+
+
+class Command(BaseCommand):
+    help = 'Populate the database with a synthetic catalogue for benchmarking.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--channels', type=int, default=500, help='Number of channels (default: 500)')
+        parser.add_argument(
+            '--items', type=int, default=100000, help='Number of media items (default: 100000)')
+        parser.add_argument(
+            '--playlists', type=int, default=2000, help='Number of playlists (default: 2000)')
+        parser.add_argument(
+            '--batch-size', type=int, default=2000, dest='batch_size',
+            help='Number of objects to insert per query (default: 2000)')
+        parser.add_argument(
+            '--seed', type=int, default=0, help='Random seed (default: 0)')
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        batch_size = options['batch_size']
+        now = timezone.now()
+
+        billing_account = models.BillingAccount.objects.create(
+            lookup_instid=INSTIDS[0], description=f'{TITLE_PREFIX} billing account')
+
+        channels = models.Channel.objects.bulk_create([
+            models.Channel(
+                title=f'{TITLE_PREFIX} channel {index}', billing_account=billing_account)
+            for index in range(options['channels'])
+        ], batch_size=batch_size)
+        models.Permission.objects.bulk_create([
+            self._permission(rng, EDIT_PERMISSION_DISTRIBUTION, allows_edit_channel=channel)
+            for channel in channels
+        ], batch_size=batch_size)
+        self.stdout.write(f'Created {len(channels)} channels')
+
+        # Channel sizes have a long tail: a few channels hold many items.
+        channel_cum_weights = list(itertools.accumulate(rng.paretovariate(1.2) for _ in channels))
+        items = []
+        for index in range(options['items']):
+            published_at = now - datetime.timedelta(days=rng.uniform(0, 3650))
+            if rng.random() < FUTURE_PUBLICATION_FRACTION:
+                published_at = now + datetime.timedelta(days=rng.uniform(1, 60))
+            items.append(models.MediaItem(
+                title=f'{TITLE_PREFIX} media item {index}',
+                description=f'Synthetic media item number {index}',
+                channel=rng.choices(channels, cum_weights=channel_cum_weights)[0],
+                published_at=published_at,
+                downloadable=rng.random() < 0.3,
+                type=models.MediaItem.VIDEO,
+                tags=rng.sample(TAGS, rng.randint(0, 3)),
+            ))
+        items = models.MediaItem.objects.bulk_create(items, batch_size=batch_size)
+        models.Permission.objects.bulk_create([
+            self._permission(rng, VIEW_PERMISSION_DISTRIBUTION, allows_view_item=item)
+            for item in items
+        ], batch_size=batch_size)
+        self.stdout.write(f'Created {len(items)} media items')
+
+        statuses, status_weights = zip(*((status, weight)
+                                         for weight, status in JWP_STATUS_DISTRIBUTION))
+        resources, videos = [], []
+        for item in items:
+            status = rng.choices(statuses, status_weights)[0]
+            if status is None:
+                continue
+            key = 'syn' + item.id
+            resources.append(jwpmodels.CachedResource(
+                key=key, type=jwpmodels.CachedResource.VIDEO,
+                data={'key': key, 'status': status, 'title': item.title},
+            ))
+            videos.append(jwpmodels.Video(
+                key=key, item=item, resource_id=key, updated=int(now.timestamp())))
+        jwpmodels.CachedResource.objects.bulk_create(resources, batch_size=batch_size)
+        jwpmodels.Video.objects.bulk_create(videos, batch_size=batch_size)
+        self.stdout.write(f'Created {len(videos)} JWP videos')
+
+        # Signal handlers are not run by bulk_create() and so compute publication state now.
+        published_count = (
+            models.MediaItem.objects.filter(id__in=[item.id for item in items]).update_published()
+        )
+        self.stdout.write(f'Updated publication state of {published_count} media items')
+
+        items_by_channel = {}
+        for item in items:
+            items_by_channel.setdefault(item.channel_id, []).append(item.id)
+        playlist_channels = [channel for channel in channels if channel.id in items_by_channel]
+        playlists = []
+        for index in range(options['playlists'] if playlist_channels else 0):
+            channel = rng.choice(playlist_channels)
+            channel_items = items_by_channel[channel.id]
+            playlists.append(models.Playlist(
+                title=f'{TITLE_PREFIX} playlist {index}', channel=channel,
+                media_items=rng.sample(channel_items, min(len(channel_items), rng.randint(1, 50))),
+            ))
+        playlists = models.Playlist.objects.bulk_create(playlists, batch_size=batch_size)
+        models.Permission.objects.bulk_create([
+            models.Permission(allows_view_playlist=playlist, is_public=True)
+            for playlist in playlists
+        ], batch_size=batch_size)
+        self.stdout.write(f'Created {len(playlists)} playlists')
+
+    def _permission(self, rng, distribution, **kwargs):
+        """
+        Return a new unsaved permission created with *kwargs* and set up by a function drawn from
+        *distribution*.
+
+        """
+        permission = models.Permission(**kwargs)
+        weights, functions = zip(*distribution)
+        rng.choices(functions, weights)[0](rng, permission)
+        return permission
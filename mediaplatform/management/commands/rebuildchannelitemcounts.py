@@ -0,0 +1,36 @@
+"""
+The ``rebuildchannelitemcounts`` management command recomputes the
+:py:class:`~mediaplatform.models.ChannelItemCount` rows for all channels from the media items
+they contain.
+
+The counts are kept up to date by database triggers and so this command need not be run
+routinely. It is provided to recover from the counts becoming inconsistent, for example after
+restoring the media item or permissions tables from a backup with triggers disabled. Writes to
+media items and permissions are blocked while the counts are being rebuilt.
+
+"""
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+
+# Raw SQL which recomputes the counts. The refresh function is created in migration 0032.
+REBUILD_SQL = [
+    r'''
+    LOCK TABLE mediaplatform_mediaitem, mediaplatform_permission IN SHARE MODE;
+    ''',
+    r'''
+    SELECT mediaplatform_channelitemcount_refresh(id) FROM mediaplatform_channel;
+    ''',
+]
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the per-channel counts of media items.'
+
+    def handle(self, *args, **options):
+        with transaction.atomic(), connection.cursor() as cursor:
+            for sql in REBUILD_SQL:
+                cursor.execute(sql)
+            row_count = cursor.rowcount
+
+        self.stdout.write(f'Counted items for {row_count} channels')
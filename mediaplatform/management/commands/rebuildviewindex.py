@@ -0,0 +1,42 @@
+"""
+The ``rebuildviewindex`` management command rebuilds the
+:py:class:`~mediaplatform.models.MediaItemViewPrincipal` index from the view permissions of all
+media items.
+
+The index is kept up to date by a database trigger and so this command need not be run routinely.
+It is provided to recover from the index becoming inconsistent, for example after restoring the
+permissions table from a backup with triggers disabled. Writes to permissions are blocked while
+the index is being rebuilt.
+
+"""
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+
+# Raw SQL which repopulates the index. This should match the trigger created in migration 0031.
+REBUILD_SQL = [
+    r'''
+    LOCK TABLE mediaplatform_permission IN SHARE MODE;
+    ''',
+    r'''
+    DELETE FROM mediaplatform_mediaitemviewprincipal;
+    ''',
+    r'''
+    INSERT INTO mediaplatform_mediaitemviewprincipal (item_id, principal)
+        SELECT DISTINCT allows_view_item_id, unnest(principals)
+        FROM mediaplatform_permission
+        WHERE allows_view_item_id IS NOT NULL;
+    ''',
+]
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the index of principals which may view each media item.'
+
+    def handle(self, *args, **options):
+        with transaction.atomic(), connection.cursor() as cursor:
+            for sql in REBUILD_SQL:
+                cursor.execute(sql)
+            row_count = cursor.rowcount
+
+        self.stdout.write(f'Indexed {row_count} principals')
@@ -0,0 +1,55 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from mediaplatform import models
+from mediaplatform_jwp import models as jwpmodels
+
+
+class GenerateSyntheticCatalogueTest(TestCase):
+    """
+    Tests for the generate_synthetic_catalogue management command.
+
+    """
+    def test_generate(self):
+        """The requested numbers of objects are created with permissions."""
+        call_command(
+            'generate_synthetic_catalogue', '--channels=5', '--items=200', '--playlists=10',
+            stdout=StringIO())
+
+        self.assertEqual(models.Channel.objects.count(), 5)
+        self.assertEqual(models.MediaItem.objects.count(), 200)
+        self.assertEqual(models.Playlist.objects.count(), 10)
+
+        # Every object has a permission
+        self.assertFalse(models.Channel.objects.filter(edit_permission__isnull=True).exists())
+        self.assertFalse(models.MediaItem.objects.filter(view_permission__isnull=True).exists())
+        self.assertFalse(models.Playlist.objects.filter(view_permission__isnull=True).exists())
+
+        # Most, but not all, items have a JWP video and are published
+        video_count = jwpmodels.Video.objects.count()
+        self.assertGreater(video_count, 100)
+        self.assertLess(video_count, 200)
+        published_count = models.MediaItem.objects.filter(is_published=True).count()
+        self.assertGreater(published_count, 100)
+        self.assertLess(published_count, 200)
+
+        # The view index is populated by the database triggers
+        self.assertTrue(models.MediaItemViewPrincipal.objects.exists())
+
+    def test_seed(self):
+        """The same seed generates the same permissions."""
+        call_command('generate_synthetic_catalogue', '--channels=2', '--items=50',
+                     '--playlists=0', '--seed=3', stdout=StringIO())
+        first = self.public_titles()
+        models.MediaItem.objects_including_deleted.all().delete()
+        call_command('generate_synthetic_catalogue', '--channels=2', '--items=50',
+                     '--playlists=0', '--seed=3', stdout=StringIO())
+        self.assertEqual(self.public_titles(), first)
+
+    def public_titles(self):
+        return set(
+            models.MediaItem.objects.filter(view_permission__is_public=True)
+            .values_list('title', flat=True)
+        )
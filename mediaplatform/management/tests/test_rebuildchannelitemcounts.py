@@ -0,0 +1,32 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from mediaplatform import models
+
+
+class RebuildChannelItemCountsTest(TestCase):
+    """
+    Tests for the rebuildchannelitemcounts management command.
+
+    """
+    fixtures = ['mediaplatform/tests/fixtures/test_data.yaml']
+
+    def test_rebuild(self):
+        """The counts are recomputed from the media items."""
+        expected = self.count_rows()
+        self.assertGreater(len(expected), 0)
+
+        models.ChannelItemCount.objects.update(
+            total_count=0, sms_derived_count=0, signed_in_count=0, public_count=0)
+        self.assertNotEqual(self.count_rows(), expected)
+
+        out = StringIO()
+        call_command('rebuildchannelitemcounts', stdout=out)
+        self.assertEqual(self.count_rows(), expected)
+        self.assertIn(str(len(expected)), out.getvalue())
+
+    def count_rows(self):
+        return set(models.ChannelItemCount.objects.values_list(
+            'channel_id', 'total_count', 'sms_derived_count', 'signed_in_count', 'public_count'))
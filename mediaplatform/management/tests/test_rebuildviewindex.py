@@ -0,0 +1,30 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from mediaplatform import models
+
+
+class RebuildViewIndexTest(TestCase):
+    """
+    Tests for the rebuildviewindex management command.
+
+    """
+    fixtures = ['mediaplatform/tests/fixtures/test_data.yaml']
+
+    def test_rebuild(self):
+        """The index is repopulated from the media item view permissions."""
+        expected = self.index_rows()
+        self.assertGreater(len(expected), 0)
+
+        models.MediaItemViewPrincipal.objects.all().delete()
+        self.assertEqual(self.index_rows(), set())
+
+        out = StringIO()
+        call_command('rebuildviewindex', stdout=out)
+        self.assertEqual(self.index_rows(), expected)
+        self.assertIn(str(len(expected)), out.getvalue())
+
+    def index_rows(self):
+        return set(models.MediaItemViewPrincipal.objects.values_list('item_id', 'principal'))
@@ -0,0 +1,77 @@
+import django.contrib.postgres.fields
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+import mediaplatform.models
+
+
+# Raw SQL which creates a trigger which ensures that the denormalised principals field is updated
+# when any of the fields it is derived from are updated. The format of the principal tokens must
+# match that used by mediaplatform.models.principals_for_permission.
+CREATE_TRIGGER_SQL = [
+    # A function intended to be run as a trigger on the mediaplatform.Permission table which will
+    # update the principals field to contain one token for each way the permission can be
+    # granted.
+    r'''
+    CREATE FUNCTION mediaplatform_permission_principalsupdate_trigger() RETURNS trigger AS $$
+    begin
+        new.principals :=
+            (CASE WHEN new.is_public THEN ARRAY['public'] ELSE '{}'::text[] END) ||
+            (CASE WHEN new.is_signed_in THEN ARRAY['signed_in'] ELSE '{}'::text[] END) ||
+            ARRAY(SELECT 'user:' || crsid FROM unnest(new.crsids) AS crsid) ||
+            ARRAY(SELECT 'group:' || groupid FROM unnest(new.lookup_groups) AS groupid) ||
+            ARRAY(SELECT 'inst:' || instid FROM unnest(new.lookup_insts) AS instid);
+        return new;
+    end
+    $$ LANGUAGE plpgsql;
+    ''',
+
+    # A trigger on the mediaplatform.Permission table which updates the principals field if any
+    # of the permission fields change or if a new row is inserted.
+    r'''
+    CREATE
+        TRIGGER mediaplatform_permission_principalsupdate
+    BEFORE
+        INSERT OR UPDATE OF crsids, lookup_groups, lookup_insts, is_public, is_signed_in,
+            principals
+    ON
+        mediaplatform_permission
+    FOR EACH ROW
+        EXECUTE PROCEDURE mediaplatform_permission_principalsupdate_trigger();
+    ''',
+
+    # Perform a trivial update of the mediaplatform.Permission table to cause the trigger to be
+    # run for each row and so backfill the principals field.
+    r'''
+    UPDATE mediaplatform_permission SET is_public=is_public;
+    ''',
+]
+
+# Drop the trigger and trigger function created by CREATE_TRIGGER_SQL.
+DROP_TRIGGER_SQL = [
+    r'''
+    DROP TRIGGER mediaplatform_permission_principalsupdate ON mediaplatform_permission;
+    ''',
+    r'''
+    DROP FUNCTION mediaplatform_permission_principalsupdate_trigger;
+    ''',
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mediaplatform', '0027_create_transcription_request_model'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='permission',
+            name='principals',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.TextField(), blank=True, default=mediaplatform.models._blank_array, editable=False, size=None),
+        ),
+        migrations.AddIndex(
+            model_name='permission',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['principals'], name='mediaplatfo_princip_df9792_gin'),
+        ),
+        migrations.RunSQL(CREATE_TRIGGER_SQL, DROP_TRIGGER_SQL),
+    ]
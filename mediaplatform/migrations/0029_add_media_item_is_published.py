@@ -0,0 +1,50 @@
+from django.db import migrations, models
+
+
+# Raw SQL which sets the materialised is_published flag for all existing media items. This must
+# match the logic in mediaplatform.models.MediaItemQuerySet._computed_published_condition: an item
+# is *NOT* published if its publication time is in the future or if it has an associated JWP video
+# whose cached resource does not have the status "ready". A video with no cached resource, or whose
+# resource has no status, is not ready and so the resource is LEFT JOIN-ed.
+UPDATE_IS_PUBLISHED_SQL = r'''
+    UPDATE
+        mediaplatform_mediaitem AS item
+    SET
+        is_published = NOT (
+            item.published_at > NOW()
+            OR EXISTS (
+                SELECT
+                    1
+                FROM
+                    mediaplatform_jwp_video AS video
+                    LEFT JOIN mediaplatform_jwp_cachedresource AS resource
+                        ON video.resource_id = resource.key
+                WHERE
+                    video.item_id = item.id
+                    AND (resource.data ->> 'status') IS DISTINCT FROM 'ready'
+            )
+        );
+'''
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mediaplatform', '0028_add_permission_principals'),
+        ('mediaplatform_jwp', '0005_add_reference_to_cached_resource'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mediaitem',
+            name='is_published',
+            field=models.BooleanField(default=False, editable=False, help_text='Is the item currently published?'),
+        ),
+        migrations.AddIndex(
+            model_name='mediaitem',
+            index=models.Index(fields=['is_published'], name='mediaplatfo_is_publ_1c03c7_idx'),
+        ),
+        # The reverse operation is a no-op since the field is removed when the migration is
+        # reversed.
+        migrations.RunSQL(UPDATE_IS_PUBLISHED_SQL, migrations.RunSQL.noop),
+    ]
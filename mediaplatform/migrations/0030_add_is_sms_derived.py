@@ -0,0 +1,55 @@
+from django.db import migrations, models
+
+
+# Raw SQL which sets the denormalised is_sms_derived flags for all existing media items and
+# channels.
+UPDATE_IS_SMS_DERIVED_SQL = [
+    r'''
+    UPDATE
+        mediaplatform_mediaitem AS item
+    SET
+        is_sms_derived = EXISTS (
+            SELECT 1 FROM legacysms_mediaitem AS sms WHERE sms.item_id = item.id
+        );
+    ''',
+    r'''
+    UPDATE
+        mediaplatform_channel AS channel
+    SET
+        is_sms_derived = EXISTS (
+            SELECT 1 FROM legacysms_collection AS sms WHERE sms.channel_id = channel.id
+        );
+    ''',
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mediaplatform', '0029_add_media_item_is_published'),
+        ('legacysms', '0003_add_collection_playlist_field'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='channel',
+            name='is_sms_derived',
+            field=models.BooleanField(default=False, editable=False, help_text='Is the channel derived from the legacy SMS?'),
+        ),
+        migrations.AddField(
+            model_name='mediaitem',
+            name='is_sms_derived',
+            field=models.BooleanField(default=False, editable=False, help_text='Is the item derived from the legacy SMS?'),
+        ),
+        migrations.AddIndex(
+            model_name='mediaitem',
+            index=models.Index(fields=['is_sms_derived'], name='mediaplatfo_is_sms__76ac72_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='channel',
+            index=models.Index(fields=['is_sms_derived'], name='mediaplatfo_is_sms__a9f573_idx'),
+        ),
+        # The reverse operation is a no-op since the fields are removed when the migration is
+        # reversed.
+        migrations.RunSQL(UPDATE_IS_SMS_DERIVED_SQL, migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,101 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+# Raw SQL which creates a trigger which keeps the mediaplatform.MediaItemViewPrincipal index in
+# step with the principals of media item view permissions.
+CREATE_TRIGGER_SQL = [
+    # A function intended to be run as a trigger on the mediaplatform.Permission table which will
+    # remove index rows for principals which no longer have view permission and add rows for
+    # principals which have gained it. Note that the principals field is itself updated by a
+    # BEFORE trigger and so is up to date by the time this AFTER trigger runs.
+    r'''
+    CREATE FUNCTION mediaplatform_permission_viewprincipalsupdate_trigger() RETURNS trigger AS $$
+    begin
+        IF TG_OP = 'DELETE' THEN
+            DELETE FROM mediaplatform_mediaitemviewprincipal
+                WHERE item_id = old.allows_view_item_id;
+            RETURN NULL;
+        END IF;
+
+        IF TG_OP = 'UPDATE' THEN
+            IF old.allows_view_item_id IS NOT DISTINCT FROM new.allows_view_item_id
+                    AND old.principals = new.principals THEN
+                RETURN NULL;
+            END IF;
+
+            DELETE FROM mediaplatform_mediaitemviewprincipal
+                WHERE item_id = old.allows_view_item_id
+                    AND (
+                        old.allows_view_item_id IS DISTINCT FROM new.allows_view_item_id
+                        OR NOT (principal = ANY(new.principals))
+                    );
+        END IF;
+
+        IF new.allows_view_item_id IS NOT NULL THEN
+            INSERT INTO mediaplatform_mediaitemviewprincipal (item_id, principal)
+                SELECT DISTINCT new.allows_view_item_id, principal
+                FROM unnest(new.principals) AS principal
+                ON CONFLICT DO NOTHING;
+        END IF;
+
+        RETURN NULL;
+    end
+    $$ LANGUAGE plpgsql;
+    ''',
+
+    # A trigger on the mediaplatform.Permission table which updates the index when a permission is
+    # inserted, updated or deleted. Note that we cannot use "UPDATE OF principals" here since
+    # principals is usually changed by a trigger rather than appearing in the UPDATE statement.
+    r'''
+    CREATE
+        TRIGGER mediaplatform_permission_viewprincipalsupdate
+    AFTER
+        INSERT OR UPDATE OR DELETE
+    ON
+        mediaplatform_permission
+    FOR EACH ROW
+        EXECUTE PROCEDURE mediaplatform_permission_viewprincipalsupdate_trigger();
+    ''',
+
+    # Populate the index for existing permissions.
+    r'''
+    INSERT INTO mediaplatform_mediaitemviewprincipal (item_id, principal)
+        SELECT DISTINCT allows_view_item_id, unnest(principals)
+        FROM mediaplatform_permission
+        WHERE allows_view_item_id IS NOT NULL;
+    ''',
+]
+
+# Drop the trigger and trigger function created by CREATE_TRIGGER_SQL.
+DROP_TRIGGER_SQL = [
+    r'''
+    DROP TRIGGER mediaplatform_permission_viewprincipalsupdate ON mediaplatform_permission;
+    ''',
+    r'''
+    DROP FUNCTION mediaplatform_permission_viewprincipalsupdate_trigger;
+    ''',
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mediaplatform', '0030_add_is_sms_derived'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaItemViewPrincipal',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('principal', models.TextField(editable=False)),
+                ('item', models.ForeignKey(editable=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='mediaplatform.MediaItem')),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='mediaitemviewprincipal',
+            unique_together={('principal', 'item')},
+        ),
+        migrations.RunSQL(CREATE_TRIGGER_SQL, DROP_TRIGGER_SQL),
+    ]
@@ -0,0 +1,241 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+# Raw SQL which creates triggers which keep mediaplatform.ChannelItemCount in step with the media
+# items in each channel. The visibility classes must match those documented on the model.
+CREATE_TRIGGER_SQL = [
+    # A function which recomputes the counts for a single channel from scratch, creating the
+    # counts row if it does not exist.
+    r'''
+    CREATE FUNCTION mediaplatform_channelitemcount_refresh(target_channel_id varchar)
+    RETURNS void AS $$
+    begin
+        INSERT INTO mediaplatform_channelitemcount (
+                channel_id, total_count, sms_derived_count, signed_in_count, public_count)
+            SELECT
+                target_channel_id,
+                count(item.id),
+                count(item.id) FILTER (WHERE item.is_sms_derived),
+                count(item.id) FILTER (
+                    WHERE item.is_published
+                        AND perm.principals && ARRAY['public', 'signed_in']::text[]),
+                count(item.id) FILTER (
+                    WHERE item.is_published AND 'public' = ANY(perm.principals))
+            FROM
+                mediaplatform_mediaitem AS item
+                LEFT JOIN mediaplatform_permission AS perm
+                    ON perm.allows_view_item_id = item.id
+            WHERE
+                item.channel_id = target_channel_id AND item.deleted_at IS NULL
+        ON CONFLICT (channel_id) DO UPDATE SET
+            total_count = EXCLUDED.total_count,
+            sms_derived_count = EXCLUDED.sms_derived_count,
+            signed_in_count = EXCLUDED.signed_in_count,
+            public_count = EXCLUDED.public_count;
+    end
+    $$ LANGUAGE plpgsql;
+    ''',
+
+    # A function which adds the contribution of a single media item to the counts for its
+    # channel. The item's membership of the channel is scaled by membership_delta and its
+    # visibility by visibility_delta so that callers can add or remove either independently.
+    r'''
+    CREATE FUNCTION mediaplatform_channelitemcount_add(
+        item_channel_id varchar, item_deleted_at timestamp with time zone,
+        item_is_published boolean, item_is_sms_derived boolean, item_principals text[],
+        membership_delta integer, visibility_delta integer
+    ) RETURNS void AS $$
+    begin
+        IF item_channel_id IS NULL OR item_deleted_at IS NOT NULL THEN
+            RETURN;
+        END IF;
+
+        UPDATE mediaplatform_channelitemcount SET
+            total_count = total_count + membership_delta,
+            sms_derived_count = sms_derived_count
+                + (CASE WHEN item_is_sms_derived THEN membership_delta ELSE 0 END),
+            signed_in_count = signed_in_count + (CASE
+                WHEN item_is_published
+                    AND item_principals && ARRAY['public', 'signed_in']::text[]
+                THEN visibility_delta ELSE 0 END),
+            public_count = public_count + (CASE
+                WHEN item_is_published AND 'public' = ANY(item_principals)
+                THEN visibility_delta ELSE 0 END)
+        WHERE channel_id = item_channel_id;
+    end
+    $$ LANGUAGE plpgsql;
+    ''',
+
+    # A function intended to be run as a trigger on the mediaplatform.MediaItem table which will
+    # remove the old item's contribution to its channel's counts and add the new one. Updates
+    # which do not change any field the counts depend on are skipped.
+    r'''
+    CREATE FUNCTION mediaplatform_mediaitem_channelitemcount_trigger() RETURNS trigger AS $$
+    begin
+        IF TG_OP = 'UPDATE'
+                AND old.channel_id IS NOT DISTINCT FROM new.channel_id
+                AND old.deleted_at IS NOT DISTINCT FROM new.deleted_at
+                AND old.is_published = new.is_published
+                AND old.is_sms_derived = new.is_sms_derived THEN
+            RETURN NULL;
+        END IF;
+
+        IF TG_OP IN ('UPDATE', 'DELETE') THEN
+            PERFORM mediaplatform_channelitemcount_add(
+                old.channel_id, old.deleted_at, old.is_published, old.is_sms_derived,
+                (SELECT principals FROM mediaplatform_permission
+                    WHERE allows_view_item_id = old.id),
+                -1, -1);
+        END IF;
+
+        IF TG_OP IN ('INSERT', 'UPDATE') THEN
+            PERFORM mediaplatform_channelitemcount_add(
+                new.channel_id, new.deleted_at, new.is_published, new.is_sms_derived,
+                (SELECT principals FROM mediaplatform_permission
+                    WHERE allows_view_item_id = new.id),
+                1, 1);
+        END IF;
+
+        RETURN NULL;
+    end
+    $$ LANGUAGE plpgsql;
+    ''',
+
+    r'''
+    CREATE
+        TRIGGER mediaplatform_mediaitem_channelitemcount
+    AFTER
+        INSERT OR UPDATE OR DELETE
+    ON
+        mediaplatform_mediaitem
+    FOR EACH ROW
+        EXECUTE PROCEDURE mediaplatform_mediaitem_channelitemcount_trigger();
+    ''',
+
+    # A function intended to be run as a trigger on the mediaplatform.Permission table which will
+    # move the visibility contribution of a media item when its view permission changes. As with
+    # the view principal index, principals is set by a BEFORE trigger and so cannot be used in an
+    # "UPDATE OF" clause.
+    r'''
+    CREATE FUNCTION mediaplatform_permission_channelitemcount_trigger() RETURNS trigger AS $$
+    declare
+        item record;
+    begin
+        IF TG_OP = 'UPDATE'
+                AND old.allows_view_item_id IS NOT DISTINCT FROM new.allows_view_item_id
+                AND old.principals = new.principals THEN
+            RETURN NULL;
+        END IF;
+
+        IF TG_OP IN ('UPDATE', 'DELETE') AND old.allows_view_item_id IS NOT NULL THEN
+            SELECT * INTO item FROM mediaplatform_mediaitem WHERE id = old.allows_view_item_id;
+            IF FOUND THEN
+                PERFORM mediaplatform_channelitemcount_add(
+                    item.channel_id, item.deleted_at, item.is_published, item.is_sms_derived,
+                    old.principals, 0, -1);
+            END IF;
+        END IF;
+
+        IF TG_OP IN ('INSERT', 'UPDATE') AND new.allows_view_item_id IS NOT NULL THEN
+            SELECT * INTO item FROM mediaplatform_mediaitem WHERE id = new.allows_view_item_id;
+            IF FOUND THEN
+                PERFORM mediaplatform_channelitemcount_add(
+                    item.channel_id, item.deleted_at, item.is_published, item.is_sms_derived,
+                    new.principals, 0, 1);
+            END IF;
+        END IF;
+
+        RETURN NULL;
+    end
+    $$ LANGUAGE plpgsql;
+    ''',
+
+    r'''
+    CREATE
+        TRIGGER mediaplatform_permission_channelitemcount
+    AFTER
+        INSERT OR UPDATE OR DELETE
+    ON
+        mediaplatform_permission
+    FOR EACH ROW
+        EXECUTE PROCEDURE mediaplatform_permission_channelitemcount_trigger();
+    ''',
+
+    # A function intended to be run as a trigger on the mediaplatform.Channel table which creates
+    # the counts row for new channels. The counts are computed rather than set to zero in case
+    # items were inserted before the channel within the same transaction, e.g. by a fixture.
+    r'''
+    CREATE FUNCTION mediaplatform_channel_channelitemcount_trigger() RETURNS trigger AS $$
+    begin
+        PERFORM mediaplatform_channelitemcount_refresh(new.id);
+        RETURN NULL;
+    end
+    $$ LANGUAGE plpgsql;
+    ''',
+
+    r'''
+    CREATE
+        TRIGGER mediaplatform_channel_channelitemcount
+    AFTER
+        INSERT
+    ON
+        mediaplatform_channel
+    FOR EACH ROW
+        EXECUTE PROCEDURE mediaplatform_channel_channelitemcount_trigger();
+    ''',
+
+    # Populate the counts for existing channels.
+    r'''
+    SELECT mediaplatform_channelitemcount_refresh(id) FROM mediaplatform_channel;
+    ''',
+]
+
+# Drop the triggers and functions created by CREATE_TRIGGER_SQL.
+DROP_TRIGGER_SQL = [
+    r'''
+    DROP TRIGGER mediaplatform_channel_channelitemcount ON mediaplatform_channel;
+    ''',
+    r'''
+    DROP FUNCTION mediaplatform_channel_channelitemcount_trigger;
+    ''',
+    r'''
+    DROP TRIGGER mediaplatform_permission_channelitemcount ON mediaplatform_permission;
+    ''',
+    r'''
+    DROP FUNCTION mediaplatform_permission_channelitemcount_trigger;
+    ''',
+    r'''
+    DROP TRIGGER mediaplatform_mediaitem_channelitemcount ON mediaplatform_mediaitem;
+    ''',
+    r'''
+    DROP FUNCTION mediaplatform_mediaitem_channelitemcount_trigger;
+    ''',
+    r'''
+    DROP FUNCTION mediaplatform_channelitemcount_add;
+    ''',
+    r'''
+    DROP FUNCTION mediaplatform_channelitemcount_refresh;
+    ''',
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mediaplatform', '0031_add_media_item_view_principal'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChannelItemCount',
+            fields=[
+                ('channel', models.OneToOneField(editable=False, on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='item_counts', serialize=False, to='mediaplatform.Channel')),
+                ('total_count', models.BigIntegerField(default=0, editable=False)),
+                ('sms_derived_count', models.BigIntegerField(default=0, editable=False)),
+                ('signed_in_count', models.BigIntegerField(default=0, editable=False)),
+                ('public_count', models.BigIntegerField(default=0, editable=False)),
+            ],
+        ),
+        migrations.RunSQL(CREATE_TRIGGER_SQL, DROP_TRIGGER_SQL),
+    ]
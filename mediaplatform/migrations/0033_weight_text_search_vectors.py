@@ -0,0 +1,78 @@
+from django.db import migrations
+
+
+# A template for a trigger function on one of the mediaplatform tables which sets the text search
+# vector field. The function is replaced in place so that the existing triggers created by
+# migrations 0018 and 0019 continue to call it.
+FUNCTION_TEMPLATE = r'''
+    CREATE OR REPLACE FUNCTION mediaplatform_{table}_tsvectorupdate_trigger() RETURNS trigger AS $$
+    begin
+        new.text_search_vector := {vector};
+        return new;
+    end
+    $$ LANGUAGE plpgsql;
+'''
+
+# Weighted vectors. Matches in the title are weighted "A", matches in tags "B" and matches in the
+# description "C" so that ts_rank() ranks title matches above tag and description matches.
+WEIGHTED_MEDIAITEM_VECTOR = r'''
+            setweight(to_tsvector('pg_catalog.english', coalesce(new.title, '')), 'A') ||
+            setweight(to_tsvector(
+                'pg_catalog.english', coalesce(array_to_string(new.tags, ' '), '')), 'B') ||
+            setweight(to_tsvector('pg_catalog.english', coalesce(new.description, '')), 'C')
+'''
+
+WEIGHTED_VECTOR = r'''
+            setweight(to_tsvector('pg_catalog.english', coalesce(new.title, '')), 'A') ||
+            setweight(to_tsvector('pg_catalog.english', coalesce(new.description, '')), 'C')
+'''
+
+# The unweighted vectors created by migrations 0018 and 0019.
+UNWEIGHTED_MEDIAITEM_VECTOR = r'''
+            to_tsvector('pg_catalog.english', concat(
+                coalesce(new.title, ''),
+                ' ',
+                coalesce(new.description, ''),
+                ' ',
+                array_to_string(new.tags, ' ')
+            ))
+'''
+
+UNWEIGHTED_VECTOR = r'''
+            to_tsvector('pg_catalog.english', concat(
+                coalesce(new.title, ''),
+                ' ',
+                coalesce(new.description, '')
+            ))
+'''
+
+
+def _replace_functions_sql(mediaitem_vector, vector):
+    """
+    Return a list of SQL statements which replace the trigger functions for media items, channels
+    and playlists and then perform a trivial update of each table to cause the triggers to be run
+    for each row.
+
+    """
+    sql = []
+    for table, table_vector in (
+            ('mediaitem', mediaitem_vector), ('channel', vector), ('playlist', vector)):
+        sql.extend([
+            FUNCTION_TEMPLATE.format(table=table, vector=table_vector.strip()),
+            f'UPDATE mediaplatform_{table} SET title=title;',
+        ])
+    return sql
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mediaplatform', '0032_add_channel_item_count'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            _replace_functions_sql(WEIGHTED_MEDIAITEM_VECTOR, WEIGHTED_VECTOR),
+            _replace_functions_sql(UNWEIGHTED_MEDIAITEM_VECTOR, UNWEIGHTED_VECTOR),
+        ),
+    ]
@@ -0,0 +1,43 @@
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations, models
+
+
+# Trigram indexes which allow case-insensitive substring and regular expression matches against
+# titles and tags to use an index. Django 2.1 cannot express index operator classes and so these
+# are created with raw SQL.
+TRIGRAM_INDEXES = [
+    ('mediaplatform_mediaitem', 'title', 'mediaplatform_mediaitem_title_trgm'),
+    ('mediaplatform_channel', 'title', 'mediaplatform_channel_title_trgm'),
+    ('mediaplatform_playlist', 'title', 'mediaplatform_playlist_title_trgm'),
+    ('mediaplatform_mediaitemtag', 'key', 'mediaplatform_mediaitemtag_key_trgm'),
+]
+
+CREATE_INDEXES_SQL = [
+    f'CREATE INDEX {name} ON {table} USING gin ({column} gin_trgm_ops);'
+    for table, column, name in TRIGRAM_INDEXES
+]
+
+DROP_INDEXES_SQL = [
+    f'DROP INDEX {name};' for _, _, name in TRIGRAM_INDEXES
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mediaplatform', '0033_weight_text_search_vectors'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.CreateModel(
+            name='MediaItemTag',
+            fields=[
+                ('key', models.TextField(editable=False, primary_key=True, serialize=False)),
+                ('name', models.TextField(editable=False)),
+                ('public_count', models.BigIntegerField(default=0, editable=False)),
+                ('signed_in_count', models.BigIntegerField(default=0, editable=False)),
+            ],
+        ),
+        migrations.RunSQL(CREATE_INDEXES_SQL, DROP_INDEXES_SQL),
+    ]
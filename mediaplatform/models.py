@@ -3,23 +3,26 @@ import itertools
 import secrets
 import typing
 
-import automationlookup
 from django.conf import settings
 import django.contrib.postgres.fields as pgfields
 import django.contrib.postgres.indexes as pgindexes
 import django.contrib.postgres.search as pgsearch
-from django.db import models
+from django.core.exceptions import EmptyResultSet
+from django.db import connections, models, router
 from django.db.models import Q, expressions, functions
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 from django.utils import timezone
 from django.utils.functional import cached_property
 from iso639 import languages
+from psycopg2.extras import execute_values
+import reversion
 
+from . import identity as mpidentity
+from . import signals as mpsignals
 
-#: The number of bytes of entropy in the tokens returned by _make_token.
-from requests import HTTPError
 
+#: The number of bytes of entropy in the tokens returned by _make_token.
 _TOKEN_ENTROPY = 8
 
 
@@ -51,40 +54,99 @@ def _blank_array():
     return []
 
 
+def bulk_update(model, objs, fields):
+    """
+    Write the values of the named *fields* on each of the saved model instances in *objs* to the
+    database with a single UPDATE ... FROM (VALUES ...) statement. Since the instances' save()
+    methods are not called, no signals are sent and auto_now fields are not updated. For media
+    items, :py:meth:`MediaItemManager.bulk_update_fields` also records the change.
+
+    """
+    if len(objs) == 0:
+        return
+
+    connection = connections[router.db_for_write(model)]
+    quote_name = connection.ops.quote_name
+    pk_field = model._meta.pk
+    fields = [pk_field] + [model._meta.get_field(name) for name in fields]
+    columns = [quote_name(field.column) for field in fields]
+
+    # Each value is cast to the column type since PostgreSQL cannot infer the types of the
+    # parameters in a VALUES list.
+    template = '({})'.format(', '.join(
+        f'%s::{field.db_type(connection)}' for field in fields
+    ))
+
+    with connection.cursor() as cursor:
+        execute_values(cursor, '''
+            UPDATE {table} AS target SET {assignments}
+            FROM (VALUES %s) AS source ({columns})
+            WHERE target.{pk} = source.{pk}
+        '''.format(
+            table=quote_name(model._meta.db_table),
+            assignments=', '.join(f'{column} = source.{column}' for column in columns[1:]),
+            columns=', '.join(columns), pk=columns[0],
+        ), [
+            tuple(field.get_db_prep_save(getattr(obj, field.attname), connection)
+                  for field in fields)
+            for obj in objs
+        ], template=template, page_size=len(objs))
+
+
 class PermissionQuerySetMixin:
     def _permission_condition(self, fieldname, user):
         """
         Return a queryset expression for the permission field "fieldname" which is True if the
         passed user has that permission.
 
-        """
-        # Start with the condition that the item must be public
-        condition = models.Q(**{fieldname + '__is_public': True})
+        The check is made against the denormalised :py:attr:`~.Permission.principals` field and so
+        compiles to a single array overlap ("&&") which can make use of the GIN index on that
+        field.
 
-        # If a non-None user was passed and the user is not anonymous, we can add additional ways
-        # the item can be viewed
-        if user is not None and not user.is_anonymous:
-            groupids, instids = _lookup_groupids_and_instids_for_user(user)
+        """
+        return models.Q(**{
+            fieldname + '__principals__overlap': capabilities_for_user(user).principals
+        })
 
-            # Irrespective of user groups/institutions, any signed in user has the is_signed_in
-            # permission
-            condition |= models.Q(**{fieldname + '__is_signed_in': True})
+    #: Names of the permission flags returned by permissions_for_user(). This must include
+    #: "viewable" and each flag must have a corresponding "annotate_<flag>" method which accepts
+    #: the user and annotation name.
+    permission_flags = ()
 
-            # The user may also be explicitly mentioned in the list of allowed crsids
-            condition |= models.Q(**{fieldname + '__crsids__contains': [user.username]})
+    def permissions_for_user(self, user, ids):
+        """
+        Return a dictionary mapping each id in *ids* to a dictionary giving the value of each flag
+        in :py:attr:`~.permission_flags` for the passed Django user. All flags are computed in a
+        single database query. Ids which are not present in the queryset or which are not viewable
+        by the user have all flags set to ``False`` so that the result does not reveal which
+        objects exist.
 
-            # The user's lookup groups may overlap with the allowed set
-            condition |= models.Q(**{fieldname + '__lookup_groups__overlap': groupids})
+        """
+        annotation_names = ['_permission_' + flag for flag in self.permission_flags]
+        qs = self.filter(id__in=ids)
+        for flag, annotation_name in zip(self.permission_flags, annotation_names):
+            qs = getattr(qs, 'annotate_' + flag)(user, name=annotation_name)
 
-            # The user's lookup institutions may overlap with the allowed set
-            condition |= models.Q(**{fieldname + '__lookup_insts__overlap': instids})
+        no_permissions = {flag: False for flag in self.permission_flags}
+        permissions = {}
+        for object_id, *values in qs.values_list('id', *annotation_names):
+            flags = dict(zip(self.permission_flags, values))
+            permissions[object_id] = flags if flags['viewable'] else no_permissions
 
-        return condition
+        return {
+            object_id: dict(permissions.get(object_id, no_permissions)) for object_id in ids
+        }
 
 
 class MediaItemQuerySet(PermissionQuerySetMixin, models.QuerySet):
+    permission_flags = ('viewable', 'editable', 'downloadable')
 
     def _published_condition(self):
+        # An item is published if its materialised is_published flag is set. See
+        # update_published() for how that flag is maintained.
+        return models.Q(is_published=True)
+
+    def _computed_published_condition(self):
         # An item is *NOT* published if any of the following are true:
         #
         # 1. It has a publication time is in the future.
@@ -96,6 +158,24 @@ class MediaItemQuerySet(PermissionQuerySetMixin, models.QuerySet):
             (models.Q(jwp__isnull=False) & ~models.Q(jwp__resource__data__status='ready'))
         )
 
+    def update_published(self):
+        """
+        Re-compute the materialised :py:attr:`~.MediaItem.is_published` flag for all items in the
+        queryset. Only rows whose flag actually changes are written. Returns the number of items
+        whose flag changed.
+
+        """
+        # Evaluating the publication condition requires joins which cannot be used directly in
+        # update() and so we use it to select the ids of published items.
+        published_ids = self.filter(self._computed_published_condition()).values('id')
+
+        return (
+            self.filter(is_published=False, id__in=published_ids)
+            .update(is_published=True) +
+            self.filter(is_published=True).exclude(id__in=published_ids)
+            .update(is_published=False)
+        )
+
     def _viewable_condition(self, user):
         # The item can be viewed if any of the following are satisfied:
         #
@@ -105,12 +185,12 @@ class MediaItemQuerySet(PermissionQuerySetMixin, models.QuerySet):
 
         # If the user has the correct permission, return a tautology. There doesn't appear to be a
         # cleaner way to express "True" as a Django Q() expression
-        if user is not None and user.has_perm('mediaplatform.view_mediaitem'):
+        if capabilities_for_user(user).can_view_all_media_items:
             return models.Q(id=models.F('id'))
 
         return (
             (
-                self._permission_condition('view_permission', user) &
+                self._view_permission_condition(user) &
                 self._published_condition()
             ) |
             self._editable_condition(user)
@@ -136,20 +216,32 @@ class MediaItemQuerySet(PermissionQuerySetMixin, models.QuerySet):
         """
         return self.filter(self._viewable_condition(user))
 
+    def _view_permission_condition(self, user):
+        # If the view principal index is in use, check for the user's principals in the index via
+        # a semi-join rather than by checking each item's view permission.
+        if settings.MEDIA_ITEM_VIEWABLE_STRATEGY == 'index':
+            return models.Q(id__in=(
+                MediaItemViewPrincipal.objects
+                .filter(principal__in=capabilities_for_user(user).principals)
+                .values('item_id')
+            ))
+
+        return self._permission_condition('view_permission', user)
+
     def _editable_condition(self, user):
-        # In #336 it was noted that the SMS check below is very expensive. While we wait for a
-        # proper fix, we can get a quick win by short-cutting this check if the user is anonymous;
-        # if the user is anonymous, return a condition which is always false. There does not appear
-        # to be a cleaner way to express "False" as a Django Q() expression
-        if user is None or user.is_anonymous:
+        # Anonymous users can never edit items so we can short-cut this check if the user is
+        # anonymous; return a condition which is always false. There does not appear to be a
+        # cleaner way to express "False" as a Django Q() expression
+        if capabilities_for_user(user).is_anonymous:
             return ~models.Q(id=models.F('id'))
 
         # For the moment, we make sure that *all* SMS-derived objects are immutable to guard
-        # against accidents.
+        # against accidents. In #336 it was noted that checking for related SMS objects directly
+        # is very expensive and so we use the denormalised is_sms_derived flags.
         return (
             self._permission_condition('channel__edit_permission', user) &
-            models.Q(sms__isnull=True) &
-            models.Q(channel__sms__isnull=True)
+            models.Q(is_sms_derived=False) &
+            models.Q(channel__is_sms_derived=False)
         )
 
     def annotate_editable(self, user, name='editable'):
@@ -180,7 +272,7 @@ class MediaItemQuerySet(PermissionQuerySetMixin, models.QuerySet):
 
         # If the user has the correct permission, return a tautology. There doesn't appear to be a
         # cleaner way to express "True" as a Django Q() expression
-        if user is not None and user.has_perm('mediaplatform.download_mediaitem'):
+        if capabilities_for_user(user).can_download_all_media_items:
             return models.Q(id=models.F('id'))
 
         return models.Q(downloadable=True)
@@ -207,6 +299,81 @@ class MediaItemQuerySet(PermissionQuerySetMixin, models.QuerySet):
         """
         return self.filter(self._downloadable_condition(user))
 
+    #: Names of the facets which may be passed to facet_counts() and the corresponding expression
+    #: evaluated against each row of the queryset.
+    facet_columns = {
+        'type': 'item.type',
+        'language': 'item.language',
+        'channel': 'item.channel_id',
+        'tags': 'tag.name',
+    }
+
+    def facet_counts(self, facets):
+        """
+        Return a dictionary mapping each facet name in *facets* to a dictionary which maps each
+        value of that facet to the number of items in the queryset with that value. The facets
+        which may be counted are the keys of :py:attr:`~.facet_columns`. Channels are counted by
+        channel id and items are counted once for each of their tags.
+
+        All facets are counted in a single query which groups the queryset by each facet in turn
+        using ``GROUPING SETS``.
+
+        """
+        unknown = set(facets) - set(self.facet_columns)
+        if unknown:
+            raise ValueError(f'Unknown facets: {", ".join(sorted(unknown))}')
+
+        counts = {facet: {} for facet in facets}
+        if len(counts) == 0:
+            return counts
+
+        try:
+            item_sql, params = (
+                self.order_by().values('id', 'type', 'language', 'channel', 'tags')
+                .query.sql_with_params()
+            )
+        except EmptyResultSet:
+            return counts
+
+        columns = [self.facet_columns[facet] for facet in counts]
+
+        # Expanding the tags of each item repeats the item and so distinct items are counted.
+        if 'tags' in counts:
+            tags_join = 'LEFT JOIN LATERAL unnest(item.tags) AS tag(name) ON TRUE'
+            count = 'count(DISTINCT item.id)'
+        else:
+            tags_join = ''
+            count = 'count(*)'
+
+        sql = f'''
+            SELECT {', '.join(columns)}, {', '.join(f'GROUPING({c})' for c in columns)}, {count}
+            FROM ({item_sql}) AS item {tags_join}
+            GROUP BY GROUPING SETS ({', '.join(f'({c})' for c in columns)})
+        '''
+
+        with connections[self.db].cursor() as cursor:
+            cursor.execute(sql, params)
+            for row in cursor.fetchall():
+                values, groupings, n = row[:len(columns)], row[len(columns):-1], row[-1]
+                for facet, value, grouping in zip(counts, values, groupings):
+                    # GROUPING() is zero for the column which this row is grouped by.
+                    if grouping == 0 and value is not None:
+                        counts[facet][value] = n
+
+        return counts
+
+    def update_sms_derived(self):
+        """
+        Re-compute the denormalised :py:attr:`~.MediaItem.is_sms_derived` flag for all items in
+        the queryset. Only rows whose flag actually changes are written. Returns the number of
+        items whose flag changed.
+
+        """
+        return (
+            self.filter(is_sms_derived=False, sms__isnull=False).update(is_sms_derived=True) +
+            self.filter(is_sms_derived=True, sms__isnull=True).update(is_sms_derived=False)
+        )
+
 
 class MediaItemManager(models.Manager):
     """
@@ -246,6 +413,67 @@ class MediaItemManager(models.Manager):
 
         return obj
 
+    def bulk_create_for_user(self, user, objs):
+        """
+        Like :py:meth:`~.create_for_user` but creates all of the unsaved items in *objs* with a
+        single INSERT. Each item is given a view permission, including the passed user if they are
+        not anonymous, with a second INSERT. Returns the created items.
+
+        Since the items' save() methods are not called, the post_save signal is not sent. Instead,
+        :py:data:`mediaplatform.signals.media_items_changed` is sent with the ids of the created
+        items and the items are explicitly added to a django-reversion revision.
+
+        """
+        objs = self.bulk_create(objs)
+
+        crsids = [user.username] if user is not None and not user.is_anonymous else []
+        Permission.objects.bulk_create([
+            Permission(allows_view_item=obj, crsids=list(crsids)) for obj in objs
+        ])
+
+        self._bulk_changed([obj.id for obj in objs])
+        return objs
+
+    def bulk_update_fields(self, objs, fields):
+        """
+        Write the values of the named *fields* on each of the saved items in *objs* to the database
+        in a single UPDATE using :py:func:`~.bulk_update`. The update time of each item is set to
+        the current time.
+
+        Since the items' save() methods are not called, the post_save signal is not sent. Instead,
+        :py:data:`mediaplatform.signals.media_items_changed` is sent with the ids of the updated
+        items and the items are explicitly added to a django-reversion revision.
+
+        """
+        if len(objs) == 0:
+            return
+
+        now = timezone.now()
+        for obj in objs:
+            obj.updated_at = now
+
+        bulk_update(self.model, objs, sorted(set(fields) | {'updated_at'}))
+
+        self._bulk_changed([obj.id for obj in objs])
+
+    def _bulk_changed(self, ids):
+        """
+        Update the materialised state of the media items with the passed ids after they have been
+        changed in bulk and notify any receivers of the change.
+
+        """
+        MediaItem.objects_including_deleted.filter(id__in=ids).update_published()
+
+        # django-reversion records versions from the post_save signal which is not sent for bulk
+        # changes and so the changed items are added to a revision explicitly. If a revision is
+        # already active, e.g. one created by RevisionMiddleware, the items are added to it.
+        if reversion.is_registered(self.model):
+            with reversion.create_revision():
+                for obj in MediaItem.objects_including_deleted.filter(id__in=ids):
+                    reversion.add_to_revision(obj)
+
+        mpsignals.media_items_changed.send(sender=self.model, item_ids=ids)
+
 
 class MediaItem(models.Model):
     """
@@ -286,6 +514,8 @@ class MediaItem(models.Model):
             models.Index(fields=['updated_at']),
             models.Index(fields=['published_at']),
             models.Index(fields=['deleted_at']),
+            models.Index(fields=['is_published']),
+            models.Index(fields=['is_sms_derived']),
             pgindexes.GinIndex(fields=['text_search_vector']),
         )
 
@@ -374,6 +604,21 @@ class MediaItem(models.Model):
     #: Deletion time. If non-NULL, the item has been "deleted" and should not usually be visible.
     deleted_at = models.DateTimeField(null=True, blank=True)
 
+    #: Materialised publication state. An item is published if its publication time has passed and
+    #: any associated JWP video is "ready". This flag is maintained by
+    #: :py:meth:`~.MediaItemQuerySet.update_published` which is called when the item or its JWP
+    #: video changes and periodically by the :py:func:`mediaplatform.tasks.update_published`
+    #: task.
+    is_published = models.BooleanField(
+        default=False, editable=False, help_text='Is the item currently published?')
+
+    #: Denormalised flag indicating if this item has an associated legacy SMS media item. SMS
+    #: derived items are immutable. This flag is maintained by
+    #: :py:meth:`~.MediaItemQuerySet.update_sms_derived` which is called when legacy SMS media
+    #: items are created or deleted.
+    is_sms_derived = models.BooleanField(
+        default=False, editable=False, help_text='Is the item derived from the legacy SMS?')
+
     def __str__(self):
         return '{} ("{}")'.format(self.id, self.title)
 
@@ -471,6 +716,18 @@ class Permission(models.Model):
     #: Do all signed in (non-anonymous) users have this permission?
     is_signed_in = models.BooleanField(default=False)
 
+    #: Denormalised list of principal tokens which have this permission. See
+    #: :py:func:`~.principals_for_permission` for the format of these tokens. This field is
+    #: maintained by a database trigger whenever the permission is inserted or updated and so the
+    #: value on an in-memory instance may be stale after a save().
+    principals = pgfields.ArrayField(
+        models.TextField(), blank=True, default=_blank_array, editable=False)
+
+    class Meta:
+        indexes = (
+            pgindexes.GinIndex(fields=['principals']),
+        )
+
     def __str__(self):
         if self.is_public:
             return 'Public'
@@ -501,6 +758,60 @@ class Permission(models.Model):
         self.is_signed_in = False
 
 
+class MediaItemViewPrincipal(models.Model):
+    """
+    A materialised index of which principal tokens have view permission for which media items.
+    There is one row for each token in :py:attr:`~.Permission.principals` of each media item's
+    view permission.
+
+    This table is maintained by a database trigger whenever a :py:class:`~.Permission` is
+    inserted, updated or deleted. It may be rebuilt from scratch via the ``rebuildviewindex``
+    management command. It is only used to determine which items a user can view if the
+    :py:data:`MEDIA_ITEM_VIEWABLE_STRATEGY
+    <mediaplatform.defaultsettings.MEDIA_ITEM_VIEWABLE_STRATEGY>` setting is "index".
+
+    """
+    #: Media item which the principal may view
+    item = models.ForeignKey(
+        MediaItem, on_delete=models.CASCADE, related_name='+', editable=False)
+
+    #: Principal token in the format returned by :py:func:`~.principals_for_permission`
+    principal = models.TextField(editable=False)
+
+    class Meta:
+        unique_together = (('principal', 'item'),)
+
+
+class MediaItemTag(models.Model):
+    """
+    A precomputed dictionary of the tags of published media items which are visible to everyone or
+    to all signed in users. It is used to suggest tags as a user types a search. Tags are grouped
+    case-insensitively. Tags of items which are only visible to particular users are not included
+    so that suggestions cannot reveal them.
+
+    The dictionary is rebuilt by the :py:func:`mediaplatform.tasks.update_tag_dictionary` task
+    which should be scheduled to run periodically. A trigram index on the key is created by
+    migration 0034.
+
+    """
+    #: Lower case form of the tag
+    key = models.TextField(primary_key=True, editable=False)
+
+    #: Tag as it appears on media items. If several forms of the tag differing only in case are
+    #: used, one is chosen arbitrarily.
+    name = models.TextField(editable=False)
+
+    #: Number of published items with this tag which are visible to everyone
+    public_count = models.BigIntegerField(default=0, editable=False)
+
+    #: Number of published items with this tag which are visible to all signed in users, including
+    #: those visible to everyone
+    signed_in_count = models.BigIntegerField(default=0, editable=False)
+
+    def __str__(self):
+        return self.name
+
+
 class UploadEndpoint(models.Model):
     """
     An endpoint which can be used to upload a media item.
@@ -523,6 +834,8 @@ class UploadEndpoint(models.Model):
 
 
 class ChannelQuerySet(PermissionQuerySetMixin, models.QuerySet):
+    permission_flags = ('viewable', 'editable')
+
     def annotate_viewable(self, user, name='viewable'):
         """
         Annotate the query set with a boolean indicating if the user can view the channel.
@@ -548,7 +861,7 @@ class ChannelQuerySet(PermissionQuerySetMixin, models.QuerySet):
         # accidents.
         return (
             self._permission_condition('edit_permission', user) &
-            models.Q(sms__isnull=True)
+            models.Q(is_sms_derived=False)
         )
 
     def annotate_editable(self, user, name='editable'):
@@ -574,6 +887,18 @@ class ChannelQuerySet(PermissionQuerySetMixin, models.QuerySet):
         """
         return self.filter(self._editable_condition(user))
 
+    def update_sms_derived(self):
+        """
+        Re-compute the denormalised :py:attr:`~.Channel.is_sms_derived` flag for all channels in
+        the queryset. Only rows whose flag actually changes are written. Returns the number of
+        channels whose flag changed.
+
+        """
+        return (
+            self.filter(is_sms_derived=False, sms__isnull=False).update(is_sms_derived=True) +
+            self.filter(is_sms_derived=True, sms__isnull=True).update(is_sms_derived=False)
+        )
+
 
 class ChannelManager(models.Manager):
     """
@@ -657,6 +982,13 @@ class Channel(models.Model):
     #: visible.
     deleted_at = models.DateTimeField(null=True, blank=True)
 
+    #: Denormalised flag indicating if this channel has an associated legacy SMS collection. SMS
+    #: derived channels, their items and their playlists are immutable. This flag is maintained by
+    #: :py:meth:`~.ChannelQuerySet.update_sms_derived` which is called when legacy SMS collections
+    #: are created or deleted.
+    is_sms_derived = models.BooleanField(
+        default=False, editable=False, help_text='Is the channel derived from the legacy SMS?')
+
     def __str__(self):
         return '{} ("{}")'.format(self.id, self.title)
 
@@ -665,11 +997,47 @@ class Channel(models.Model):
             models.Index(fields=['created_at']),
             models.Index(fields=['updated_at']),
             models.Index(fields=['deleted_at']),
+            models.Index(fields=['is_sms_derived']),
             pgindexes.GinIndex(fields=['text_search_vector']),
         )
 
 
+class ChannelItemCount(models.Model):
+    """
+    Materialised counts of the non-deleted media items in a channel for each visibility class.
+    There is one row for each channel.
+
+    This table is maintained transactionally by database triggers whenever a channel is created
+    or a :py:class:`~.MediaItem` or its view :py:class:`~.Permission` is inserted, updated or
+    deleted. It may be rebuilt from scratch via the ``rebuildchannelitemcounts`` management
+    command.
+
+    """
+    #: Channel whose items are counted
+    channel = models.OneToOneField(
+        Channel, primary_key=True, on_delete=models.CASCADE, related_name='item_counts',
+        editable=False)
+
+    #: Number of items in the channel. This is the number of items visible to a user with the
+    #: "mediaplatform.view_mediaitem" permission.
+    total_count = models.BigIntegerField(default=0, editable=False)
+
+    #: Number of items in the channel which are derived from the legacy SMS and so cannot be
+    #: edited.
+    sms_derived_count = models.BigIntegerField(default=0, editable=False)
+
+    #: Number of published items in the channel which may be viewed by every signed in user. A
+    #: particular signed in user may be able to view more items than this.
+    signed_in_count = models.BigIntegerField(default=0, editable=False)
+
+    #: Number of published items in the channel which may be viewed by anyone. This is the number
+    #: of items visible to an anonymous user.
+    public_count = models.BigIntegerField(default=0, editable=False)
+
+
 class PlaylistQuerySet(PermissionQuerySetMixin, models.QuerySet):
+    permission_flags = ('viewable', 'editable')
+
     def annotate_viewable(self, user, name='viewable'):
         """
         Annotate the query set with a boolean indicating if the user can view the item.
@@ -695,6 +1063,14 @@ class PlaylistQuerySet(PermissionQuerySetMixin, models.QuerySet):
         return self.filter(Q(self._permission_condition('view_permission', user) |
                              self._permission_condition('channel__edit_permission', user)))
 
+    def _editable_condition(self, user):
+        # For the moment, we make sure that *all* SMS-derived objects are immutable to guard
+        # against accidents. A playlist is SMS-derived if its channel is.
+        return (
+            self._permission_condition('channel__edit_permission', user) &
+            models.Q(channel__is_sms_derived=False)
+        )
+
     def annotate_editable(self, user, name='editable'):
         """
         Annotate the query set with a boolean indicating if the user can edit the playlist.
@@ -703,7 +1079,7 @@ class PlaylistQuerySet(PermissionQuerySetMixin, models.QuerySet):
         return self.annotate(**{
             name: models.Case(
                 models.When(
-                    self._permission_condition('channel__edit_permission', user),
+                    self._editable_condition(user),
                     then=models.Value(True)
                 ),
                 default=models.Value(False),
@@ -716,7 +1092,7 @@ class PlaylistQuerySet(PermissionQuerySetMixin, models.QuerySet):
         Filter the queryset to only those playlists which can be edited by the passed Django user.
 
         """
-        return self.filter(self._permission_condition('channel__edit_permission', user))
+        return self.filter(self._editable_condition(user))
 
 
 class PlaylistManager(models.Manager):
@@ -982,6 +1358,16 @@ def _media_item_post_save_handler(*args, sender, instance, created, raw, **kwarg
         Permission.objects.create(allows_view_item=instance)
 
 
+@receiver(post_save, sender=MediaItem)
+def _media_item_post_save_publication_handler(*args, sender, instance, **kwargs):
+    """
+    A post_save handler for :py:class:`~.MediaItem` which updates the materialised publication
+    state of the item. This is also run for "raw" saves so that fixtures have the correct state.
+
+    """
+    MediaItem.objects_including_deleted.filter(id=instance.id).update_published()
+
+
 @receiver(post_save, sender=Channel)
 def _channel_post_save_handler(*args, sender, instance, created, raw, **kwargs):
     """
@@ -1013,36 +1399,126 @@ def _playlist_post_save_handler(*args, sender, instance, created, raw, **kwargs)
     Permission.objects.get_or_create(allows_view_playlist=instance, is_public=True)
 
 
+#: Principal token held by everyone, including anonymous users.
+PRINCIPAL_PUBLIC = 'public'
+
+#: Principal token held by all signed in users.
+PRINCIPAL_SIGNED_IN = 'signed_in'
+
+#: Prefix of principal tokens identifying an individual user by crsid.
+PRINCIPAL_USER_PREFIX = 'user:'
+
+#: Prefix of principal tokens identifying a lookup group by groupid.
+PRINCIPAL_GROUP_PREFIX = 'group:'
+
+#: Prefix of principal tokens identifying a lookup institution by instid.
+PRINCIPAL_INST_PREFIX = 'inst:'
+
+
+def principals_for_permission(permission):
+    """
+    Return the list of principal tokens which have been granted the passed
+    :py:class:`~.Permission`. This mirrors the database trigger which maintains
+    :py:attr:`~.Permission.principals` and is provided so that the token format is documented in
+    one place.
+
+    """
+    return list(itertools.chain(
+        [PRINCIPAL_PUBLIC] if permission.is_public else [],
+        [PRINCIPAL_SIGNED_IN] if permission.is_signed_in else [],
+        (PRINCIPAL_USER_PREFIX + crsid for crsid in permission.crsids),
+        (PRINCIPAL_GROUP_PREFIX + groupid for groupid in permission.lookup_groups),
+        (PRINCIPAL_INST_PREFIX + instid for instid in permission.lookup_insts),
+    ))
+
+
+def _principals_for_user(user):
+    """
+    Return the list of principal tokens held by the passed Django user. A user has a permission if
+    this list overlaps with :py:attr:`~.Permission.principals`. A user of ``None`` is treated as
+    the anonymous user.
+
+    """
+    principals = [PRINCIPAL_PUBLIC]
+
+    # If a non-None user was passed and the user is not anonymous, we can add additional ways
+    # the permission can be granted
+    if user is not None and not user.is_anonymous:
+        groupids, instids = _lookup_groupids_and_instids_for_user(user)
+        principals.append(PRINCIPAL_SIGNED_IN)
+        principals.append(PRINCIPAL_USER_PREFIX + user.username)
+        principals.extend(PRINCIPAL_GROUP_PREFIX + groupid for groupid in groupids)
+        principals.extend(PRINCIPAL_INST_PREFIX + instid for instid in instids)
+
+    return principals
+
+
+@dataclasses.dataclass
+class Capabilities:
+    """
+    The effective capabilities of a user. These are everything about a user which is needed to
+    build permission conditions for querysets. Computing them may require lookup and database
+    queries and so they should be obtained via :py:func:`~.capabilities_for_user` which computes
+    them at most once for each user object.
+
+    Queryset methods which take a user, such as :py:meth:`~.MediaItemQuerySet.viewable_by_user`,
+    also accept a capabilities object.
+
+    """
+    #: Is the user anonymous?
+    is_anonymous: bool
+
+    #: Principal tokens held by the user. See :py:func:`~.principals_for_permission`.
+    principals: typing.List[str]
+
+    #: Does the user have the "mediaplatform.view_mediaitem" permission?
+    can_view_all_media_items: bool
+
+    #: Does the user have the "mediaplatform.download_mediaitem" permission?
+    can_download_all_media_items: bool
+
+
+#: Name of the attribute on user objects used to memoise their capabilities.
+_CAPABILITIES_ATTRIBUTE = '_mediaplatform_capabilities'
+
+
+def capabilities_for_user(user):
+    """
+    Return the :py:class:`~.Capabilities` of the passed Django user. A user of ``None`` is treated
+    as the anonymous user. If a :py:class:`~.Capabilities` object is passed, it is returned as is.
+
+    The result is memoised on the user object and, since Django creates a new user object for
+    each request, the capabilities of the request user are computed at most once per request.
+
+    """
+    if isinstance(user, Capabilities):
+        return user
+
+    capabilities = getattr(user, _CAPABILITIES_ATTRIBUTE, None)
+    if isinstance(capabilities, Capabilities):
+        return capabilities
+
+    capabilities = Capabilities(
+        is_anonymous=user is None or user.is_anonymous,
+        principals=_principals_for_user(user),
+        can_view_all_media_items=(
+            user is not None and user.has_perm('mediaplatform.view_mediaitem')),
+        can_download_all_media_items=(
+            user is not None and user.has_perm('mediaplatform.download_mediaitem')),
+    )
+
+    if user is not None:
+        setattr(user, _CAPABILITIES_ATTRIBUTE, capabilities)
+
+    return capabilities
+
+
 def _lookup_groupids_and_instids_for_user(user):
     """
     Return a tuple containing the list of group groupids and institution instids which the
-    specified user is (publicly) a member of. The return value is cached so it is safe to call this
-    multiple times.
+    specified user is (publicly) a member of. The return value is cached by
+    :py:mod:`mediaplatform.identity` so it is safe to call this multiple times.
 
     """
-    # automationlookup.get_person return values are cached
-    try:
-        person = automationlookup.get_person(
-            identifier=user.username, scheme=getattr(settings, 'LOOKUP_SCHEME', 'crsid'),
-            fetch=['all_groups', 'all_insts']
-        )
-    except HTTPError as e:
-        if e.response.status_code == 404:
-            # A user with no entry in lookup should not be treated as an error - simply return
-            # empty lists.
-            return [], []
-        else:
-            raise e
-
-    # "be liberal in what you accept" - do not assume that all the fields we expect to be
-    # present in the result will be
-    return (
-        [
-            group.get('groupid') for group in person.get('groups', [])
-            if group.get('groupid') is not None
-        ],
-        [
-            inst.get('instid') for inst in person.get('institutions', [])
-            if inst.get('instid') is not None
-        ]
-    )
+    identity = mpidentity.get_identity(user)
+    return identity.groupids, identity.instids
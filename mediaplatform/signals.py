@@ -0,0 +1,16 @@
+"""
+Custom signals sent by the :py:mod:`mediaplatform` application.
+
+"""
+from django.dispatch import Signal
+
+
+#: Sent after media items, channels, playlists or their permissions have been changed in bulk in a
+#: way which bypasses the post_save and post_delete signals, for example via QuerySet.update().
+#: Receivers should assume that any such object may have changed.
+bulk_change = Signal()
+
+#: Sent after media items have been created or updated in bulk in a way which bypasses their save()
+#: method and so the post_save signal. The *item_ids* argument is a list of the ids of the changed
+#: items.
+media_items_changed = Signal(providing_args=['item_ids'])
@@ -0,0 +1,80 @@
+"""
+Celery tasks.
+
+"""
+import logging
+
+from celery import shared_task
+from django.db import connection, transaction
+from django.utils import timezone
+
+from . import identity, models, signals
+
+
+LOG = logging.getLogger(__name__)
+
+
+@shared_task(name='mediaplatform.update_published')
+def update_published():
+    """
+    Update the materialised :py:attr:`~mediaplatform.models.MediaItem.is_published` flag for media
+    items whose publication time has passed since they were last saved. This task should be
+    scheduled to run frequently (e.g. every minute) since the delay between runs bounds how late an
+    item may appear after its publication time.
+
+    """
+    changed_count = (
+        models.MediaItem.objects.filter(is_published=False, published_at__lte=timezone.now())
+        .update_published()
+    )
+    LOG.info('Number of newly published media items: %s', changed_count)
+
+    if changed_count > 0:
+        signals.bulk_change.send(sender=update_published)
+
+
+@shared_task(name='mediaplatform.update_tag_dictionary')
+def update_tag_dictionary():
+    """
+    Rebuild the :py:class:`~mediaplatform.models.MediaItemTag` dictionary of tags from the media
+    items which are currently published. This task should be scheduled to run periodically (e.g.
+    every hour) since the delay between runs bounds how late a new tag may be suggested.
+
+    """
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'''
+            DELETE FROM {models.MediaItemTag._meta.db_table}
+        ''')
+        cursor.execute(f'''
+            INSERT INTO {models.MediaItemTag._meta.db_table}
+                (key, name, public_count, signed_in_count)
+            SELECT
+                lower(tag.name),
+                min(tag.name),
+                count(*) FILTER (WHERE %(public)s = ANY(perm.principals)),
+                count(*)
+            FROM
+                {models.MediaItem._meta.db_table} AS item
+                JOIN {models.Permission._meta.db_table} AS perm
+                    ON perm.allows_view_item_id = item.id
+                CROSS JOIN LATERAL unnest(item.tags) AS tag(name)
+            WHERE
+                item.deleted_at IS NULL AND item.is_published AND tag.name <> ''
+                AND perm.principals && ARRAY[%(public)s, %(signed_in)s]::text[]
+            GROUP BY
+                lower(tag.name)
+        ''', {'public': models.PRINCIPAL_PUBLIC, 'signed_in': models.PRINCIPAL_SIGNED_IN})
+        tag_count = cursor.rowcount
+
+    LOG.info('Number of tags in tag dictionary: %s', tag_count)
+
+
+@shared_task(name='mediaplatform.refresh_identity')
+def refresh_identity(username):
+    """
+    Re-fetch the lookup groups and institutions for *username* and store them in the shared
+    identity cache. This task is scheduled by :py:mod:`mediaplatform.identity` when a stale cached
+    identity is used.
+
+    """
+    identity.refresh(username)
@@ -0,0 +1,110 @@
+import time
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.signals import user_logged_in
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from .. import identity
+
+
+User = get_user_model()
+
+
+@override_settings(IDENTITY_CACHE_ALIAS='default', IDENTITY_CACHE_TTL=60,
+                   IDENTITY_CACHE_STALE_TTL=600)
+class IdentityTest(TestCase):
+    PERSON_FIXTURE = {
+        'groups': [
+            {'groupid': '0123', 'name': 'uis-members'},
+            {'name': 'no-groupid'},
+        ],
+        'institutions': [
+            {'instid': 'UIS'},
+        ],
+    }
+
+    def setUp(self):
+        get_person_patcher = mock.patch('automationlookup.get_person')
+        self.get_person = get_person_patcher.start()
+        self.get_person.return_value = self.PERSON_FIXTURE
+        self.addCleanup(get_person_patcher.stop)
+
+        refresh_patcher = mock.patch('mediaplatform.tasks.refresh_identity')
+        self.refresh_identity = refresh_patcher.start()
+        self.addCleanup(refresh_patcher.stop)
+
+        # Make sure the Django cache and counters are empty when running tests
+        cache.clear()
+        identity.reset_stats()
+
+    def test_identity(self):
+        """The identity is constructed from the lookup person resource."""
+        self.assertEqual(
+            identity.get_identity(User(username='spqr1')),
+            identity.Identity(groupids=['0123'], groupnames=['uis-members'], instids=['UIS']))
+
+    def test_memoised_per_user_object(self):
+        """Repeated calls for the same user object do not consult the shared cache."""
+        user = User(username='spqr1')
+        identity.get_identity(user)
+        identity.get_identity(user)
+        self.assertEqual(self.get_person.call_count, 1)
+        self.assertEqual(identity.get_stats()['misses'], 1)
+        self.assertEqual(identity.get_stats()['request_hits'], 1)
+
+    def test_shared_between_user_objects(self):
+        """A second request for the same user is served from the shared cache."""
+        identity.get_identity(User(username='spqr1'))
+        identity.get_identity(User(username='spqr1'))
+        self.assertEqual(self.get_person.call_count, 1)
+        self.assertEqual(identity.get_stats()['cache_hits'], 1)
+
+    @override_settings(IDENTITY_CACHE_TTL=0)
+    def test_shared_cache_disabled(self):
+        """Setting the TTL to zero disables the shared cache."""
+        identity.get_identity(User(username='spqr1'))
+        identity.get_identity(User(username='spqr1'))
+        self.assertEqual(self.get_person.call_count, 2)
+
+    def test_stale_while_revalidate(self):
+        """A stale identity is returned and a single refresh is scheduled."""
+        identity.get_identity(User(username='spqr1'))
+        with mock.patch('time.time', return_value=time.time() + 120):
+            self.assertEqual(identity.get_identity(User(username='spqr1')).instids, ['UIS'])
+            identity.get_identity(User(username='spqr1'))
+        self.assertEqual(self.get_person.call_count, 1)
+        self.assertEqual(identity.get_stats()['stale_hits'], 2)
+        self.refresh_identity.delay.assert_called_once_with('spqr1')
+
+    def test_refresh(self):
+        """Refreshing an identity re-fetches it and updates the shared cache."""
+        identity.get_identity(User(username='spqr1'))
+        self.get_person.return_value = {'institutions': [{'instid': 'CL'}]}
+        identity.refresh('spqr1')
+        self.assertEqual(identity.get_identity(User(username='spqr1')).instids, ['CL'])
+
+    def test_invalidate(self):
+        """Invalidating an identity discards both the memoised and shared values."""
+        user = User(username='spqr1')
+        identity.get_identity(user)
+        identity.invalidate(user)
+        identity.get_identity(user)
+        self.assertEqual(self.get_person.call_count, 2)
+
+    def test_invalidated_on_login(self):
+        """Signing in discards any cached identity."""
+        # Django's update_last_login() receiver saves the user and so it must exist.
+        user = User.objects.create(username='spqr1')
+        identity.get_identity(User(username='spqr1'))
+        user_logged_in.send(sender=User, request=None, user=user)
+        identity.get_identity(User(username='spqr1'))
+        self.assertEqual(self.get_person.call_count, 2)
+
+    @override_settings(IDENTITY_LOCAL_PEOPLE={'spqr1': PERSON_FIXTURE})
+    def test_local_people(self):
+        """The local stand-in is used in place of lookup if configured."""
+        self.assertEqual(identity.get_identity(User(username='spqr1')).groupids, ['0123'])
+        self.assertEqual(identity.get_identity(User(username='spqr2')), identity.EMPTY_IDENTITY)
+        self.get_person.assert_not_called()
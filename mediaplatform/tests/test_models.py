@@ -1,17 +1,22 @@
 import datetime
+from io import StringIO
 from unittest import mock
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import AnonymousUser, Permission
 from django.core.cache import cache
+from django.core.management import call_command
 from django.db import IntegrityError
 from django.test import TestCase, override_settings
 from django.utils import timezone
+import reversion
+from reversion.models import Version
 
 from legacysms import models as legacymodels
 from mediaplatform_jwp.models import CachedResource
 from .. import models
+from .. import tasks
 
 
 User = get_user_model()
@@ -124,6 +129,17 @@ class MediaItemTest(ModelTestCase):
     def test_signed_in_item_viewable_by_signed_in(self):
         self.assert_user_can_view(self.user, 'signedin')
 
+    def test_permissions_for_user(self):
+        """Permission flags for a batch of items are returned, hiding non-viewable items."""
+        permissions = models.MediaItem.objects.all().permissions_for_user(
+            AnonymousUser(), ['public', 'signedin', 'does-not-exist'])
+        self.assertEqual(set(permissions.keys()), {'public', 'signedin', 'does-not-exist'})
+        self.assertTrue(permissions['public']['viewable'])
+        self.assertFalse(permissions['public']['editable'])
+        self.assertEqual(permissions['signedin'], {
+            'viewable': False, 'editable': False, 'downloadable': False})
+        self.assertEqual(permissions['does-not-exist'], permissions['signedin'])
+
     def test_public_item_viewable_by_signed_in(self):
         self.assert_user_can_view(self.user, 'public')
 
@@ -240,6 +256,80 @@ class MediaItemTest(ModelTestCase):
         permission_id_2 = models.MediaItem.objects.get(id=item.id).view_permission.id
         self.assertEquals(permission_id_1, permission_id_2)
 
+    def test_bulk_create_for_user(self):
+        """Items created in bulk have view permissions and the changed signal is sent."""
+        with mock.patch('mediaplatform.signals.media_items_changed.send') as send:
+            items = models.MediaItem.objects.bulk_create_for_user(
+                self.user, [models.MediaItem(title='a'), models.MediaItem(title='b')])
+        send.assert_called_once_with(
+            sender=models.MediaItem, item_ids=[item.id for item in items])
+
+        for item in items:
+            view_permission = models.MediaItem.objects.get(id=item.id).view_permission
+            self.assertEqual(view_permission.crsids, [self.user.username])
+            self.assert_user_can_view(self.user, item)
+
+    def test_bulk_update_fields(self):
+        """Items updated in bulk have the named fields written and the changed signal is sent."""
+        item1 = models.MediaItem.objects.get(id='public')
+        item2 = models.MediaItem.objects.get(id='signedin')
+        item1.title, item1.tags, item1.description = 'one', ['x', 'y'], 'not written'
+        item2.title, item2.tags = 'two', []
+        previous_updated_at = item1.updated_at
+
+        with mock.patch('mediaplatform.signals.media_items_changed.send') as send:
+            models.MediaItem.objects.bulk_update_fields([item1, item2], ['title', 'tags'])
+        send.assert_called_once_with(sender=models.MediaItem, item_ids=[item1.id, item2.id])
+
+        item1 = models.MediaItem.objects.get(id=item1.id)
+        item2 = models.MediaItem.objects.get(id=item2.id)
+        self.assertEqual((item1.title, item1.tags), ('one', ['x', 'y']))
+        self.assertEqual((item2.title, item2.tags), ('two', []))
+        self.assertNotEqual(item1.description, 'not written')
+        self.assertGreater(item1.updated_at, previous_updated_at)
+
+    def test_bulk_changes_are_versioned(self):
+        """Items created or updated in bulk are recorded in a revision."""
+        self.assertTrue(reversion.is_registered(models.MediaItem))
+
+        item1, = models.MediaItem.objects.bulk_create_for_user(
+            self.user, [models.MediaItem(title='a')])
+        versions = Version.objects.get_for_object(item1)
+        self.assertEqual(len(versions), 1)
+        self.assertEqual(versions[0].field_dict['title'], 'a')
+
+        item1.title = 'b'
+        item2 = models.MediaItem.objects.get(id='public')
+        item2.title = 'c'
+        models.MediaItem.objects.bulk_update_fields([item1, item2], ['title'])
+        versions = Version.objects.get_for_object(item1)
+        self.assertEqual(len(versions), 2)
+        self.assertEqual(versions[0].field_dict['title'], 'b')
+        self.assertEqual(Version.objects.get_for_object(item2)[0].field_dict['title'], 'c')
+
+        # Both items were updated in a single revision.
+        self.assertEqual(versions[0].revision, Version.objects.get_for_object(item2)[0].revision)
+
+    def test_facet_counts(self):
+        """Facet counts count items by value and count items once for each distinct tag."""
+        item1 = models.MediaItem.objects.get(id='public')
+        item2 = models.MediaItem.objects.get(id='signedin')
+        item1.type, item1.language, item1.tags = models.MediaItem.VIDEO, 'eng', ['x', 'y', 'x']
+        item2.type, item2.language, item2.tags = models.MediaItem.VIDEO, 'fre', ['y']
+        models.MediaItem.objects.bulk_update_fields([item1, item2], ['type', 'language', 'tags'])
+
+        counts = models.MediaItem.objects.filter(id__in=[item1.id, item2.id]).facet_counts(
+            ['type', 'language', 'tags', 'channel'])
+        self.assertEqual(counts['type'], {models.MediaItem.VIDEO: 2})
+        self.assertEqual(counts['language'], {'eng': 1, 'fre': 1})
+        self.assertEqual(counts['tags'], {'x': 1, 'y': 2})
+        self.assertEqual(counts['channel'], {'channel1': 2})
+
+        self.assertEqual(
+            models.MediaItem.objects.filter(id__in=[]).facet_counts(['type']), {'type': {}})
+        with self.assertRaises(ValueError):
+            models.MediaItem.objects.all().facet_counts(['not-a-facet'])
+
     def test_sms_item_not_editable(self):
         """An item with associated SMS media item or channel is not editable."""
         item = models.MediaItem.objects.get(id='emptyperm')
@@ -401,6 +491,60 @@ class MediaItemTest(ModelTestCase):
         self.assert_user_cannot_view(None, item)
         self.assert_user_can_view(self.user, item)
 
+    def test_is_published_updated_on_save(self):
+        """The materialised publication state is updated when an item is saved."""
+        item = models.MediaItem.objects.get(id='public')
+        self.assertTrue(models.MediaItem.objects.get(id=item.id).is_published)
+        item.published_at = timezone.now() + datetime.timedelta(days=1)
+        item.save()
+        self.assertFalse(models.MediaItem.objects.get(id=item.id).is_published)
+
+    def test_is_published_updated_on_resource_change(self):
+        """The materialised publication state is updated when a JWP resource is saved."""
+        item = models.MediaItem.objects.get(id='public')
+        item.jwp.resource.data['status'] = 'error'
+        item.jwp.resource.save()
+        self.assertFalse(models.MediaItem.objects.get(id=item.id).is_published)
+        item.jwp.resource.data['status'] = 'ready'
+        item.jwp.resource.save()
+        self.assertTrue(models.MediaItem.objects.get(id=item.id).is_published)
+
+    def test_update_tag_dictionary_task(self):
+        """The tag dictionary includes tags of published items visible to everyone or signed in."""
+        public = models.MediaItem.objects.get(id='public')
+        public.tags = ['Bananas', 'apples']
+        public.save()
+        signedin = models.MediaItem.objects.get(id='signedin')
+        signedin.tags = ['bananas']
+        signedin.save()
+        self.assertTrue(models.MediaItem.objects.get(id='public').is_published)
+        self.assertTrue(models.MediaItem.objects.get(id='signedin').is_published)
+        models.MediaItem.objects.filter(id='empty').update(tags=[])
+        models.MediaItem.objects.exclude(id__in=['public', 'signedin', 'empty']).update(
+            tags=['secret'])
+
+        tasks.update_tag_dictionary()
+
+        tags = {tag.key: tag for tag in models.MediaItemTag.objects.all()}
+        self.assertEqual(set(tags), {'bananas', 'apples'})
+        self.assertEqual((tags['bananas'].public_count, tags['bananas'].signed_in_count), (1, 2))
+        self.assertEqual((tags['apples'].public_count, tags['apples'].signed_in_count), (1, 1))
+
+    def test_update_published_task(self):
+        """The update_published task publishes items whose publication time has passed."""
+        item = models.MediaItem.objects.get(id='public')
+        item.published_at = timezone.now() + datetime.timedelta(days=1)
+        item.save()
+        self.assert_user_cannot_view(self.user, item)
+
+        # Move the publication time into the past without triggering any signal handlers.
+        models.MediaItem.objects.filter(id=item.id).update(
+            published_at=timezone.now() - datetime.timedelta(minutes=1))
+        self.assert_user_cannot_view(self.user, item)
+
+        tasks.update_published()
+        self.assert_user_can_view(self.user, item)
+
     def assert_user_cannot_view(self, user, item_or_id):
         if isinstance(item_or_id, str):
             item_or_id = models.MediaItem.objects_including_deleted.get(id=item_or_id)
@@ -490,11 +634,131 @@ class MediaItemTest(ModelTestCase):
         )
 
 
+@override_settings(MEDIA_ITEM_VIEWABLE_STRATEGY='index')
+class MediaItemViewIndexTest(MediaItemTest):
+    """
+    Re-run the media item tests using the view principal index to determine which items are
+    viewable.
+
+    """
+    def test_index_updated_on_permission_save(self):
+        """The view principal index tracks changes to view permissions."""
+        item = models.MediaItem.objects.get(id='emptyperm')
+        self.assertEqual(self.index_principals(item), set())
+        item.view_permission.crsids.append(self.user.username)
+        item.view_permission.is_signed_in = True
+        item.view_permission.save()
+        self.assertEqual(
+            self.index_principals(item), {'signed_in', 'user:' + self.user.username})
+        item.view_permission.reset()
+        item.view_permission.save()
+        self.assertEqual(self.index_principals(item), set())
+
+    def test_index_updated_on_item_delete(self):
+        """Deleting an item removes it from the view principal index."""
+        item = models.MediaItem.objects.get(id='public')
+        self.assertNotEqual(self.index_principals(item), set())
+        item_id = item.id
+        item.delete()
+        self.assertFalse(models.MediaItemViewPrincipal.objects.filter(item_id=item_id).exists())
+
+    def index_principals(self, item):
+        return set(
+            models.MediaItemViewPrincipal.objects.filter(item=item)
+            .values_list('principal', flat=True)
+        )
+
+
 class PermissionTest(TestCase):
     def test_creation(self):
         """A Permission object should be creatable with no field values."""
         models.Permission.objects.create()
 
+    def test_principals_empty(self):
+        """A Permission with no fields set has no principals."""
+        permission = models.Permission.objects.create()
+        self.assertEqual(models.Permission.objects.get(id=permission.id).principals, [])
+
+    def test_principals_updated_on_save(self):
+        """The principals field is maintained when a permission is saved."""
+        permission = models.Permission.objects.create()
+        permission.is_public = True
+        permission.is_signed_in = True
+        permission.crsids.extend(['spqr1', 'abcd1'])
+        permission.lookup_groups.append('0123')
+        permission.lookup_insts.append('UIS')
+        permission.save()
+
+        self.assertEqual(models.Permission.objects.get(id=permission.id).principals, [
+            'public', 'signed_in', 'user:spqr1', 'user:abcd1', 'group:0123', 'inst:UIS'])
+
+        permission.reset()
+        permission.crsids.append('xyz1')
+        permission.save()
+
+        self.assertEqual(
+            models.Permission.objects.get(id=permission.id).principals, ['user:xyz1'])
+
+    def test_principals_for_permission(self):
+        """principals_for_permission() matches the principals maintained by the database."""
+        permission = models.Permission.objects.create(
+            is_signed_in=True, crsids=['spqr1'], lookup_groups=['0123', '4567'],
+            lookup_insts=['UIS'])
+        permission = models.Permission.objects.get(id=permission.id)
+        self.assertEqual(models.principals_for_permission(permission), permission.principals)
+
+    def test_principals_not_user_settable(self):
+        """Setting the principals field directly has no effect."""
+        permission = models.Permission.objects.create(crsids=['spqr1'])
+        permission.principals = ['public']
+        permission.save()
+        self.assertEqual(
+            models.Permission.objects.get(id=permission.id).principals, ['user:spqr1'])
+
+    def test_user_principals(self):
+        """The principals for a user include their crsid, groups and institutions."""
+        user = User.objects.create(username='spqr1')
+        with mock.patch('mediaplatform.models._lookup_groupids_and_instids_for_user') as lookup:
+            lookup.return_value = (['0123'], ['UIS'])
+            self.assertEqual(models._principals_for_user(user), [
+                'public', 'signed_in', 'user:spqr1', 'group:0123', 'inst:UIS'])
+
+    def test_anonymous_principals(self):
+        """The anonymous user only has the public principal."""
+        self.assertEqual(models._principals_for_user(AnonymousUser()), ['public'])
+        self.assertEqual(models._principals_for_user(None), ['public'])
+
+
+class CapabilitiesTest(ModelTestCase):
+
+    def test_anonymous(self):
+        """Anonymous users only have the public principal."""
+        for user in [None, AnonymousUser()]:
+            capabilities = models.capabilities_for_user(user)
+            self.assertTrue(capabilities.is_anonymous)
+            self.assertEqual(capabilities.principals, ['public'])
+            self.assertFalse(capabilities.can_view_all_media_items)
+            self.assertFalse(capabilities.can_download_all_media_items)
+
+    def test_memoised(self):
+        """Capabilities are computed once for each user object."""
+        with mock.patch.object(self.user, 'has_perm', return_value=False) as has_perm:
+            capabilities = models.capabilities_for_user(self.user)
+            self.assertFalse(capabilities.is_anonymous)
+            self.assertIs(models.capabilities_for_user(self.user), capabilities)
+            list(models.MediaItem.objects.all().viewable_by_user(self.user)
+                 .annotate_editable(self.user).annotate_downloadable(self.user))
+        self.assertEqual(self.lookup_groupids_and_instids_for_user.call_count, 1)
+        self.assertEqual(has_perm.call_count, 2)
+
+    def test_capabilities_accepted_by_querysets(self):
+        """Querysets accept capabilities in place of a user."""
+        capabilities = models.capabilities_for_user(self.user)
+        self.assertEqual(
+            set(models.MediaItem.objects.all().viewable_by_user(capabilities)),
+            set(models.MediaItem.objects.all().viewable_by_user(self.user)))
+        self.assertIs(models.capabilities_for_user(capabilities), capabilities)
+
 
 class LookupTest(TestCase):
     PERSON_FIXTURE = {
@@ -700,6 +964,118 @@ class ChannelTest(ModelTestCase):
         )
 
 
+class ChannelItemCountTest(ModelTestCase):
+    def setUp(self):
+        super().setUp()
+        self.channel = models.Channel.objects.get(id='channel1')
+        self.item = models.MediaItem.objects.get(id='public')
+        self.item.channel = self.channel
+        self.item.save()
+
+    def test_created_with_channel(self):
+        """A new channel has all counts zero."""
+        channel = models.Channel.objects.create(billing_account=self.channel.billing_account)
+        self.assertEqual(self.counts(channel), (0, 0, 0, 0))
+
+    def test_fixture_counts(self):
+        """Counts are correct for all channels in the fixture."""
+        for channel in models.Channel.objects_including_deleted.all():
+            self.assert_counts_correct(channel)
+
+    def test_item_moves_channel(self):
+        """Moving an item between channels updates both channels' counts."""
+        other_channel = models.Channel.objects.create(
+            billing_account=self.channel.billing_account)
+        before = self.counts(self.channel)
+        self.item.channel = other_channel
+        self.item.save()
+        self.assertEqual(self.counts(self.channel)[0], before[0] - 1)
+        self.assert_counts_correct(self.channel)
+        self.assert_counts_correct(other_channel)
+
+    def test_permission_change(self):
+        """Changing an item's view permission updates the visibility counts."""
+        before = self.counts(self.channel)
+        self.item.view_permission.reset()
+        self.item.view_permission.is_signed_in = True
+        self.item.view_permission.save()
+        after = self.counts(self.channel)
+        self.assertEqual(after[0], before[0])
+        self.assertEqual(after[3], before[3] - 1)
+        self.assert_counts_correct(self.channel)
+
+    def test_publication(self):
+        """Changes to publication state update the visibility counts."""
+        before = self.counts(self.channel)
+        self.item.published_at = timezone.now() + datetime.timedelta(days=1)
+        self.item.save()
+        self.assertEqual(self.counts(self.channel)[3], before[3] - 1)
+        self.assert_counts_correct(self.channel)
+
+        models.MediaItem.objects.filter(id=self.item.id).update(published_at=timezone.now())
+        tasks.update_published()
+        self.assertEqual(self.counts(self.channel), before)
+
+    def test_soft_delete(self):
+        """Soft-deleting an item removes it from all counts."""
+        before = self.counts(self.channel)
+        self.item.deleted_at = timezone.now()
+        self.item.save()
+        self.assertEqual(self.counts(self.channel)[0], before[0] - 1)
+        self.assert_counts_correct(self.channel)
+
+    def test_item_delete(self):
+        """Deleting an item removes it from all counts."""
+        self.item.delete()
+        self.assert_counts_correct(self.channel)
+
+    def test_channel_delete(self):
+        """Channels with items can be deleted."""
+        channel_id = self.channel.id
+        self.channel.delete()
+        self.assertFalse(models.ChannelItemCount.objects.filter(channel_id=channel_id).exists())
+
+    def test_matches_rebuild(self):
+        """Counts maintained through a mix of changes match those rebuilt from scratch."""
+        other_channel = models.Channel.objects.create(
+            billing_account=self.channel.billing_account)
+        created = models.MediaItem.objects.bulk_create_for_user(None, [
+            models.MediaItem(channel=self.channel), models.MediaItem(channel=other_channel)])
+        created[0].view_permission.is_public = True
+        created[0].view_permission.save()
+        created[1].channel = self.channel
+        models.MediaItem.objects.bulk_update_fields([created[1]], ['channel'])
+        models.MediaItem.objects.filter(id=self.item.id).update(is_sms_derived=True)
+        models.MediaItem.objects.all().update_published()
+        self.channel.items.exclude(id=self.item.id).first().delete()
+
+        maintained = set(models.ChannelItemCount.objects.values_list(
+            'channel_id', 'total_count', 'sms_derived_count', 'signed_in_count', 'public_count'))
+        models.ChannelItemCount.objects.update(
+            total_count=0, sms_derived_count=0, signed_in_count=0, public_count=0)
+        call_command('rebuildchannelitemcounts', stdout=StringIO())
+        self.assertEqual(set(models.ChannelItemCount.objects.values_list(
+            'channel_id', 'total_count', 'sms_derived_count', 'signed_in_count', 'public_count'
+        )), maintained)
+
+    def counts(self, channel):
+        return models.ChannelItemCount.objects.values_list(
+            'total_count', 'sms_derived_count', 'signed_in_count', 'public_count'
+        ).get(channel=channel)
+
+    def assert_counts_correct(self, channel):
+        items = models.MediaItem.objects.filter(channel=channel)
+        published_items = items.filter(is_published=True)
+        self.assertEqual(self.counts(channel), (
+            items.count(),
+            items.filter(is_sms_derived=True).count(),
+            published_items.filter(
+                view_permission__principals__overlap=['public', 'signed_in']).count(),
+            published_items.filter(view_permission__principals__contains=['public']).count(),
+        ))
+        self.assertEqual(self.counts(channel)[3], items.viewable_by_user(None).count())
+
+
 class PlaylistTest(ModelTestCase):
 
     model = models.Playlist
@@ -876,6 +1252,19 @@ class PlaylistTest(ModelTestCase):
         playlist.channel.edit_permission.save()
         self.assert_user_can_edit(self.user, playlist)
 
+    def test_playlist_in_sms_channel_not_editable(self):
+        """A playlist in a channel with an associated SMS collection is not editable."""
+        playlist = models.Playlist.objects.get(id='emptyperm')
+        playlist.channel.edit_permission.is_public = True
+        playlist.channel.edit_permission.save()
+        self.assert_user_can_edit(self.user, playlist)
+
+        # If there is a SMS collection, the editable permission goes away
+        sms = legacymodels.Collection.objects.create(id=12345, channel=playlist.channel)
+        self.assert_user_cannot_edit(self.user, playlist)
+        sms.delete()
+        self.assert_user_can_edit(self.user, playlist)
+
 
 class BillingAccountTest(ModelTestCase):
 
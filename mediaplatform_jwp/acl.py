@@ -2,11 +2,11 @@
 Module providing functionality for handling ACL's stored in the JWPlayer custom property - sms_acl.
 
 """
+import functools
 import logging
 
-from django.conf import settings
-
-import automationlookup
+from mediaplatform import identity
+import mediaplatform.models as mpmodels
 
 LOG = logging.getLogger(__name__)
 
@@ -59,13 +59,7 @@ class AceInst:
         if user.is_anonymous:
             return False
 
-        lookup_response = automationlookup.get_person(
-            user.username, settings.LOOKUP_SCHEME, fetch=['all_insts'])
-
-        for institution in lookup_response.get('institutions', []):
-            if self.instid == institution.get('instid', None):
-                return True
-        return False
+        return self.instid in identity.get_identity(user).instids
 
 
 class AceGroup:
@@ -87,14 +81,8 @@ class AceGroup:
         if user.is_anonymous:
             return False
 
-        lookup_response = automationlookup.get_person(
-            user.username, settings.LOOKUP_SCHEME, fetch=['all_groups'])
-
-        for institution in lookup_response.get('groups', []):
-            if self.groupid == institution.get('groupid') or \
-                    self.groupid == institution.get('name'):
-                return True
-        return False
+        user_identity = identity.get_identity(user)
+        return self.groupid in user_identity.groupids or self.groupid in user_identity.groupnames
 
 
 class AceUser:
@@ -123,8 +111,8 @@ def build_acl(acl):
     """
     Iterates over the acl and encapsulates each ACE with the corresponding Ace* Class.
 
-    TODO there are performance enhancements that can be made
-    (Eg only returning AceWorld, if it exists) but I have kept thing simple for now.
+    When checking access, prefer :py:func:`~.compile_acl` which caches the parsed ACL and evaluates
+    it more efficiently.
 
     :param acl: access control list
     :return: list of Ace* objects
@@ -140,3 +128,65 @@ def build_acl(acl):
                 break
         assert found, f"'{ace}' not recognised"
     return built_acl
+
+
+class CompiledAcl:
+    """
+    An ACL compiled for fast evaluation. The ACL is reduced to a set of principal tokens in the
+    format used by :py:func:`mediaplatform.models.principals_for_permission` and a user has
+    permission if any of their principals are in that set. An ACL containing WORLD is reduced to a
+    constant-true evaluator.
+
+    Use :py:func:`~.compile_acl` to construct instances.
+
+    """
+    def __init__(self, aces):
+        #: Does the ACL grant permission to everyone?
+        self.is_world = any(isinstance(ace, AceWorld) for ace in aces)
+
+        principals = set()
+        for ace in aces:
+            if isinstance(ace, AceCam):
+                principals.add(mpmodels.PRINCIPAL_SIGNED_IN)
+            elif isinstance(ace, AceUser):
+                principals.add(mpmodels.PRINCIPAL_USER_PREFIX + ace.crsid)
+            elif isinstance(ace, AceGroup):
+                principals.add(mpmodels.PRINCIPAL_GROUP_PREFIX + ace.groupid)
+            elif isinstance(ace, AceInst):
+                principals.add(mpmodels.PRINCIPAL_INST_PREFIX + ace.instid)
+
+        #: Principal tokens which have permission.
+        self.principals = frozenset(principals)
+
+        # Group ACEs may match the group name as well as the groupid.
+        self._has_groups = any(isinstance(ace, AceGroup) for ace in aces)
+
+    def has_permission(self, user):
+        """Return True if the passed Django user matches the ACL."""
+        if self.is_world:
+            return True
+
+        capabilities = mpmodels.capabilities_for_user(user)
+        if capabilities.is_anonymous or len(self.principals) == 0:
+            return False
+
+        if not self.principals.isdisjoint(capabilities.principals):
+            return True
+
+        if not self._has_groups:
+            return False
+
+        return not self.principals.isdisjoint(
+            mpmodels.PRINCIPAL_GROUP_PREFIX + name
+            for name in identity.get_identity(user).groupnames if name is not None
+        )
+
+
+@functools.lru_cache(maxsize=1024)
+def compile_acl(acl):
+    """
+    Return a :py:class:`~.CompiledAcl` for the passed ACL which must be a tuple of ACE strings.
+    Compiled ACLs are cached since there are relatively few distinct ACLs in use.
+
+    """
+    return CompiledAcl(build_acl(acl))
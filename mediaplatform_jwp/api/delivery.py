@@ -2,14 +2,18 @@
 Interaction with the JWPlatform API.
 
 """
+import concurrent.futures
 import hashlib
 import logging
 import math
+import random
 import re
+import threading
 import time
 import urllib.parse
 
 import requests
+import requests.adapters
 from django.conf import settings
 import django.core.exceptions
 import jwplatform
@@ -23,6 +27,18 @@ LOG = logging.getLogger(__name__)
 # Default session used for making HTTP requests.
 DEFAULT_REQUESTS_SESSION = requests.Session()
 
+#: HTTP status codes of Delivery API responses which indicate that a request may be retried.
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+# Session used for concurrent requests. It is created on first use by _get_bulk_session() so that
+# its connection pool can be sized from the settings.
+_BULK_REQUESTS_SESSION = None
+_BULK_REQUESTS_SESSION_LOCK = threading.Lock()
+
+# Semaphores limiting the number of concurrent requests to each host keyed by host and limit.
+_HOST_SEMAPHORES = {}
+_HOST_SEMAPHORES_LOCK = threading.Lock()
+
 
 class VideoNotFoundError(RuntimeError):
     """
@@ -110,9 +126,8 @@ class Resource(dict):
         Check whether the specified Django user has permission to access this resource.
         Raises :py:exc:`~.ResourceACLPermissionDenied` if the user does not match the ACL.
         """
-        for ace in acl.build_acl(self.acl):
-            if ace.has_permission(user):
-                return True
+        if acl.compile_acl(tuple(self.acl)).has_permission(user):
+            return True
         raise ResourceACLPermissionDenied()
 
     def get_poster_url(self, width=720):
@@ -263,6 +278,69 @@ class DeliveryVideo(Resource):
             pd_api_url(f'/v2/media/{key}', format='json'), timeout=5
         )
 
+        return cls._from_response(key, response)
+
+    @classmethod
+    def from_keys(cls, keys, session=None, max_workers=None):
+        """
+        Fetch the :py:class:`DeliveryVideo` instances corresponding to several JWPlatform keys
+        concurrently. Returns a tuple ``(videos, errors)``. *videos* is a dict mapping each key
+        which was fetched to its :py:class:`DeliveryVideo`. *errors* is a dict mapping each key
+        which could not be fetched to the exception raised when fetching it. For example, a
+        :py:exc:`VideoNotFoundError` is recorded for videos which do not exist.
+
+        Requests are made by a pool of at most *max_workers* threads sharing a session with a
+        pool of keep-alive connections. The number of concurrent requests to each host is limited
+        to :py:data:`~mediaplatform_jwp.defaultsettings.JWPLATFORM_DELIVERY_MAX_CONCURRENCY`
+        irrespective of the number of callers. Requests which fail because of a connection error,
+        a timeout or a response status in :py:data:`~.RETRY_STATUS_CODES` are retried. See
+        :py:func:`~.get_with_retries`.
+
+        :param keys: iterable of JWPlatform keys. Duplicate keys are fetched once.
+        :param session: (optional) session used for making HTTP requests. If None, a shared
+            session whose connection pool is sized for the maximum concurrency is used.
+        :param max_workers: (optional) maximum number of threads making requests. If None,
+            :py:data:`~mediaplatform_jwp.defaultsettings.JWPLATFORM_DELIVERY_MAX_CONCURRENCY`
+            is used.
+
+        """
+        session = session if session is not None else _get_bulk_session()
+        max_workers = (
+            max_workers if max_workers is not None
+            else settings.JWPLATFORM_DELIVERY_MAX_CONCURRENCY
+        )
+        keys = list(dict.fromkeys(keys))
+
+        def fetch(key):
+            response = get_with_retries(session, pd_api_url(f'/v2/media/{key}', format='json'))
+            return cls._from_response(key, response)
+
+        videos, errors = {}, {}
+        if len(keys) == 0:
+            return videos, errors
+
+        with concurrent.futures.ThreadPoolExecutor(
+                max_workers=min(max_workers, len(keys))) as executor:
+            futures = {executor.submit(fetch, key): key for key in keys}
+            for future in concurrent.futures.as_completed(futures):
+                key = futures[future]
+                try:
+                    videos[key] = future.result()
+                except Exception as e:
+                    errors[key] = e
+
+        return videos, errors
+
+    @classmethod
+    def _from_response(cls, key, response):
+        """
+        Return a :py:class:`DeliveryVideo` instance from the Delivery API response to a request
+        for the video with the passed key.
+
+        :raises: :py:exc:`VideoNotFoundError` if the video is not found.
+        :raises: :py:exc:`UnparseableVideoError` if the response could not be parsed.
+
+        """
         if response.status_code == 404:
             LOG.warning("Couldn't find video for key '%s'", key)
             raise VideoNotFoundError
@@ -350,6 +428,90 @@ class Channel(Resource):
         return response
 
 
+def get_with_retries(session, url, timeout=5):
+    """
+    Make a GET request for *url* using *session* and return the response. At most
+    :py:data:`~mediaplatform_jwp.defaultsettings.JWPLATFORM_DELIVERY_MAX_CONCURRENCY` requests are
+    made to a single host at once by all threads.
+
+    Requests which fail because of a connection error, a timeout or a response status in
+    :py:data:`~.RETRY_STATUS_CODES` are retried at most
+    :py:data:`~mediaplatform_jwp.defaultsettings.JWPLATFORM_DELIVERY_MAX_RETRIES` times. The delay
+    before each retry grows exponentially and has random jitter so that concurrent requests do not
+    retry in lock step. A Retry-After header giving a delay in seconds is honoured. Once all
+    retries are exhausted, the last response is returned or the last exception is raised.
+
+    """
+    max_retries = settings.JWPLATFORM_DELIVERY_MAX_RETRIES
+    semaphore = _get_host_semaphore(url)
+    for attempt in range(max_retries + 1):
+        try:
+            with semaphore:
+                response = session.get(url, timeout=timeout)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            if attempt == max_retries:
+                raise
+            reason, retry_after = e, None
+        else:
+            if response.status_code not in RETRY_STATUS_CODES or attempt == max_retries:
+                return response
+            reason, retry_after = response.status_code, response.headers.get('Retry-After')
+
+        delay = _retry_delay(attempt, retry_after)
+        LOG.warning(
+            'Delivery API request attempt %s failed (%s). Retrying in %.1f seconds...',
+            attempt + 1, reason, delay)
+        time.sleep(delay)
+
+
+def _retry_delay(attempt, retry_after=None):
+    """
+    Return the delay in seconds before retrying a request which failed on the zero-based attempt
+    *attempt*. If *retry_after* is the value of a Retry-After header giving a delay in seconds,
+    the delay is at least that long.
+
+    """
+    base_delay = settings.JWPLATFORM_DELIVERY_RETRY_DELAY
+    delay = random.uniform(0, base_delay * (2 ** attempt))
+    try:
+        delay += max(0, float(retry_after)) if retry_after is not None else 0
+    except ValueError:
+        # Retry-After may be an HTTP date which we do not attempt to parse.
+        pass
+    return delay
+
+
+def _get_bulk_session():
+    """
+    Return the session shared by concurrent requests. Its connection pool holds one keep-alive
+    connection for each concurrent request allowed to a host.
+
+    """
+    global _BULK_REQUESTS_SESSION
+    with _BULK_REQUESTS_SESSION_LOCK:
+        if _BULK_REQUESTS_SESSION is None:
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(
+                pool_maxsize=settings.JWPLATFORM_DELIVERY_MAX_CONCURRENCY)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            _BULK_REQUESTS_SESSION = session
+        return _BULK_REQUESTS_SESSION
+
+
+def _get_host_semaphore(url):
+    """
+    Return a semaphore which limits the number of concurrent requests to the host of *url*.
+
+    """
+    limit = settings.JWPLATFORM_DELIVERY_MAX_CONCURRENCY
+    key = (urllib.parse.urlsplit(url).netloc, limit)
+    with _HOST_SEMAPHORES_LOCK:
+        if key not in _HOST_SEMAPHORES:
+            _HOST_SEMAPHORES[key] = threading.BoundedSemaphore(limit)
+        return _HOST_SEMAPHORES[key]
+
+
 CUSTOM_FIELD_PATTERN = re.compile(r'^(?P<type>[^:]+):(?P<value>.*):$')
 
 
@@ -0,0 +1,109 @@
+"""
+Client-side rate limiting of requests to the JWP management API.
+
+"""
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    A token bucket rate limiter which may be shared between threads. Tokens are added to the
+    bucket at *rate* tokens per second up to a maximum of *capacity* tokens. Each request takes a
+    token from the bucket via :py:meth:`~.acquire`, waiting for one if the bucket is empty.
+
+    The rate adapts to the server's rate limit. Each time a request is rate limited, the rate is
+    halved, down to *min_rate*, and each successful request increases it again by a tenth of
+    *rate*. The JWP management API reports its rate limit in a "rate_limit" object in each
+    response and, if it reports that no requests remain, no tokens are issued until the reset time
+    it gives.
+
+    The total time spent waiting for tokens is recorded in :py:attr:`~.throttled_time`.
+
+    """
+    def __init__(self, rate, capacity=1, min_rate=None, clock=time.monotonic, sleep=time.sleep):
+        self.max_rate = rate
+        self.min_rate = min_rate if min_rate is not None else rate / 16
+        self.capacity = capacity
+
+        #: Total time in seconds spent waiting in acquire() by all threads.
+        self.throttled_time = 0.
+
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._rate = rate
+        self._tokens = capacity
+        self._updated = clock()
+        self._paused_until = self._updated
+
+        # The wall-clock time at which the server last said its rate limit resets, if any.
+        self._reset_timestamp = None
+
+    @property
+    def rate(self):
+        """The current rate in tokens per second."""
+        return self._rate
+
+    def acquire(self):
+        """
+        Take a token from the bucket, waiting until one is available. Returns the time in seconds
+        spent waiting.
+
+        """
+        waited = 0.
+        while True:
+            with self._lock:
+                now = self._clock()
+                self._refill(now)
+                if now >= self._paused_until and self._tokens >= 1:
+                    self._tokens -= 1
+                    self.throttled_time += waited
+                    return waited
+                delay = max(self._paused_until - now, (1 - self._tokens) / self._rate)
+            self._sleep(delay)
+            waited += delay
+
+    def record_success(self, rate_limit=None):
+        """
+        Record that a request succeeded. *rate_limit* is the "rate_limit" object from the
+        response, if any, which is a dict whose "remaining" key gives the number of requests
+        remaining and whose "reset" key gives the Unix time at which the limit resets.
+
+        """
+        rate_limit = rate_limit if rate_limit is not None else {}
+        with self._lock:
+            self._rate = min(self.max_rate, self._rate + self.max_rate / 10)
+            reset = rate_limit.get('reset')
+            if reset is not None:
+                self._reset_timestamp = reset
+                if rate_limit.get('remaining') == 0:
+                    self._pause_until_timestamp(reset)
+
+    def record_rate_limited(self, default_delay):
+        """
+        Record that a request was rate limited. The rate is halved, the bucket is emptied and no
+        more tokens are issued until the reset time last reported by the server or, if that is
+        not known or has passed, for *default_delay* seconds. Returns the length of the pause.
+
+        """
+        with self._lock:
+            now = self._clock()
+            self._rate = max(self.min_rate, self._rate / 2)
+            self._tokens = 0
+            self._updated = now
+            if self._reset_timestamp is None or self._reset_timestamp <= time.time():
+                self._paused_until = max(self._paused_until, now + default_delay)
+            else:
+                self._pause_until_timestamp(self._reset_timestamp)
+            return self._paused_until - now
+
+    def _pause_until_timestamp(self, timestamp):
+        """Issue no tokens until the passed Unix time. Must be called with the lock held."""
+        now = self._clock()
+        self._paused_until = max(self._paused_until, now + max(0, timestamp - time.time()))
+
+    def _refill(self, now):
+        """Add tokens accumulated since the last refill. Must be called with the lock held."""
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self._rate)
+        self._updated = now
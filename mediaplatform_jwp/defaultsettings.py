@@ -13,6 +13,28 @@ JWP_SYNC_ITEMS = True
 #: Should we force http upload links to be https?
 JWP_FORCE_HTTPS_UPLOAD = True
 
+JWP_FETCH_WORKERS = 4
+"""
+Number of pages of resources fetched concurrently from the JWP management API when listing
+videos or channels.
+
+"""
+
+JWP_FETCH_RATE = 1.0
+"""
+Maximum rate, in requests per second, of requests made to the JWP management API when listing
+videos or channels. The rate is reduced automatically if requests are rate limited.
+
+"""
+
+JWP_MEDIA_SOURCES_BATCH_SIZE = 500
+"""
+Maximum number of videos whose media sources are fetched from the Delivery API by one run of
+the :py:func:`~mediaplatform_jwp.tasks.update_media_sources` task. Videos which are not fetched
+are left for the next run.
+
+"""
+
 JWPLATFORM_API_KEY = None
 """
 The jwplatform API key. Defaults to the empty string but a custom system check ensures that this
@@ -50,6 +72,27 @@ Base URL for the JWPlatform Content. This can usually be left at its default val
 
 """
 
+JWPLATFORM_DELIVERY_MAX_CONCURRENCY = 8
+"""
+Maximum number of concurrent requests made to the Delivery API host when fetching several videos
+at once. See :py:meth:`~mediaplatform_jwp.api.delivery.DeliveryVideo.from_keys`.
+
+"""
+
+JWPLATFORM_DELIVERY_MAX_RETRIES = 3
+"""
+Maximum number of times a Delivery API request made when fetching several videos at once is
+retried after a connection error, timeout, rate limit or server error.
+
+"""
+
+JWPLATFORM_DELIVERY_RETRY_DELAY = 0.5
+"""
+Base delay in seconds before retrying a failed Delivery API request. The delay doubles with each
+retry and random jitter is added.
+
+"""
+
 JWPLATFORM_EMBED_PLAYER_KEY = None
 """
 Player key for the embedded player used by the :py:mod:`~.views.embed` view.
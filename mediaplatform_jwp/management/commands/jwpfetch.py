@@ -22,6 +22,12 @@ perform the database metadata synchronisation. This can be useful in combination
 only video or channel resources is controlled via the ``--skip-video-fetch`` and
 ``--skip-channel-fetch`` flags.
 
+The ``--incremental`` flag may be given to fetch only those videos which have been updated since
+the most recently updated cached video. This is much faster than fetching all videos but cannot
+detect videos which have been deleted from JWPlayer. The default, which may be given explicitly via
+the ``--full`` flag, is to fetch all videos. Run an incremental fetch frequently and a full fetch
+less frequently.
+
 """
 from django.core.management.base import BaseCommand
 
@@ -45,10 +51,19 @@ class Command(BaseCommand):
         parser.add_argument(
             '--skip-channel-fetch', action='store_true', dest='skip_channel_fetch',
             help='Do not re-fetch channels from JWP and synchronise with channels')
+        mode_group = parser.add_mutually_exclusive_group()
+        mode_group.add_argument(
+            '--incremental', action='store_true', dest='incremental',
+            help=('Only fetch videos updated since the most recently updated cached video. '
+                  'Deleted videos are not detected.'))
+        mode_group.add_argument(
+            '--full', action='store_false', dest='incremental',
+            help='Fetch all videos and detect deleted videos (the default)')
 
     def handle(self, *args, **options):
         tasks.synchronise(
             sync_all=options['sync_all'],
             skip_video_fetch=options['skip_video_fetch'] or options['skip_fetch'],
-            skip_channel_fetch=options['skip_channel_fetch'] or options['skip_fetch']
+            skip_channel_fetch=options['skip_channel_fetch'] or options['skip_fetch'],
+            incremental=options['incremental'],
         )
@@ -61,3 +61,47 @@ class JWPFetchTest(TestCase):
         self.jwp_client.videos.list.side_effect = videos2
         call_command('jwpfetch')
         self.assertEqual(CachedResource.videos.count(), len(self.VIDEOS_FIXTURE) - 1)
+
+    def test_incremental(self):
+        """
+        An incremental fetch only fetches videos updated since the last fetch and does not delete
+        missing resources.
+
+        """
+        videos_fixture = [
+            {'title': 'video A', 'key': 'A', 'updated': 10},
+            {'title': 'video B', 'key': 'B', 'updated': 20},
+        ]
+
+        def videos(result_offset=0, **kwargs):
+            return {'videos': videos_fixture[result_offset:]}
+
+        self.jwp_client.videos.list.side_effect = videos
+        call_command('jwpfetch')
+
+        # C is new, B has been updated and A has been deleted. D is older than the last fetch and
+        # should not be fetched.
+        updated_videos_fixture = [
+            {'title': 'video C', 'key': 'C', 'updated': 30},
+            {'title': 'video B v2', 'key': 'B', 'updated': 25},
+            {'title': 'video D', 'key': 'D', 'updated': 5},
+        ]
+
+        def updated_videos(result_offset=0, order_by=None, **kwargs):
+            self.assertEqual(order_by, 'updated:desc')
+            return {'videos': updated_videos_fixture[result_offset:]}
+
+        self.jwp_client.videos.list.side_effect = updated_videos
+        call_command('jwpfetch', '--incremental')
+        self.assertEqual(
+            set(CachedResource.videos.values_list('key', flat=True)), {'A', 'B', 'C'})
+        self.assertEqual(CachedResource.videos.get(key='B').data['title'], 'video B v2')
+
+        # A full fetch detects the deleted video.
+        def all_videos(result_offset=0, **kwargs):
+            return {'videos': updated_videos_fixture[result_offset:]}
+
+        self.jwp_client.videos.list.side_effect = all_videos
+        call_command('jwpfetch', '--full')
+        self.assertEqual(
+            set(CachedResource.videos.values_list('key', flat=True)), {'B', 'C', 'D'})
@@ -0,0 +1,43 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mediaplatform_jwp', '0005_add_reference_to_cached_resource'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='video',
+            name='sources_updated',
+            field=models.BigIntegerField(
+                editable=False, help_text='Updated timestamp when sources were fetched',
+                null=True),
+        ),
+        migrations.CreateModel(
+            name='MediaSource',
+            fields=[
+                ('id', models.AutoField(
+                    auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.PositiveIntegerField()),
+                ('mime_type', models.TextField()),
+                ('width', models.IntegerField(null=True)),
+                ('height', models.IntegerField(null=True)),
+                ('bitrate', models.BigIntegerField(null=True)),
+                ('url', models.TextField()),
+                ('is_signed', models.BooleanField(default=False)),
+                ('video', models.ForeignKey(
+                    on_delete=django.db.models.deletion.CASCADE, related_name='media_sources',
+                    to='mediaplatform_jwp.Video')),
+            ],
+            options={
+                'ordering': ('video', 'position'),
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='mediasource',
+            unique_together={('video', 'position')},
+        ),
+    ]
@@ -0,0 +1,26 @@
+from django.db import migrations, models
+
+
+# Compute the hash of all existing resources in the same way as set_resources() does.
+UPDATE_DATA_HASH_SQL = '''
+    UPDATE mediaplatform_jwp_cachedresource SET data_hash = MD5(data::TEXT)
+'''
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mediaplatform_jwp', '0006_add_media_sources'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cachedresource',
+            name='data_hash',
+            field=models.CharField(
+                editable=False, max_length=32, null=True,
+                help_text='MD5 hash of the canonical text of the resource data used to detect '
+                          'changes'),
+        ),
+        migrations.RunSQL(UPDATE_DATA_HASH_SQL, migrations.RunSQL.noop),
+    ]
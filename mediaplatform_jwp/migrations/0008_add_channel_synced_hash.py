@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mediaplatform_jwp', '0007_add_cached_resource_data_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='channel',
+            name='synced_hash',
+            field=models.CharField(editable=False, max_length=32, null=True),
+        ),
+    ]
@@ -1,12 +1,16 @@
+import collections
+import csv
+import io
 import json
 import logging
+import urllib.parse
 
 from django.conf import settings
 from django.contrib.postgres.fields import JSONField
 from django.contrib.postgres.indexes import GinIndex
 from django.db import models, transaction, connection
+from django.db.models import expressions, functions
 from django.utils.functional import cached_property
-from psycopg2.extras import execute_batch
 
 import mediaplatform.models as mpmodels
 from mediaplatform_jwp.api import delivery as jwplatform
@@ -71,6 +75,11 @@ class CachedResource(models.Model):
         help_text='The resource data itself',
     )
 
+    data_hash = models.CharField(
+        max_length=32, null=True, editable=False,
+        help_text='MD5 hash of the canonical text of the resource data used to detect changes',
+    )
+
     type = models.CharField(
         max_length=20, choices=TYPE_CHOICES,
         help_text='The JWPlatform resource type cached in this model',
@@ -112,8 +121,33 @@ class CachedResource(models.Model):
         ]
 
 
+def get_updated_high_water_mark(resource_type):
+    """
+    Return the largest JWPlatform "updated" timestamp of the non-deleted cached resources of the
+    passed type or ``None`` if there are none. Resources updated since the cache was last updated
+    will have an updated timestamp at least this large.
+
+    :param resource_type: type of JWPlatform resource (e.g. "video")
+    :type resource_type: str
+
+    """
+    return (
+        CachedResource.objects.filter(type=resource_type, deleted_at=None)
+        .aggregate(high_water_mark=models.Max(functions.Cast(
+            expressions.RawSQL("data ->> 'updated'", []), models.BigIntegerField()
+        )))['high_water_mark']
+    )
+
+
+#: The result of :py:func:`~.set_resources`. Each field is a count of cached resources: those
+#: which were inserted, those whose data changed or which were restored after being deleted, those
+#: which were left untouched and those which were marked as deleted.
+SetResourcesResult = collections.namedtuple(
+    'SetResourcesResult', 'inserted changed unchanged deleted')
+
+
 @transaction.atomic
-def set_resources(resources, resource_type):
+def set_resources(resources, resource_type, delete_missing=True):
     """
     Helper function which updates the cached resources and marks resources as deleted if no
     longer present.
@@ -122,11 +156,18 @@ def set_resources(resources, resource_type):
     :type resources: iterable
     :param resource_type: type of JWPlatform resource (e.g. "video")
     :type resource_type: str
+    :param delete_missing: (optional) if False, resources which are not present in *resources*
+        are left in the cache
+    :type delete_missing: bool
+    :returns: the number of resources inserted, changed, unchanged and deleted
+    :rtype: :py:class:`~.SetResourcesResult`
 
     Iterates over all of the dicts in *resources* adding or updating corresponding
-    :py:class:`~.CachedResource` models as it goes. After all resources have been added, any
-    resources of the specified type which have not been created or updated are deleted from the
-    cache.
+    :py:class:`~.CachedResource` models as it goes. Resources whose data has not changed are not
+    written to and so keep their updated_at timestamp. After all resources have been added, any
+    resources of the specified type which are not present in *resources* are deleted from the
+    cache unless *delete_missing* is False. Pass False if *resources* is only those resources
+    which have changed.
 
     This is all run inside an atomic block. Note that these blocks can be nested so calls to
     this function can themselves be within an atomic block.
@@ -138,14 +179,15 @@ def set_resources(resources, resource_type):
     # determine a clean way to do this with the stock Django ORM. We bypass the ORM entirely
     # and roll our own SQL. The general idea is to, atomically,
     #
-    # 1. Create a temporary table to hold all the keys for the resources we inserted/updated in
-    #    the cache.
+    # 1. Create a temporary table to hold all the resources and stream them into it using
+    #    COPY. This is far faster than one INSERT per resource.
     #
-    # 2. Insert/update ("upsert") the resources using PostgreSQL's INSERT ... ON CONFLICT
-    #    support. If we insert a new row, created_at and updated_at are set to the statement
-    #    timestamp but if an existing row is updated, only the updated_at timestamp is
-    #    modified. Along the way, we record the keys of the resources which have been
-    #    "upserted" in the temporary table.
+    # 2. Insert/update ("upsert") the resources from the temporary table using PostgreSQL's
+    #    INSERT ... ON CONFLICT support in a single statement. If we insert a new row, created_at
+    #    and updated_at are set to the statement timestamp. An existing row is only updated if
+    #    the hash of its data differs from that of the incoming data (or it had been deleted) and
+    #    only then is the updated_at timestamp modified. Rewriting unchanged rows would otherwise
+    #    generate WAL traffic and churn the GIN index on data for no benefit.
     #
     # 3. Mark all the resources of the appropriate type as "deleted" if their key is not in the
     #    temporary table.
@@ -167,63 +209,130 @@ def set_resources(resources, resource_type):
     # [1] http://django-postgres-extra.readthedocs.io/manager/#conflict-handling
 
     with connection.cursor() as cursor:
-        # A table to hold the list of inserted or updated keys
+        # A table to hold the incoming resources. The ordinal records the order in which they
+        # were passed so that the last one wins if a key is duplicated.
         cursor.execute('''
-            CREATE TEMPORARY TABLE inserted_or_updated_keys (key TEXT)
+            CREATE TEMPORARY TABLE incoming_resources (
+                ordinal BIGSERIAL, key TEXT NOT NULL, data JSONB NOT NULL
+            )
         ''')
 
-        # Using execute_batch is many times faster than executemany
-        # http://initd.org/psycopg/docs/extras.html#fast-exec
-        #
+        # copy_expert() reads from the stream as it goes and so resources are never all held in
+        # memory at once.
+        cursor.copy_expert(
+            'COPY incoming_resources (key, data) FROM STDIN WITH (FORMAT csv)',
+            _CSVStream((data['key'], json.dumps(data)) for data in iter(resources))
+        )
+
+        # Temporary tables are not analysed automatically and so the planner has no idea how many
+        # rows it holds.
+        cursor.execute('ANALYZE incoming_resources')
+
         # There is an argument as to what "now" function we should use here, especially as the
         # test suite runs everything within one transaction so using TRANSACTION_TIMESTAMP()
-        # won't actually give any different values when we run testes.
+        # won't actually give any different values when we run testes. We use
+        # STATEMENT_TIMESTAMP() as a compromise.
         #
-        # We use STATEMENT_TIMESTAMP() as a compromise.
-        #
-        # The downside of STATEMENT_TIMESTAMP() is that execute_batch() will batch calls so the
-        # various ..._at timestamps may differ slightly for a given cache update. OTOH, I don't
-        # think anyone will really care about the ..._at timestamps down to that sort of
-        # resolution. Given that assumption, I will no doubt be proved wrong when a future data
-        # analyst berates us when they analyse our database dumps and find out that the
-        # timestamps have a little bit of non-deterministic noise.
+        # The content hash is computed from the JSONB text representation which is canonical:
+        # key order and whitespace in the incoming JSON do not affect it. The "xmax = 0" test is
+        # true only for rows which were inserted rather than updated.
         #
         # [1] https://www.postgresql.org/docs/9.1/static/functions-datetime.html#FUNCTIONS-DATETIME-CURRENT  # noqa: E501
-        execute_batch(cursor, '''
+        cursor.execute('''
             WITH
-                insert_result
+                incoming
             AS (
-                INSERT INTO mediaplatform_jwp_cachedresource (
-                    key, data, type, updated_at, created_at, deleted_at
-                ) VALUES (
-                    %(key)s, %(data)s, %(type)s,
-                    STATEMENT_TIMESTAMP(), STATEMENT_TIMESTAMP(), NULL
+                SELECT DISTINCT ON (key)
+                    key, data, MD5(data::TEXT) AS data_hash
+                FROM
+                    incoming_resources
+                ORDER BY
+                    key, ordinal DESC
+            ),
+                upsert_result
+            AS (
+                INSERT INTO mediaplatform_jwp_cachedresource AS cached (
+                    key, data, data_hash, type, updated_at, created_at, deleted_at
                 )
+                SELECT
+                    key, data, data_hash, %(type)s,
+                    STATEMENT_TIMESTAMP(), STATEMENT_TIMESTAMP(), NULL
+                FROM
+                    incoming
                 ON CONFLICT (key) DO
                     UPDATE SET
-                        data = %(data)s, type = %(type)s,
-                        updated_at = STATEMENT_TIMESTAMP(), deleted_at = NULL
-                    WHERE mediaplatform_jwp_cachedresource.key = %(key)s
+                        data = excluded.data, data_hash = excluded.data_hash,
+                        type = excluded.type, updated_at = STATEMENT_TIMESTAMP(),
+                        deleted_at = NULL
+                    WHERE
+                        cached.data_hash IS DISTINCT FROM excluded.data_hash
+                        OR cached.type IS DISTINCT FROM excluded.type
+                        OR cached.deleted_at IS NOT NULL
                 RETURNING
-                    mediaplatform_jwp_cachedresource.key AS key
+                    (cached.xmax = 0) AS inserted
             )
-            INSERT INTO inserted_or_updated_keys (key) SELECT key FROM insert_result
-        ''', (
-            {'key': data['key'], 'data': json.dumps(data), 'type': resource_type}
-            for data in iter(resources)
-        ))
-
-        cursor.execute('''
-            UPDATE
-                mediaplatform_jwp_cachedresource
-            SET
-                deleted_at = STATEMENT_TIMESTAMP()
-            WHERE
-                key NOT IN (SELECT key from inserted_or_updated_keys)
-                AND type = %(type)s
+            SELECT
+                (SELECT COUNT(*) FROM incoming),
+                COUNT(*) FILTER (WHERE inserted),
+                COUNT(*) FILTER (WHERE NOT inserted)
+            FROM
+                upsert_result
         ''', {'type': resource_type})
+        incoming_count, inserted_count, changed_count = cursor.fetchone()
+
+        deleted_count = 0
+        if delete_missing:
+            cursor.execute('''
+                UPDATE
+                    mediaplatform_jwp_cachedresource AS cached
+                SET
+                    deleted_at = STATEMENT_TIMESTAMP()
+                WHERE
+                    cached.type = %(type)s
+                    AND cached.deleted_at IS NULL
+                    AND NOT EXISTS (
+                        SELECT 1 FROM incoming_resources AS incoming
+                        WHERE incoming.key = cached.key
+                    )
+            ''', {'type': resource_type})
+            deleted_count = cursor.rowcount
+
+        cursor.execute('''DROP TABLE incoming_resources''')
+
+    return SetResourcesResult(
+        inserted=inserted_count, changed=changed_count,
+        unchanged=incoming_count - inserted_count - changed_count, deleted=deleted_count)
+
+
+class _CSVStream:
+    """
+    A minimal read-only file-like object which renders an iterable of rows as CSV on demand.
+    Suitable for passing to a cursor's copy_expert() method.
 
-        cursor.execute('''DROP TABLE inserted_or_updated_keys''')
+    """
+    def __init__(self, rows):
+        self._rows = iter(rows)
+        self._buffer = io.StringIO()
+        self._writer = csv.writer(self._buffer, lineterminator='\n')
+
+    def read(self, size=-1):
+        # Render rows until at least size characters are available or the rows run out.
+        while size < 0 or self._buffer.tell() < size:
+            row = next(self._rows, None)
+            if row is None:
+                break
+            self._writer.writerow(row)
+
+        value = self._buffer.getvalue()
+        if size >= 0:
+            value, remainder = value[:size], value[size:]
+        else:
+            remainder = ''
+
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        self._buffer.write(remainder)
+        return value
 
 
 class Video(models.Model):
@@ -250,13 +359,32 @@ class Video(models.Model):
     resource = models.OneToOneField(
         CachedResource, on_delete=models.CASCADE, related_name='video')
 
+    #: The updated timestamp of the video when its :py:class:`~.MediaSource` objects were last
+    #: fetched or NULL if they have never been fetched. The stored sources are current if this is
+    #: at least :py:attr:`~.updated`.
+    sources_updated = models.BigIntegerField(
+        null=True, editable=False, help_text='Updated timestamp when sources were fetched')
+
+    @property
+    def has_current_sources(self):
+        """
+        True if the stored :py:class:`~.MediaSource` objects for this video are current.
+
+        """
+        return self.sources_updated is not None and self.sources_updated >= self.updated
+
     def get_sources(self):
         """
-        Uses the JWP fetch API to retrieve a list of :py:class:`mediaplatform.MediaItem.Source`
-        instances for each source associated with the media item. Ignores the ``downloadable``
-        attribute of the item.
+        Return a list of :py:class:`mediaplatform.MediaItem.Source` instances for each source
+        associated with the media item. Ignores the ``downloadable`` attribute of the item.
+
+        The sources are read from the stored :py:class:`~.MediaSource` objects if they are current.
+        Otherwise the JWP fetch API is used to retrieve them.
 
         """
+        if self.has_current_sources:
+            return [source.as_item_source(self.item) for source in self.media_sources.all()]
+
         try:
             video = jwplatform.DeliveryVideo.from_key(self.key)
         except jwplatform.VideoNotFoundError as e:
@@ -287,6 +415,79 @@ class Video(models.Model):
         )
 
 
+class MediaSource(models.Model):
+    """
+    An encoded media stream for a JWPlatform video as returned by the Delivery API. These are
+    fetched by the :py:func:`mediaplatform_jwp.tasks.update_media_sources` task so that views need
+    not call the Delivery API.
+
+    """
+    #: Video this is a source for.
+    video = models.ForeignKey(Video, on_delete=models.CASCADE, related_name='media_sources')
+
+    #: Position of this source in the list of sources returned by the Delivery API.
+    position = models.PositiveIntegerField()
+
+    #: Media type of the stream.
+    mime_type = models.TextField()
+
+    #: Width of the stream or NULL if this is an audio stream.
+    width = models.IntegerField(null=True)
+
+    #: Height of the stream or NULL if this is an audio stream.
+    height = models.IntegerField(null=True)
+
+    #: Bitrate of the stream in bits per second or NULL if it is not known.
+    bitrate = models.BigIntegerField(null=True)
+
+    #: URL of the stream without any signature.
+    url = models.TextField()
+
+    #: Does the URL need to be signed? See :py:func:`~.get_url`.
+    is_signed = models.BooleanField(default=False)
+
+    class Meta:
+        ordering = ('video', 'position')
+        unique_together = (('video', 'position'),)
+
+    @classmethod
+    def from_delivery_source(cls, video, position, source):
+        """
+        Return a new :py:class:`~.MediaSource` for *video* from a dict representing a source as
+        returned by the Delivery API. Any signature is removed from the URL.
+
+        """
+        url = urllib.parse.urlsplit(source.get('file', ''))
+        query = urllib.parse.parse_qsl(url.query, keep_blank_values=True)
+        is_signed = any(name == 'sig' for name, _ in query)
+        if is_signed:
+            url = url._replace(query=urllib.parse.urlencode(
+                [(name, value) for name, value in query if name not in ('exp', 'sig')]))
+
+        return cls(
+            video=video, position=position, mime_type=source.get('type', ''),
+            width=source.get('width'), height=source.get('height'),
+            bitrate=source.get('bitrate'), url=urllib.parse.urlunsplit(url), is_signed=is_signed,
+        )
+
+    def get_url(self):
+        """
+        Return the URL of the stream. If the URL must be signed, a newly signed URL is returned.
+
+        """
+        return jwplatform.signed_url(self.url) if self.is_signed else self.url
+
+    def as_item_source(self, item):
+        """
+        Return a :py:class:`mediaplatform.MediaItem.Source` for this stream for the passed item.
+
+        """
+        return mpmodels.MediaItem.Source(
+            mime_type=self.mime_type, url=self.get_url(), width=self.width, height=self.height,
+            item=item,
+        )
+
+
 class Channel(models.Model):
     """
     A JWPlatform channel resource.
@@ -310,3 +511,9 @@ class Channel(models.Model):
     #: Cached resource instance associated with this channel.
     resource = models.OneToOneField(
         CachedResource, on_delete=models.CASCADE, related_name='channel')
+
+    #: Hash of the values synchronised from the JWP channel when the corresponding
+    #: :py:class:`mediaplatform.Channel` was last updated. Since JWP channels have no updated
+    #: timestamp which tracks changes to their custom props, this is used to determine which
+    #: channels need updating. NULL if the channel has not yet been synchronised.
+    synced_hash = models.CharField(max_length=32, null=True, editable=False)
@@ -8,11 +8,14 @@ import contextlib
 import threading
 
 from django.conf import settings
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 
 from mediaplatform import models as mpmodels
+from mediaplatform import signals as mpsignals
 
+from mediaplatform_jwp import models as jwpmodels
 from mediaplatform_jwp.api import management as management
 
 _CONTEXT = threading.local()
@@ -55,6 +58,24 @@ def media_item_post_save_handler(*args, instance, raw, **kwargs):
     management.schedule_item_update(instance)
 
 
+@receiver(mpsignals.media_items_changed)
+def media_items_changed_handler(*args, item_ids, **kwargs):
+    """
+    Called after media items have been created or updated in bulk. If JWP_SYNC_ITEMS is set then a
+    single task is scheduled to propagate the changes to the corresponding JWP videos once the
+    current transaction commits.
+
+    """
+    if len(item_ids) == 0 or not _should_sync_items():
+        return
+
+    # Imported here since the tasks module imports the sync module which imports this one.
+    from mediaplatform_jwp import tasks
+
+    item_ids = list(item_ids)
+    transaction.on_commit(lambda: tasks.update_items.delay(item_ids))
+
+
 @receiver(post_save, sender=mpmodels.Permission)
 def permission_post_save_handler(*args, instance, raw, **kwargs):
     """
@@ -71,6 +92,39 @@ def permission_post_save_handler(*args, instance, raw, **kwargs):
         management.schedule_item_update(instance.allows_view_item)
 
 
+@receiver(post_save, sender=jwpmodels.CachedResource)
+def cached_resource_post_save_handler(*args, instance, **kwargs):
+    """
+    Called after a :py:class:`mediaplatform_jwp.models.CachedResource` is saved. The status of a
+    JWP video determines if the corresponding media item is published and so the materialised
+    publication state of any such item is updated.
+
+    This is also run for "raw" saves so that fixtures have the correct state.
+
+    """
+    (
+        mpmodels.MediaItem.objects_including_deleted
+        .filter(jwp__resource__key=instance.key)
+        .update_published()
+    )
+
+
+@receiver(post_save, sender=jwpmodels.Video)
+@receiver(post_delete, sender=jwpmodels.Video)
+def video_post_save_or_delete_handler(*args, instance, **kwargs):
+    """
+    Called after a :py:class:`mediaplatform_jwp.models.Video` is saved or deleted. Updates
+    the materialised publication state of the associated media item (if any).
+
+    This is also run for "raw" saves so that fixtures have the correct state.
+
+    """
+    if instance.item_id is None:
+        return
+
+    mpmodels.MediaItem.objects_including_deleted.filter(id=instance.item_id).update_published()
+
+
 def _should_sync_items():
     """
     Return a boolean indicating if JWP videos should be synchronised to changes in media items.
@@ -1,12 +1,20 @@
+import collections
 import datetime
-import dateutil.parser
+import hashlib
+import itertools
+import json
+import logging
+import time
 
-from django.db import models, transaction
+import dateutil.parser
+from django.db import connection, models, transaction
 from django.db.models import expressions, functions
 from django.utils import timezone
+from psycopg2.extras import execute_values
 import pytz
 
 import mediaplatform.models as mpmodels
+import mediaplatform.signals as mpsignals
 import mediaplatform_jwp.models as jwpmodels
 import legacysms.models as legacymodels
 import mediaplatform_jwp.models as mediajwpmodels
@@ -14,6 +22,11 @@ from mediaplatform_jwp.api import delivery as jwp
 
 from .signalhandlers import setting_sync_items
 
+LOG = logging.getLogger(__name__)
+
+#: Number of media items whose metadata is updated together by update_related_models_from_cache().
+_METADATA_CHUNK_SIZE = 2000
+
 
 @transaction.atomic
 def update_related_models_from_cache(update_all_videos=False):
@@ -28,8 +41,9 @@ def update_related_models_from_cache(update_all_videos=False):
 
     The update_all_videos flag may be set to True in which case a synchronisation of *all*
     MediaItems with the associated CachedResource is performed irrespective of the
-    updated_at timestamp. Come what may, all channels are synchronised since there is no equivalent
-    of the updated timestamp for JWP channels.
+    updated_at timestamp. There is no equivalent of the updated timestamp for JWP channels and so
+    channels are synchronised if any of the values synchronised from the JWP channel have changed
+    or, if update_all_videos is True, irrespective of whether they have changed.
 
     TODO: no attempt is yet made to synchronise the edit permission with that of the containing
     collection for media items. This needs a bit more thought about how the SMS permission model
@@ -185,7 +199,7 @@ def update_related_models_from_cache(update_all_videos=False):
 
     # Add the corresponding media item link to the JWP channels.
     for key, channel in jwp_keys_and_channels:
-        jwpmodels.Channel.objects.filter(key=key).update(channel=channel)
+        jwpmodels.Channel.objects.filter(key=key).update(channel=channel, synced_hash=None)
 
     # 4) Update metadata for changed videos
     #
@@ -194,19 +208,17 @@ def update_related_models_from_cache(update_all_videos=False):
     # props. Note that legacysms.MediaItem objects associated with updated mediaplatform.MediaItem
     # objects will also be updated/created/deleted as necessary.
 
-    # The media items which need update. We defer fetching all the metdata since we're going to
-    # reset it anyway.
+    # The media items which need update. We fetch only the ids of the items and their related
+    # objects along with the JWP video resources since we're going to reset the metadata anyway.
     updated_media_items = (
         mpmodels.MediaItem.objects.all()
-        .select_related('view_permission')
-        # updated_at is included because, without it, the field does not get updated on save() for
-        # some reason
-        .only('view_permission', 'jwp', 'sms', 'updated_at')
         .annotate(data=models.Subquery(
             mediajwpmodels.CachedResource.videos
             .filter(key=models.OuterRef('jwp__key'))
             .values_list('data')[:1]
         ))
+        .order_by('id')
+        .values_list('id', 'view_permission__id', 'sms__id', 'data')
     )
 
     # Unless we were asked to update the metadata in all objects, only update those which were last
@@ -220,131 +232,181 @@ def update_related_models_from_cache(update_all_videos=False):
             )
         )
 
-    # Iterate over all updated media items and set the metadata
-    max_tag_length = mpmodels.MediaItem._meta.get_field('tags').base_field.max_length
-    type_map = {
-        'video': mpmodels.MediaItem.VIDEO,
-        'audio': mpmodels.MediaItem.AUDIO,
-        'unknown': mpmodels.MediaItem.UNKNOWN,
-    }
+    # The metadata is updated in chunks. Each chunk is parsed into unsaved model instances which
+    # are then written with a fixed number of queries rather than with several queries per item.
+    timings = collections.Counter()
+    updated_item_count = 0
+    unlinked_item_ids = set()
 
     # We'll be modifying the MediaItem objects to be consistent with the JWP videos. We *don't*
     # want the signal handlers then trying to modify the JWPlatform videos again so disable
     # MediaItem -> JWP syncing if it is enabled.
     with setting_sync_items(False):
-        for item in updated_media_items:
-            # Skip items with no associated JWP video
-            if item.data is None:
-                continue
-
-            video = jwp.Video(item.data)
-            custom = video.get('custom', {})
-
-            item.title = _default_if_none(video.get('title'), '')
-            item.description = _default_if_none(video.get('description'), '')
-            item.type = type_map[_default_if_none(video.get('mediatype'), 'unknown')]
-
-            item.downloadable = 'True' == jwp.parse_custom_field(
-                    'downloadable', custom.get('sms_downloadable', 'downloadable:False:'))
-
-            published_timestamp = video.get('date')
-            if published_timestamp is not None:
-                item.published_at = datetime.datetime.fromtimestamp(
-                    published_timestamp, pytz.utc)
-
-            item.duration = _default_if_none(video.get('duration'), 0.)
-
-            # The language should be a three letter code. Use [:3] to make sure that it always is
-            # even if the JWP custom prop is somehow messed up.
-            item.language = jwp.parse_custom_field(
-                    'language', custom.get('sms_language', 'language::'))[:3]
-
-            item.copyright = jwp.parse_custom_field(
-                    'copyright', custom.get('sms_copyright', 'copyright::'))
-
-            # Since tags have database enforced maximum lengths, make sure to truncate them if
-            # they're too long. We also strip leading or trailing whitespace.
-            item.tags = [
-                tag.strip().lower()[:max_tag_length]
-                for tag in jwp.parse_custom_field(
-                    'keywords', custom.get('sms_keywords', 'keywords::')
-                ).split('|')
-                if tag.strip() != ''
-            ]
-
-            # Update view permission
-            item.view_permission.reset()
-            _set_permission_from_acl(item.view_permission, video.acl)
-            item.view_permission.save()
-
-            # Update associated SMS media item (if any)
-            sms_media_id = video.media_id
-            if sms_media_id is not None:
-                # Get or create associated SMS media item. Note that hasattr is recommended in the
-                # Django docs as a way to determine isf a related objects exists.
-                # https://docs.djangoproject.com/en/dev/topics/db/examples/one_to_one/
-                if hasattr(item, 'sms') and item.sms is not None:
-                    sms_media_item = item.sms
-                else:
-                    sms_media_item = legacymodels.MediaItem(id=sms_media_id)
-
-                # Extract last updated timestamp. It should be an ISO 8601 date string.
-                last_updated = jwp.parse_custom_field(
-                    'last_updated_at', custom.get('sms_last_updated_at', 'last_updated_at::'))
-
-                # Update SMS media item
-                sms_media_item.item = item
-                if last_updated == '':
-                    sms_media_item.last_updated_at = None
-                else:
-                    sms_media_item.last_updated_at = dateutil.parser.parse(last_updated)
-
-                sms_media_item.save()
-            else:
-                # If there is no associated SMS media item, make sure that this item doesn't have
-                # one pointing to it.
-                if hasattr(item, 'sms') and item.sms is not None:
-                    item.sms.delete()
-
-            item.save()
+        for rows in _chunked(
+                updated_media_items.iterator(chunk_size=_METADATA_CHUNK_SIZE),
+                _METADATA_CHUNK_SIZE):
+            updated_item_count += _update_media_item_metadata(rows, timings, unlinked_item_ids)
+
+    LOG.info(
+        'Updated metadata of %s media items. Time spent parsing: %.2fs, updating items: %.2fs, '
+        'updating permissions: %.2fs, updating SMS media items: %.2fs', updated_item_count,
+        timings['parse'], timings['items'], timings['permissions'], timings['sms'])
+
+    # Update the materialised publication state and SMS flag of items whose JWP video has
+    # changed. The cached resources are updated outside of the ORM and so no signal handler will
+    # have updated the publication state for us. Items whose SMS media item was re-pointed at
+    # another item also need their SMS flag updating.
+    changed_items = mpmodels.MediaItem.objects_including_deleted.all()
+    if not update_all_videos:
+        changed_items = changed_items.filter(
+            models.Q(jwp__key__in=updated_jwp_video_keys) |
+            models.Q(id__in=[item.id for _, item in jwp_keys_and_items])
+        )
+    changed_items.update_published()
+    mpmodels.MediaItem.objects_including_deleted.filter(
+        models.Q(id__in=changed_items.values('id')) | models.Q(id__in=unlinked_item_ids)
+    ).update_sms_derived()
 
     # 5) Update metadata for changed channels
     #
-    # After this stage, all mediaplatform.Channel objects whose associated JWP channel is one of
-    # those in updated_jwp_channel_keys will have their metadata updated from the JWP channel's
-    # custom props. Note that legacysms.Channel objects associated with updated
-    # mediaplatform.Channel objects will also be updated/created/deleted as necessary.
-
-    # The channels which need update. We defer fetching all the metdata since we're going to
-    # reset it anyway.
-    updated_channels = (
-        mpmodels.Channel.objects.all()
-        .select_related('edit_permission')
-        # updated_at is included because, without it, the field does not get updated on save() for
-        # some reason
-        .only('edit_permission', 'jwp', 'sms', 'updated_at')
+    # After this stage, all mediaplatform.Channel objects whose associated JWP channel has changed
+    # since it was last synchronised will have their metadata updated from the JWP channel's
+    # custom props. Note that legacysms.Collection objects and shadow playlists associated with
+    # updated mediaplatform.Channel objects will also be updated/created/deleted as necessary.
+    #
+    # There is no equivalent of the updated timestamp for JWP channels and so a hash of the values
+    # synchronised from each JWP channel is used to detect changes. If update_all_videos is True,
+    # all channels are synchronised irrespective of the hash.
+
+    updated_channel_count = _update_channel_metadata(update_all=update_all_videos)
+    LOG.info('Updated metadata of %s channels', updated_channel_count)
+
+    # Make sure that the SMS flag on all channels reflects any SMS collections created or deleted
+    # above.
+    mpmodels.Channel.objects_including_deleted.all().update_sms_derived()
+
+    # Much of the above bypasses the post_save signal and so let receivers know that anything may
+    # have changed.
+    mpsignals.bulk_change.send(sender=update_related_models_from_cache)
+
+    # 6) Refresh media sources
+    #
+    # The stored media sources of any new or changed videos are now out of date. They are fetched
+    # from the Delivery API by a separate task once this transaction commits so that the
+    # synchronisation does not wait on the Delivery API. Until then, views fetch the sources of
+    # those videos directly.
+
+    # Imported here since the tasks module imports this one.
+    from mediaplatform_jwp import tasks
+    transaction.on_commit(tasks.update_media_sources.delay)
+
+
+def _ensure_billing_account(lookup_instid):
+    """
+    Return a billing account associated with the specified institution id if one exists or create
+    one if not.
+
+    """
+    return mpmodels.BillingAccount.objects.get_or_create(
+            defaults={'description': f'Lookup instutution {lookup_instid}'},
+            lookup_instid=lookup_instid)[0]
+
+
+def _default_if_none(value, default):
+    return value if value is not None else default
+
+
+def _set_permission_from_acl(permission, acl):
+    """
+    Given an ACL, update the passed permission to reflect it. The permission is not reset, nor is
+    it save()-ed after the update.
+
+    """
+    for ace in acl:
+        if ace == 'WORLD':
+            permission.is_public = True
+        elif ace == 'CAM':
+            permission.is_signed_in = True
+        elif ace.startswith('INST_'):
+            permission.lookup_insts.append(ace[5:])
+        elif ace.startswith('GROUP_'):
+            permission.lookup_groups.append(ace[6:])
+        elif ace.startswith('USER_'):
+            permission.crsids.append(ace[5:])
+
+
+def _update_channel_metadata(update_all=False):
+    """
+    Update the metadata, edit permissions, media items, SMS collections and shadow playlists of
+    channels from their JWP channel resources using a fixed number of queries irrespective of the
+    number of channels.
+
+    A hash of the values synchronised from each JWP channel, including the ids of the media items
+    which its SMS media ids resolve to, is stored in
+    :py:attr:`mediaplatform_jwp.models.Channel.synced_hash`. Only channels whose hash has changed
+    are updated unless *update_all* is True. Returns the number of channels which were updated.
+
+    """
+    # The channels which may need update. We fetch only the ids of the channels and their related
+    # objects along with the JWP channel resources since we're going to reset the metadata anyway.
+    rows = (
+        jwpmodels.Channel.objects
+        .filter(channel__isnull=False, channel__deleted_at__isnull=True)
         .annotate(data=models.Subquery(
             mediajwpmodels.CachedResource.channels
-            .filter(key=models.OuterRef('jwp__key'))
+            .filter(key=models.OuterRef('key'))
             .values_list('data')[:1]
         ))
+        .values_list(
+            'key', 'synced_hash', 'channel__id', 'channel__edit_permission__id',
+            'channel__sms__id', 'channel__sms__playlist__id', 'data'
+        )
     )
 
-    for channel in updated_channels:
+    # Parse the contents of each channel. We use the "sms_collection_media_ids" custom prop as
+    # that is always set to the media ids which "should" be in the collection unlike
+    # sms_{,failed_}media_ids which is used as part of the playlist synchronisation process.
+    parsed_rows = []
+    for row in rows:
         # Skip channels with no associated JWP channel
-        if channel.data is None:
+        if row[-1] is None:
             continue
 
-        channel_data = jwp.Channel(channel.data)
+        channel_data = jwp.Channel(row[-1])
+        sms_collection_media_ids = [
+            int(media_id.strip())
+            for media_id in jwp.parse_custom_field(
+                'collection_media_ids',
+                channel_data.get('custom', {}).get(
+                    'sms_collection_media_ids', 'collection_media_ids::')
+            ).split(',') if media_id.strip() != ''
+        ]
+        parsed_rows.append((row[:-1], channel_data, sms_collection_media_ids))
+
+    # Resolve the SMS media ids of all channels to media item ids with a single query.
+    item_ids_by_media_id = dict(
+        mpmodels.MediaItem.objects
+        .filter(sms__id__in={
+            media_id for _, _, media_ids in parsed_rows for media_id in media_ids
+        })
+        .values_list('sms__id', 'id')
+    )
 
+    now = timezone.now()
+    jwp_channels, channels, permissions = [], [], []
+    channel_ids_by_item_id = {}
+    new_playlists, updated_playlists = [], []
+    collections, deleted_collection_ids = {}, []
+    for ids, channel_data, sms_collection_media_ids in parsed_rows:
+        key, synced_hash, channel_id, permission_id, sms_id, playlist_id = ids
         custom = channel_data.get('custom', {})
 
-        # NB: The channel billing account is immutable and so we need not examine sms_instid here.
-        channel.title = _default_if_none(channel_data.get('title'), '')
-        channel.description = _default_if_none(channel_data.get('description'), '')
-
-        # Update edit permission
-        channel.edit_permission.reset()
+        # A list of media item ids which is in the same order as sms_collection_media_ids.
+        item_ids = [
+            item_id for item_id in (
+                item_ids_by_media_id.get(media_id) for media_id in sms_collection_media_ids
+            ) if item_id is not None
+        ]
 
         try:
             creator = jwp.parse_custom_field(
@@ -353,114 +415,289 @@ def update_related_models_from_cache(update_all_videos=False):
             creator = jwp.parse_custom_field(
                 'creator', custom.get('sms_created_by', 'creator::'))
 
-        if creator != '' and creator not in channel.edit_permission.crsids:
-            channel.edit_permission.crsids.append(creator)
-
         group_id = jwp.parse_custom_field(
             'groupid', custom.get('sms_groupid', 'groupid::'))
-        if group_id != '' and group_id not in channel.edit_permission.lookup_groups:
-            channel.edit_permission.lookup_groups.append(group_id)
 
-        channel.edit_permission.save()
+        # Extract last updated timestamp. It should be an ISO 8601 date string.
+        last_updated = jwp.parse_custom_field(
+            'last_updated_at', custom.get('sms_last_updated_at', 'last_updated_at::'))
 
-        # Update contents. We use the "sms_collection_media_ids" custom prop as that is always set
-        # to the media ids which "should" be in the collection unlike sms_{,failed_}media_ids which
-        # is used as part of the playlist synchronisation process.
-        sms_collection_media_ids = [
-            int(media_id.strip())
-            for media_id in jwp.parse_custom_field(
-                'collection_media_ids',
-                custom.get('sms_collection_media_ids', 'collection_media_ids::')
-            ).split(',') if media_id.strip() != ''
-        ]
-        collection_media_ids = (
-            mpmodels.MediaItem.objects.filter(sms__id__in=sms_collection_media_ids)
-            .only('id', 'sms__id')
-        )
-        channel.items.set(collection_media_ids)
+        # NB: The channel billing account is immutable and so we need not examine sms_instid here.
+        title = _default_if_none(channel_data.get('title'), '')
+        description = _default_if_none(channel_data.get('description'), '')
+        sms_collection_id = channel_data.collection_id
 
-        # Form a list of media item keys which is in the same order as sms_collection_media_ids.
-        item_map = {item.sms.id: item.id for item in collection_media_ids}
-        item_ids = [
-            item_id for item_id in (
-                item_map.get(media_id) for media_id in sms_collection_media_ids
-            ) if item_id is not None
-        ]
+        # Skip channels for which nothing which we synchronise has changed.
+        new_hash = hashlib.md5(json.dumps([
+            title, description, creator, group_id, last_updated, sms_collection_id, item_ids,
+        ]).encode('utf8')).hexdigest()
+        if not update_all and new_hash == synced_hash:
+            continue
+
+        jwp_channels.append(jwpmodels.Channel(key=key, synced_hash=new_hash))
+        channels.append(mpmodels.Channel(
+            id=channel_id, title=title, description=description, updated_at=now))
+
+        # Update edit permission. A new Permission instance has the "allow nobody" state.
+        if permission_id is not None:
+            permissions.append(mpmodels.Permission(
+                id=permission_id,
+                crsids=[creator] if creator != '' else [],
+                lookup_groups=[group_id] if group_id != '' else [],
+            ))
+
+        # Update contents
+        for item_id in item_ids:
+            channel_ids_by_item_id[item_id] = channel_id
 
         # Update associated SMS collection (if any)
-        sms_collection_id = channel_data.collection_id
         if sms_collection_id is not None:
-            # Get or create associated SMS collection. Note that hasattr is recommended in the
-            # Django docs as a way to determine if a related objects exists.
-            # https://docs.djangoproject.com/en/dev/topics/db/examples/one_to_one/
-            if hasattr(channel, 'sms') and channel.sms is not None:
-                sms_channel = channel.sms
+            # If the 'shadow' playlist doesn't exist, create it.
+            if playlist_id is None:
+                playlist = mpmodels.Playlist(channel_id=channel_id)
+                new_playlists.append(playlist)
             else:
-                sms_channel = legacymodels.Collection(id=sms_collection_id)
+                playlist = mpmodels.Playlist(id=playlist_id, updated_at=now)
+                updated_playlists.append(playlist)
+
+            playlist.title = title
+            playlist.description = description
+            playlist.media_items = item_ids
+
+            # An existing SMS collection is kept. Otherwise one is created or an existing one
+            # with the channel's SMS collection id is re-pointed at this channel.
+            collections[sms_id if sms_id is not None else int(sms_collection_id)] = (
+                channel_id, playlist.id,
+                dateutil.parser.parse(last_updated) if last_updated != '' else None
+            )
+        elif sms_id is not None:
+            # If there is no associated SMS collection, make sure that this channel doesn't have
+            # one pointing to it.
+            deleted_collection_ids.append(sms_id)
 
-            # Extract last updated timestamp. It should be an ISO 8601 date string.
-            last_updated = jwp.parse_custom_field(
-                'last_updated_at', custom.get('sms_last_updated_at', 'last_updated_at::'))
+    mpmodels.bulk_update(mpmodels.Channel, channels, ['title', 'description', 'updated_at'])
 
-            # Update SMS collection
-            sms_channel.channel = channel
-            if last_updated == '':
-                sms_channel.last_updated_at = None
-            else:
-                sms_channel.last_updated_at = dateutil.parser.parse(last_updated)
+    mpmodels.bulk_update(
+        mpmodels.Permission, permissions,
+        ['crsids', 'lookup_groups', 'lookup_insts', 'is_public', 'is_signed_in'])
 
-            if sms_channel.playlist is None:
-                # If the 'shadow' playlist doesn't exist, create it.
-                sms_channel.playlist = mpmodels.Playlist(channel=channel)
+    # Remove media items which are no longer in the updated channels and then move all media
+    # items listed by the updated channels into them.
+    (
+        mpmodels.MediaItem.objects
+        .filter(channel_id__in=[channel.id for channel in channels])
+        .exclude(id__in=list(channel_ids_by_item_id.keys()))
+        .update(channel=None)
+    )
+    mpmodels.bulk_update(mpmodels.MediaItem, [
+        mpmodels.MediaItem(id=item_id, channel_id=channel_id)
+        for item_id, channel_id in channel_ids_by_item_id.items()
+    ], ['channel'])
 
-            sms_channel.save()
+    # Since the bulk_create() call does not call any signal handlers, we need to manually create
+    # the public view permissions of the new playlists.
+    mpmodels.Playlist.objects.bulk_create(new_playlists)
+    mpmodels.Permission.objects.bulk_create([
+        mpmodels.Permission(allows_view_playlist=playlist, is_public=True)
+        for playlist in new_playlists
+    ])
+    mpmodels.bulk_update(
+        mpmodels.Playlist, updated_playlists,
+        ['title', 'description', 'media_items', 'updated_at'])
 
-            # Update the Playlist
-            sms_channel.playlist.title = channel.title
-            sms_channel.playlist.description = channel.description
-            sms_channel.playlist.media_items = item_ids
-            sms_channel.playlist.save()
-        else:
-            # If there is no associated SMS collection, make sure that this channel doesn't have
-            # one pointing to it.
-            if hasattr(channel, 'sms') and channel.sms is not None:
-                channel.sms.delete()
+    if len(deleted_collection_ids) > 0:
+        legacymodels.Collection.objects.filter(id__in=deleted_collection_ids).delete()
 
-        channel.save()
+    if len(collections) > 0:
+        with connection.cursor() as cursor:
+            execute_values(cursor, '''
+                INSERT INTO legacysms_collection (id, channel_id, playlist_id, last_updated_at)
+                VALUES %s
+                ON CONFLICT (id) DO
+                    UPDATE SET
+                        channel_id = excluded.channel_id, playlist_id = excluded.playlist_id,
+                        last_updated_at = excluded.last_updated_at
+            ''', [
+                (sms_id, channel_id, playlist_id, last_updated_at)
+                for sms_id, (channel_id, playlist_id, last_updated_at) in collections.items()
+            ], page_size=len(collections))
 
+    mpmodels.bulk_update(jwpmodels.Channel, jwp_channels, ['synced_hash'])
 
-def _ensure_billing_account(lookup_instid):
+    return len(channels)
+
+
+def _update_media_item_metadata(rows, timings, unlinked_item_ids):
     """
-    Return a billing account associated with the specified institution id if one exists or create
-    one if not.
+    Update the metadata of a chunk of media items from their JWP video resources. *rows* is a
+    sequence of (media item id, view permission id, SMS media item id, video resource data)
+    tuples. The media items and their view permissions are updated and associated
+    legacysms.MediaItem objects are updated, created or deleted as necessary using a fixed number
+    of queries irrespective of the number of rows.
+
+    The time in seconds spent in each phase is added to the passed :py:class:`collections.Counter`
+    *timings*. The ids of media items whose SMS media item was re-pointed at another media item
+    are added to the passed set *unlinked_item_ids*. Returns the number of media items which were
+    updated.
 
     """
-    return mpmodels.BillingAccount.objects.get_or_create(
-            defaults={'description': f'Lookup instutution {lookup_instid}'},
-            lookup_instid=lookup_instid)[0]
+    start_time = time.monotonic()
+
+    # Parse the video resources into unsaved model instances. Items whose videos have no
+    # publication date keep their existing one and so are updated separately.
+    now = timezone.now()
+    items, undated_items, permissions = [], [], []
+    sms_items, deleted_sms_ids = {}, []
+    for item_id, permission_id, sms_id, data in rows:
+        # Skip items with no associated JWP video
+        if data is None:
+            continue
 
+        video = jwp.Video(data)
+        custom = video.get('custom', {})
 
-def _default_if_none(value, default):
-    return value if value is not None else default
+        item = _media_item_from_video(item_id, video)
+        item.updated_at = now
+        if video.get('date') is not None:
+            items.append(item)
+        else:
+            undated_items.append(item)
 
+        # Update view permission. A new Permission instance has the "allow nobody" state.
+        if permission_id is not None:
+            permission = mpmodels.Permission(id=permission_id)
+            _set_permission_from_acl(permission, video.acl)
+            permissions.append(permission)
 
-def _set_permission_from_acl(permission, acl):
+        # Update associated SMS media item (if any)
+        sms_media_id = video.media_id
+        if sms_media_id is not None:
+            # Extract last updated timestamp. It should be an ISO 8601 date string.
+            last_updated = jwp.parse_custom_field(
+                'last_updated_at', custom.get('sms_last_updated_at', 'last_updated_at::'))
+            last_updated_at = (
+                dateutil.parser.parse(last_updated) if last_updated != '' else None)
+
+            # An existing SMS media item is kept. Otherwise one is created or an existing one
+            # with the video's SMS media id is re-pointed at this item.
+            sms_items[sms_id if sms_id is not None else int(sms_media_id)] = (
+                item_id, last_updated_at)
+        elif sms_id is not None:
+            # If there is no associated SMS media item, make sure that this item doesn't have one
+            # pointing to it.
+            deleted_sms_ids.append(sms_id)
+
+    timings['parse'] += time.monotonic() - start_time
+    start_time = time.monotonic()
+
+    # MediaItemManager.bulk_update_fields() is not used since the publication state of changed
+    # items is updated and the bulk_change signal is sent once the whole sync has finished.
+    fields = [
+        'title', 'description', 'type', 'downloadable', 'duration', 'language', 'copyright',
+        'tags', 'updated_at',
+    ]
+    mpmodels.bulk_update(mpmodels.MediaItem, items, fields + ['published_at'])
+    mpmodels.bulk_update(mpmodels.MediaItem, undated_items, fields)
+
+    timings['items'] += time.monotonic() - start_time
+    start_time = time.monotonic()
+
+    mpmodels.bulk_update(
+        mpmodels.Permission, permissions,
+        ['crsids', 'lookup_groups', 'lookup_insts', 'is_public', 'is_signed_in'])
+
+    timings['permissions'] += time.monotonic() - start_time
+    start_time = time.monotonic()
+
+    if len(deleted_sms_ids) > 0:
+        legacymodels.MediaItem.objects.filter(id__in=deleted_sms_ids).delete()
+
+    if len(sms_items) > 0:
+        # The upsert below bypasses the legacysms signal handlers which would otherwise update the
+        # SMS flag of items which lose their SMS media item and so remember those items.
+        for sms_id, previous_item_id in (
+                legacymodels.MediaItem.objects
+                .filter(id__in=sms_items.keys(), item_id__isnull=False)
+                .values_list('id', 'item_id')):
+            if previous_item_id != sms_items[sms_id][0]:
+                unlinked_item_ids.add(previous_item_id)
+
+        with connection.cursor() as cursor:
+            execute_values(cursor, '''
+                INSERT INTO legacysms_mediaitem (id, item_id, last_updated_at)
+                VALUES %s
+                ON CONFLICT (id) DO
+                    UPDATE SET
+                        item_id = excluded.item_id, last_updated_at = excluded.last_updated_at
+            ''', [
+                (sms_id, item_id, last_updated_at)
+                for sms_id, (item_id, last_updated_at) in sms_items.items()
+            ], page_size=len(sms_items))
+
+    timings['sms'] += time.monotonic() - start_time
+
+    return len(items) + len(undated_items)
+
+
+def _media_item_from_video(item_id, video):
     """
-    Given an ACL, update the passed permission to reflect it. The permission is not reset, nor is
-    it save()-ed after the update.
+    Return an unsaved :py:class:`mediaplatform.models.MediaItem` with the passed id whose metadata
+    is set from the passed :py:class:`mediaplatform_jwp.api.delivery.Video`. The publication date
+    is only set if the video has one.
 
     """
-    for ace in acl:
-        if ace == 'WORLD':
-            permission.is_public = True
-        elif ace == 'CAM':
-            permission.is_signed_in = True
-        elif ace.startswith('INST_'):
-            permission.lookup_insts.append(ace[5:])
-        elif ace.startswith('GROUP_'):
-            permission.lookup_groups.append(ace[6:])
-        elif ace.startswith('USER_'):
-            permission.crsids.append(ace[5:])
+    max_tag_length = mpmodels.MediaItem._meta.get_field('tags').base_field.max_length
+    type_map = {
+        'video': mpmodels.MediaItem.VIDEO,
+        'audio': mpmodels.MediaItem.AUDIO,
+        'unknown': mpmodels.MediaItem.UNKNOWN,
+    }
+
+    custom = video.get('custom', {})
+    item = mpmodels.MediaItem(id=item_id)
+
+    item.title = _default_if_none(video.get('title'), '')
+    item.description = _default_if_none(video.get('description'), '')
+    item.type = type_map[_default_if_none(video.get('mediatype'), 'unknown')]
+
+    item.downloadable = 'True' == jwp.parse_custom_field(
+            'downloadable', custom.get('sms_downloadable', 'downloadable:False:'))
+
+    published_timestamp = video.get('date')
+    if published_timestamp is not None:
+        item.published_at = datetime.datetime.fromtimestamp(published_timestamp, pytz.utc)
+
+    item.duration = _default_if_none(video.get('duration'), 0.)
+
+    # The language should be a three letter code. Use [:3] to make sure that it always is even if
+    # the JWP custom prop is somehow messed up.
+    item.language = jwp.parse_custom_field(
+            'language', custom.get('sms_language', 'language::'))[:3]
+
+    item.copyright = jwp.parse_custom_field(
+            'copyright', custom.get('sms_copyright', 'copyright::'))
+
+    # Since tags have database enforced maximum lengths, make sure to truncate them if they're too
+    # long. We also strip leading or trailing whitespace.
+    item.tags = [
+        tag.strip().lower()[:max_tag_length]
+        for tag in jwp.parse_custom_field(
+            'keywords', custom.get('sms_keywords', 'keywords::')
+        ).split('|')
+        if tag.strip() != ''
+    ]
+
+    return item
+
+
+def _chunked(iterable, size):
+    """Yield lists of at most *size* consecutive elements of *iterable*."""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if len(chunk) == 0:
+            return
+        yield chunk
 
 
 def _ensure_resources(jwp_model, resource_queryset):
@@ -2,26 +2,37 @@
 Celery tasks.
 
 """
+import collections
+import concurrent.futures
+import itertools
 import logging
 import random
 import time
 
 from celery import shared_task
+from django.conf import settings
 from django.db import transaction
+from django.db.models import F, Q
 from jwplatform.errors import JWPlatformRateLimitExceededError
 
 from mediaplatform_jwp import models
 from mediaplatform_jwp import sync
 from mediaplatform_jwp.api import delivery as jwplatform
+from mediaplatform_jwp.api import management
+from mediaplatform_jwp.api import ratelimit
 import mediaplatform.models
 
 
 LOG = logging.getLogger(__name__)
 
+#: Number of resources requested in each page fetched by _fetch_list().
+_FETCH_PAGE_SIZE = 1000
+
 
 @shared_task(name='mediaplatform_jwp.synchronise')
 @transaction.atomic
-def synchronise(sync_all=False, skip_video_fetch=False, skip_channel_fetch=False):
+def synchronise(
+        sync_all=False, skip_video_fetch=False, skip_channel_fetch=False, incremental=False):
     """
     Synchronise the list of Cached JWP resources in the database with the actual list of resources
     using the JWP management API.
@@ -38,14 +49,31 @@ def synchronise(sync_all=False, skip_video_fetch=False, skip_channel_fetch=False
 
     If *skip_channel_fetch* is True, the cached channel resources are not re-fetched from JWP.
 
+    If *incremental* is True, only videos updated since the most recently updated cached video are
+    fetched from JWP and videos which have been deleted from JWP are not detected. Channels have
+    no updated timestamp and so are always fetched in full. If there are no cached videos, all
+    videos are fetched. An incremental synchronisation should be scheduled frequently and a full
+    synchronisation, which also detects deleted videos, less frequently.
+
     """
     # Create the JWPlatform client
     client = jwplatform.get_jwplatform_client()
 
-    # Fetch and cache the video resources
-    if not skip_video_fetch:
+    # Fetch and cache the video resources. An incremental fetch only fetches videos updated since
+    # the most recently updated cached video.
+    updated_since = None
+    if incremental and not skip_video_fetch:
+        updated_since = models.get_updated_high_water_mark(models.CachedResource.VIDEO)
+
+    if not skip_video_fetch and updated_since is not None:
+        LOG.info('Caching video resources updated since %s...', updated_since)
+        result = models.set_resources(
+            fetch_videos(client, updated_since=updated_since), 'video', delete_missing=False)
+        _log_set_resources_result('video', result)
+    elif not skip_video_fetch:
         LOG.info('Caching video resources...')
-        models.set_resources(fetch_videos(client), 'video')
+        result = models.set_resources(fetch_videos(client), 'video')
+        _log_set_resources_result('video', result)
 
     # Print out the total number of videos cached
     LOG.info('Number of cached video resources: {}'.format(
@@ -54,7 +82,8 @@ def synchronise(sync_all=False, skip_video_fetch=False, skip_channel_fetch=False
 
     if not skip_channel_fetch:
         LOG.info('Fetching channels...')
-        models.set_resources(fetch_channels(client), 'channel')
+        result = models.set_resources(fetch_channels(client), 'channel')
+        _log_set_resources_result('channel', result)
 
     # Print out the total number of channels cached
     LOG.info('Number of cached channel resources: {}'.format(
@@ -75,12 +104,102 @@ def synchronise(sync_all=False, skip_video_fetch=False, skip_channel_fetch=False
     ))
 
 
-def fetch_videos(client):
+@shared_task(name='mediaplatform_jwp.update_items')
+def update_items(item_ids):
+    """
+    Synchronise the JWP videos of the media items with the passed ids using the JWP management
+    API. This is used to propagate changes made to many items at once with a single job. A failure
+    to synchronise one item is logged and does not prevent the others from being synchronised.
+
     """
-    Returns an iterable of dicts representing all video resources in the JWPlatform database.
+    items = (
+        mediaplatform.models.MediaItem.objects.filter(id__in=item_ids)
+        .select_related('jwp', 'view_permission')
+    )
+    for item in items:
+        try:
+            management.schedule_item_update(item)
+        except Exception:
+            LOG.exception('Error synchronising media item %s with JWP', item.id)
+
+
+@shared_task(name='mediaplatform_jwp.update_media_sources')
+def update_media_sources(keys=None):
+    """
+    Fetch the media sources of JWP videos using the Delivery API and store them as
+    :py:class:`~mediaplatform_jwp.models.MediaSource` objects. If *keys* is None, the videos with
+    media items whose stored sources are missing or out of date are fetched, at most
+    :py:data:`~mediaplatform_jwp.defaultsettings.JWP_MEDIA_SOURCES_BATCH_SIZE` per run. Otherwise
+    *keys* is a list of the JWP keys of the videos to fetch. The videos are fetched concurrently
+    by :py:meth:`~mediaplatform_jwp.api.delivery.DeliveryVideo.from_keys`.
+
+    This task is scheduled after each synchronisation and should also be scheduled to run
+    periodically (e.g. every few minutes) to pick up any videos which could not be fetched. A
+    failure to fetch one video is logged and does not prevent the others from being fetched.
 
     """
-    return _fetch_list(client.videos.list, 'videos')
+    videos = models.Video.objects.only('key', 'updated')
+    if keys is None:
+        videos = (
+            videos.filter(item__isnull=False)
+            .filter(Q(sources_updated__isnull=True) | Q(sources_updated__lt=F('updated')))
+            .order_by('-updated')[:settings.JWP_MEDIA_SOURCES_BATCH_SIZE]
+        )
+    else:
+        videos = videos.filter(key__in=keys)
+
+    videos = list(videos)
+    delivery_videos, errors = jwplatform.DeliveryVideo.from_keys(video.key for video in videos)
+
+    # Videos which are not found may still be transcoding. Views continue to use the Delivery API
+    # directly for videos which could not be fetched until a later run succeeds.
+    for key, error in errors.items():
+        if not isinstance(error, jwplatform.VideoNotFoundError):
+            LOG.error('Error fetching media sources for JWP video %s', key, exc_info=error)
+
+    updated_count = 0
+    for video in videos:
+        delivery_video = delivery_videos.get(video.key)
+        if delivery_video is None:
+            continue
+
+        sources = [
+            models.MediaSource.from_delivery_source(video, position, source)
+            for position, source in enumerate(delivery_video.get('sources', []))
+        ]
+        with transaction.atomic():
+            models.MediaSource.objects.filter(video=video).delete()
+            models.MediaSource.objects.bulk_create(sources)
+            # The sources are current as of the updated timestamp read before they were fetched.
+            models.Video.objects.filter(key=video.key).update(sources_updated=video.updated)
+        updated_count += 1
+
+    LOG.info('Number of videos with updated media sources: %s', updated_count)
+
+
+def _log_set_resources_result(resource_type, result):
+    """Log the counts returned by :py:func:`~mediaplatform_jwp.models.set_resources`."""
+    LOG.info(
+        'Cached %s resources: %s inserted, %s changed, %s unchanged, %s deleted',
+        resource_type, result.inserted, result.changed, result.unchanged, result.deleted)
+
+
+def fetch_videos(client, updated_since=None):
+    """
+    Returns an iterable of dicts representing all video resources in the JWPlatform database. If
+    *updated_since* is not None, only videos whose updated timestamp is at least *updated_since*
+    are returned. Videos are then listed in order of decreasing updated timestamp and listing stops
+    at the first older video. Pages are fetched one at a time in this case since usually only the
+    first page contains any updated videos.
+
+    """
+    if updated_since is None:
+        return _fetch_list(client.videos.list, 'videos')
+
+    return itertools.takewhile(
+        lambda video: video.get('updated', 0) >= updated_since,
+        _fetch_list(client.videos.list, 'videos', fetch_ahead=False, order_by='updated:desc')
+    )
 
 
 def fetch_channels(client):
@@ -91,41 +210,106 @@ def fetch_channels(client):
     return _fetch_list(client.channels.list, 'channels')
 
 
-def _fetch_list(list_callable, results_key):
+def _fetch_list(list_callable, results_key, fetch_ahead=True, **list_params):
     """
     Returns an iterable of dicts representing all resources in the JWPlatform database returned
-    by a given callable.
+    by a given callable. Any additional keyword arguments are passed to the callable.
+
+    The first page of resources is fetched on its own to learn the total number of resources. If
+    *fetch_ahead* is True, the remaining pages are then fetched concurrently by
+    :py:data:`~mediaplatform_jwp.defaultsettings.JWP_FETCH_WORKERS` threads and the resources are
+    yielded in offset order. If *fetch_ahead* is False or the total is not reported, pages are
+    fetched one at a time as the caller consumes the resources and so a caller which stops early
+    causes no further requests. Either way, fetching continues until an empty page is returned so
+    that resources added during the fetch are not missed.
+
+    All requests share a :py:class:`~mediaplatform_jwp.api.ratelimit.TokenBucket` rate limiter
+    which issues :py:data:`~mediaplatform_jwp.defaultsettings.JWP_FETCH_RATE` requests per second
+    and adapts to rate limit errors.
+
+    """
+    workers = settings.JWP_FETCH_WORKERS
+    limiter = ratelimit.TokenBucket(rate=settings.JWP_FETCH_RATE, capacity=workers)
+    start_time = time.monotonic()
+    page_count, resource_count = 0, 0
+
+    def fetch(offset):
+        return _fetch_page(list_callable, results_key, offset, limiter, list_params)
+
+    response = fetch(0)
+    page_count += 1
+    results = response.get(results_key, [])
+    total = response.get('total')
+    next_offset = len(results)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        # Pages which are being fetched concurrently in offset order. The number of pages fetched
+        # ahead of the caller is bounded so that a slow caller does not cause all pages to be
+        # held in memory.
+        pending = collections.deque()
+        planned_offsets = iter(
+            range(next_offset, total, next_offset)
+            if fetch_ahead and total is not None and next_offset > 0 else []
+        )
+        try:
+            while len(results) > 0:
+                resource_count += len(results)
+                LOG.info(f'... resources fetched so far: {resource_count}')
+
+                # Yield each dict in turn to the caller
+                for result in results:
+                    yield result
+
+                for offset in itertools.islice(planned_offsets, 2 * workers - len(pending)):
+                    pending.append((offset, executor.submit(fetch, offset)))
+
+                if len(pending) > 0:
+                    offset, future = pending.popleft()
+                    response = future.result()
+                else:
+                    # The total was not known or more resources have appeared since the first
+                    # page was fetched.
+                    offset = next_offset
+                    response = fetch(offset)
+                page_count += 1
+                results = response.get(results_key, [])
+                next_offset = offset + len(results)
+        finally:
+            for _, future in pending:
+                future.cancel()
+
+    elapsed = time.monotonic() - start_time
+    LOG.info(
+        'Fetched %s pages in %.1f seconds (%.2f pages/sec) of which %.1f seconds were spent '
+        'throttled', page_count, elapsed, page_count / elapsed if elapsed > 0 else 0,
+        limiter.throttled_time)
+
+
+def _fetch_page(list_callable, results_key, offset, limiter, list_params):
+    """
+    Fetch and return the response from *list_callable* for a page of resources starting at
+    *offset*, waiting for *limiter* before each request. Requests which are rate limited are
+    retried.
 
     """
-    current_offset = 0
-    while True:
-        for retry_idx in range(10):
-            try:
-                # We fetch only manual channels since those are the ones we sync via sms2jwplayer.
-                results = list_callable(
-                    types_filter='manual',
-                    result_offset=current_offset, result_limit=1000).get(results_key, [])
-                current_offset += len(results)
-                break
-            except JWPlatformRateLimitExceededError:
-                # there was a rate limit error, sleep for a random duration to try and clear it
-                delay = random.randrange(20, 60)
-                LOG.warn(
-                    'Attempt %s failed due to rate limit error. Sleeping for %s seconds...',
-                    retry_idx + 1, delay
-                )
-                time.sleep(delay)
-        else:
-            # Only executed if the loop exited normally
-            raise RuntimeError('Aborting fetch after too many rety attempts')
-
-        # Stop when we get no results
-        if len(results) == 0:
-            break
-
-        # Otherwise, print our out progress
-        LOG.info(f'... resources fetched so far: {current_offset}')
-
-        # Yield each dict in turn to the caller
-        for result in results:
-            yield result
+    for retry_idx in range(10):
+        limiter.acquire()
+        try:
+            # We fetch only manual channels since those are the ones we sync via sms2jwplayer.
+            response = list_callable(
+                types_filter='manual', result_offset=offset, result_limit=_FETCH_PAGE_SIZE,
+                **list_params)
+        except JWPlatformRateLimitExceededError:
+            # there was a rate limit error, pause all requests for a random duration to try and
+            # clear it unless the server has told us when the limit resets
+            delay = limiter.record_rate_limited(default_delay=random.randrange(20, 60))
+            LOG.warning(
+                'Attempt %s to fetch offset %s failed due to rate limit error. Throttling for '
+                '%.1f seconds...', retry_idx + 1, offset, delay
+            )
+            continue
+
+        limiter.record_success(response.get('rate_limit'))
+        return response
+
+    raise RuntimeError('Aborting fetch after too many rety attempts')
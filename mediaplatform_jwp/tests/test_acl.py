@@ -5,7 +5,8 @@ from unittest import mock
 
 from django.test import TestCase
 
-from mediaplatform_jwp.acl import AceWorld, AceCam, AceInst, AceGroup, AceUser, build_acl
+from mediaplatform_jwp.acl import (
+    AceWorld, AceCam, AceInst, AceGroup, AceUser, build_acl, compile_acl)
 
 
 class AclTest(TestCase):
@@ -123,6 +124,65 @@ class AceUserTest(TestCase):
         self.assertTrue(ace_user.has_permission(mock.Mock(username="mb2174")))
 
 
+class CompiledAclTest(TestCase):
+    """
+    Tests for :py:class:CompiledAcl
+    """
+    def setUp(self):
+        patch_get_person(self)
+        self.anonymous = mock.Mock(is_anonymous=True)
+        self.user = mock.Mock(is_anonymous=False, username='mb2174')
+
+    def test_cached(self):
+        self.assertIs(compile_acl(('CAM', 'INST_UIS')), compile_acl(('CAM', 'INST_UIS')))
+
+    def test_world(self):
+        acl = compile_acl(('USER_spqr1', 'WORLD'))
+        self.assertTrue(acl.is_world)
+        self.assertTrue(acl.has_permission(self.anonymous))
+        self.assertTrue(acl.has_permission(self.user))
+
+    def test_cam(self):
+        acl = compile_acl(('CAM',))
+        self.assertFalse(acl.has_permission(self.anonymous))
+        self.assertTrue(acl.has_permission(self.user))
+
+    def test_user(self):
+        self.assertTrue(compile_acl(('USER_mb2174',)).has_permission(self.user))
+        self.assertFalse(compile_acl(('USER_mb2174',)).has_permission(self.anonymous))
+        self.assertFalse(compile_acl(('USER_rjw57',)).has_permission(self.user))
+
+    def test_inst(self):
+        self.assertTrue(compile_acl(('INST_UIS',)).has_permission(self.user))
+        self.assertFalse(compile_acl(('INST_CL',)).has_permission(self.user))
+
+    def test_group(self):
+        self.assertTrue(compile_acl(('GROUP_12345',)).has_permission(self.user))
+        self.assertTrue(compile_acl(('GROUP_uis-members',)).has_permission(self.user))
+        self.assertFalse(compile_acl(('GROUP_99999',)).has_permission(self.user))
+        self.assertFalse(compile_acl(('GROUP_12345',)).has_permission(self.anonymous))
+
+    def test_empty(self):
+        self.assertFalse(compile_acl(()).has_permission(self.user))
+
+    def test_unrecognised(self):
+        with self.assertRaises(AssertionError):
+            compile_acl(('OTHER',))
+
+    def test_matches_build_acl(self):
+        """A compiled ACL agrees with evaluating each ACE in turn."""
+        acls = [
+            ('WORLD',), ('CAM',), ('INST_UIS',), ('INST_CL', 'GROUP_12345'),
+            ('GROUP_uis-members',), ('USER_mb2174',), ('USER_rjw57', 'GROUP_99999'), (),
+        ]
+        for acl in acls:
+            for user in (self.anonymous, self.user):
+                self.assertEqual(
+                    compile_acl(acl).has_permission(user),
+                    any(ace.has_permission(user) for ace in build_acl(acl)),
+                    (acl, user.is_anonymous))
+
+
 def patch_get_person(self):
     get_person = mock.Mock()
     get_person.return_value = {
@@ -1,6 +1,11 @@
+import http.server
+import json
+import threading
+import urllib.parse
 from unittest import mock
 
-from django.test import TestCase
+from django.test import TestCase, override_settings
+import requests
 
 from mediaplatform_jwp.api import delivery as jwplatform
 from mediaplatform import models as mpmodels
@@ -33,6 +38,89 @@ class SourcesTestCase(TestCase):
         self.assertEqual(source_urls, expected_urls)
 
 
+class StubDeliveryAPIHandler(http.server.BaseHTTPRequestHandler):
+    """
+    A request handler for a stub Delivery API. Videos whose key starts with "missing" do not exist
+    and the first request for a video whose key starts with "flaky" fails with a server error.
+
+    """
+    def do_GET(self):
+        key = urllib.parse.urlsplit(self.path).path.split('/')[-1]
+        server = self.server
+        with server.lock:
+            server.request_counts[key] = server.request_counts.get(key, 0) + 1
+            count = server.request_counts[key]
+
+        if key.startswith('missing'):
+            self.send_error(404)
+        elif key.startswith('flaky') and count == 1:
+            self.send_error(503)
+        else:
+            body = json.dumps({'playlist': [
+                {**DELIVERY_VIDEO_FIXTURE, 'mediaid': key, 'pubdate': 1234567}
+            ]}).encode('utf8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@override_settings(JWPLATFORM_DELIVERY_RETRY_DELAY=0, JWPLATFORM_DELIVERY_MAX_CONCURRENCY=4)
+class FromKeysTestCase(TestCase):
+    def setUp(self):
+        self.server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), StubDeliveryAPIHandler)
+        self.server.lock = threading.Lock()
+        self.server.request_counts = {}
+        thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+        self.session = requests.Session()
+        self.session.trust_env = False  # do not use any proxy from the environment
+        self.addCleanup(self.session.close)
+
+        host, port = self.server.server_address
+        settings_override = override_settings(JWPLATFORM_API_BASE_URL=f'http://{host}:{port}/')
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_partial_results(self):
+        """Videos which exist are returned and errors are recorded for the others."""
+        keys = [f'video{i}' for i in range(10)] + ['missing1', 'video0']
+        videos, errors = jwplatform.DeliveryVideo.from_keys(keys, session=self.session)
+        self.assertEqual(set(videos.keys()), {f'video{i}' for i in range(10)})
+        self.assertEqual(videos['video3'].key, 'video3')
+        self.assertEqual(videos['video3']['sources'], DELIVERY_VIDEO_FIXTURE['sources'])
+        self.assertEqual(set(errors.keys()), {'missing1'})
+        self.assertIsInstance(errors['missing1'], jwplatform.VideoNotFoundError)
+
+        # Duplicate keys are fetched once.
+        self.assertEqual(self.server.request_counts['video0'], 1)
+
+    def test_server_errors_retried(self):
+        """Requests which fail with a server error are retried."""
+        videos, errors = jwplatform.DeliveryVideo.from_keys(['flaky1'], session=self.session)
+        self.assertEqual(set(videos.keys()), {'flaky1'})
+        self.assertEqual(errors, {})
+        self.assertEqual(self.server.request_counts['flaky1'], 2)
+
+    @override_settings(JWPLATFORM_DELIVERY_MAX_RETRIES=0)
+    def test_retries_exhausted(self):
+        """Once retries are exhausted, the error is recorded."""
+        videos, errors = jwplatform.DeliveryVideo.from_keys(['flaky1'], session=self.session)
+        self.assertEqual(videos, {})
+        self.assertIsInstance(errors['flaky1'], requests.HTTPError)
+
+    def test_no_keys(self):
+        """Fetching no keys makes no requests."""
+        self.assertEqual(jwplatform.DeliveryVideo.from_keys([]), ({}, {}))
+
+
 class PlayerLibraryURLTestCase(TestCase):
     def test_default_player(self):
         """With no player specified, a URL for the default player is returned."""
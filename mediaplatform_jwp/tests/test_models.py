@@ -1,7 +1,12 @@
 import random
+from unittest import mock
+
 from django.test import TestCase
 
+import mediaplatform.models as mpmodels
 from .. import models
+from .. import tasks
+from ..api import delivery as api
 
 
 class CachedResourceTest(TestCase):
@@ -45,10 +50,45 @@ class CachedResourceTest(TestCase):
     def test_updated_at(self):
         """If a value is updated, the updated_at timestamp should be after created_at."""
         models.set_resources([{'key': 'foo', 'x': 5}], 'video')
-        models.set_resources([{'key': 'foo', 'x': 5}], 'video')
+        models.set_resources([{'key': 'foo', 'x': 6}], 'video')
         obj = self.videos.get(key='foo')
         self.assertGreater(obj.updated_at, obj.created_at)
 
+    def test_unchanged_not_updated(self):
+        """If a value is unchanged, the updated_at timestamp should not change."""
+        models.set_resources([{'key': 'foo', 'x': 5, 'y': 6}], 'video')
+        # key order does not affect whether the resource has changed
+        models.set_resources([{'key': 'foo', 'y': 6, 'x': 5}], 'video')
+        obj = self.videos.get(key='foo')
+        self.assertEqual(obj.updated_at, obj.created_at)
+
+    def test_counts(self):
+        """The numbers of inserted, changed, unchanged and deleted resources are returned."""
+        self.assertEqual(
+            models.set_resources([
+                {'key': 'foo', 'x': 5}, {'key': 'bar', 'y': 7}, {'key': 'buzz', 'z': 8},
+            ], 'video'),
+            (3, 0, 0, 0)
+        )
+        result = models.set_resources([
+            {'key': 'foo', 'x': 5}, {'key': 'bar', 'y': 8}, {'key': 'quux', 'a': 1},
+        ], 'video')
+        self.assertEqual(result.inserted, 1)
+        self.assertEqual(result.changed, 1)
+        self.assertEqual(result.unchanged, 1)
+        self.assertEqual(result.deleted, 1)
+
+        # A deleted resource which re-appears counts as changed and already deleted resources
+        # are not deleted again.
+        result = models.set_resources([{'key': 'buzz', 'z': 8}], 'video', delete_missing=False)
+        self.assertEqual(result, (0, 1, 0, 0))
+
+    def test_special_characters(self):
+        """Resources containing characters special to CSV or COPY are stored intact."""
+        data = {'key': 'foo,"bar"', 'x': 'a,b\tc\n"d"\\e\r\u00e9'}
+        models.set_resources([data], 'video')
+        self.assertEqual(self.videos.get(key='foo,"bar"').data, data)
+
     def test_iterable_resources(self):
         """update_resource_cache() should accept an iterable."""
         def resources():
@@ -131,3 +171,81 @@ class VideoTest(TestCase):
     def test_has_cached_resource(self):
         """A video has an associated cached resource """
         self.assertIsNotNone(self.video.resource)
+
+
+class VideoSourcesTest(TestCase):
+    def setUp(self):
+        models.set_resources([{'key': 'foo', 'updated': 10}], 'video')
+        self.item = mpmodels.MediaItem.objects.create()
+        self.video = models.Video.objects.create(
+            key='foo', item=self.item, updated=10,
+            resource=models.CachedResource.videos.get(key='foo'))
+
+        self.from_key_patcher = mock.patch(
+            'mediaplatform_jwp.api.delivery.DeliveryVideo.from_key')
+        self.from_key = self.from_key_patcher.start()
+        self.addCleanup(self.from_key_patcher.stop)
+        self.from_key.return_value = api.DeliveryVideo({'key': 'foo', 'sources': [
+            {'type': 'video/mp4', 'width': 1920, 'height': 1080, 'bitrate': 4000000,
+             'file': 'http://cdn.invalid/vid1.mp4'},
+            {'type': 'audio/mp4', 'file': 'http://cdn.invalid/vid1.m4a?exp=1&sig=abc'},
+        ]})
+
+        # Bulk fetches are made via the mocked single fetch.
+        self.from_keys_patcher = mock.patch(
+            'mediaplatform_jwp.api.delivery.DeliveryVideo.from_keys')
+        self.from_keys = self.from_keys_patcher.start()
+        self.addCleanup(self.from_keys_patcher.stop)
+        self.from_keys.side_effect = self._from_keys
+
+    def _from_keys(self, keys):
+        videos, errors = {}, {}
+        for key in keys:
+            try:
+                videos[key] = self.from_key(key)
+            except Exception as e:
+                errors[key] = e
+        return videos, errors
+
+    def test_missing_sources_fetched(self):
+        """If no sources are stored, they are fetched from the Delivery API."""
+        sources = models.Video.objects.get(key='foo').get_sources()
+        self.from_key.assert_called_once_with('foo')
+        self.assertEqual(
+            [source.url for source in sources],
+            ['http://cdn.invalid/vid1.mp4', 'http://cdn.invalid/vid1.m4a?exp=1&sig=abc'])
+
+    def test_update_media_sources(self):
+        """Stored sources are used without calling the Delivery API until the video changes."""
+        tasks.update_media_sources()
+        self.from_key.assert_called_once_with('foo')
+        self.from_key.reset_mock()
+
+        video = models.Video.objects.get(key='foo')
+        self.assertEqual(video.sources_updated, 10)
+        self.assertEqual(video.media_sources.get(position=0).bitrate, 4000000)
+        self.assertTrue(video.media_sources.get(position=1).is_signed)
+
+        sources = video.get_sources()
+        self.from_key.assert_not_called()
+        self.assertEqual(
+            [(s.mime_type, s.width, s.height) for s in sources],
+            [('video/mp4', 1920, 1080), ('audio/mp4', None, None)])
+        self.assertEqual(sources[0].url, 'http://cdn.invalid/vid1.mp4')
+        self.assertTrue(sources[1].url.startswith('http://cdn.invalid/vid1.m4a?exp='))
+        self.assertIn('sig=', sources[1].url)
+
+        # Current sources are not re-fetched.
+        tasks.update_media_sources()
+        self.from_key.assert_not_called()
+
+        # Once the video has changed the stored sources are out of date.
+        models.Video.objects.filter(key='foo').update(updated=20)
+        models.Video.objects.get(key='foo').get_sources()
+        self.from_key.assert_called_once_with('foo')
+
+    def test_not_found_video_left_missing(self):
+        """A video which is not yet available from the Delivery API is left to be re-fetched."""
+        self.from_key.side_effect = api.VideoNotFoundError()
+        tasks.update_media_sources()
+        self.assertIsNone(models.Video.objects.get(key='foo').sources_updated)
@@ -0,0 +1,57 @@
+import time
+
+from django.test import TestCase
+
+from mediaplatform_jwp.api import ratelimit
+
+
+class FakeClock:
+    """A monotonic clock which only advances when slept on."""
+    def __init__(self):
+        self.now = 0.
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, delay):
+        self.now += delay
+
+
+class TokenBucketTest(TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.bucket = ratelimit.TokenBucket(
+            rate=2, capacity=2, clock=self.clock, sleep=self.clock.sleep)
+
+    def test_burst_then_rate(self):
+        """Up to capacity tokens are issued at once and then tokens are issued at the rate."""
+        self.assertEqual(self.bucket.acquire(), 0)
+        self.assertEqual(self.bucket.acquire(), 0)
+        self.assertAlmostEqual(self.bucket.acquire(), 0.5)
+        self.assertAlmostEqual(self.bucket.throttled_time, 0.5)
+
+    def test_rate_limited(self):
+        """Being rate limited pauses the bucket and halves the rate until requests succeed."""
+        self.assertEqual(self.bucket.record_rate_limited(default_delay=10), 10)
+        self.assertEqual(self.bucket.rate, 1)
+        self.assertAlmostEqual(self.bucket.acquire(), 10)
+        self.assertAlmostEqual(self.bucket.acquire(), 0)
+        self.assertAlmostEqual(self.bucket.acquire(), 1)
+
+        self.bucket.record_success()
+        self.assertAlmostEqual(self.bucket.rate, 1.2)
+        for _ in range(10):
+            self.bucket.record_success()
+        self.assertEqual(self.bucket.rate, 2)
+
+    def test_reset_honoured(self):
+        """If the server reports no remaining requests, the bucket pauses until the reset."""
+        self.bucket.record_success({'remaining': 0, 'reset': time.time() + 30})
+        self.assertGreater(self.bucket.acquire(), 29)
+
+    def test_reset_used_when_rate_limited(self):
+        """When rate limited, the bucket pauses until the last reported reset time."""
+        self.bucket.record_success({'remaining': 5, 'reset': time.time() + 20})
+        delay = self.bucket.record_rate_limited(default_delay=50)
+        self.assertGreater(delay, 19)
+        self.assertLessEqual(delay, 20)
@@ -5,6 +5,7 @@ from django.test import TestCase, override_settings
 import mediaplatform.models as mpmodels
 
 from .. import signalhandlers
+from .. import tasks
 
 
 class SyncItemsTestCase(TestCase):
@@ -91,3 +92,58 @@ class MediaItemSyncTestCase(TestCase):
             i1.save()
             i1.view_permission.save()
         self.schedule_item_update.assert_not_called()
+
+    def test_bulk_change_schedules_one_task(self):
+        """
+        Changing media items in bulk should schedule a single task to synchronise them once the
+        transaction commits.
+
+        """
+        i1 = mpmodels.MediaItem.objects.get(id='empty')
+        i1.title = 'foo'
+        with mock.patch('django.db.transaction.on_commit') as on_commit, \
+                mock.patch('mediaplatform_jwp.tasks.update_items.delay') as delay:
+            mpmodels.MediaItem.objects.bulk_update_fields([i1], ['title'])
+            on_commit.assert_called_once()
+            delay.assert_not_called()
+            on_commit.call_args[0][0]()
+        delay.assert_called_once_with([i1.id])
+        self.schedule_item_update.assert_not_called()
+
+    def test_bulk_change_not_scheduled_if_sync_disabled(self):
+        """
+        Disabling synchronisation should not schedule a task for changes made in bulk.
+
+        """
+        i1 = mpmodels.MediaItem.objects.get(id='empty')
+        with mock.patch('django.db.transaction.on_commit') as on_commit:
+            with signalhandlers.setting_sync_items(False):
+                mpmodels.MediaItem.objects.bulk_update_fields([i1], ['title'])
+        on_commit.assert_not_called()
+
+    def test_bulk_create_and_update_synchronised(self):
+        """
+        Items created or updated in bulk are each synchronised with JWP by the scheduled task once
+        the transaction commits.
+
+        """
+        i1 = mpmodels.MediaItem.objects.get(id='empty')
+        i1.title = 'foo'
+        with mock.patch('django.db.transaction.on_commit') as on_commit, \
+                mock.patch('mediaplatform_jwp.tasks.update_items.delay') as delay:
+            delay.side_effect = tasks.update_items
+            created = mpmodels.MediaItem.objects.bulk_create_for_user(
+                None, [mpmodels.MediaItem(title='a'), mpmodels.MediaItem(title='b')])
+            mpmodels.MediaItem.objects.bulk_update_fields([i1], ['title'])
+
+            # Nothing is synchronised until the transaction commits.
+            self.assertEqual(on_commit.call_count, 2)
+            self.schedule_item_update.assert_not_called()
+            for call in on_commit.call_args_list:
+                call[0][0]()
+
+        delay.assert_has_calls([mock.call([item.id for item in created]), mock.call([i1.id])])
+        synchronised = {
+            call[0][0].id: call[0][0].title for call in self.schedule_item_update.call_args_list
+        }
+        self.assertEqual(synchronised, {created[0].id: 'a', created[1].id: 'b', i1.id: 'foo'})
@@ -1,6 +1,9 @@
 import datetime
 import secrets
+from unittest import mock
 
+import dateutil.parser
+from django.db import transaction
 from django.utils import timezone
 from django.test import TestCase
 import pytz
@@ -221,6 +224,35 @@ class SyncTestCase(TestCase):
         self.assertFalse(hasattr(i1_v2, 'sms'))
         self.assertEqual(legacymodels.MediaItem.objects.filter(id=1234).count(), 0)
 
+    def test_item_is_sms_derived(self):
+        """The is_sms_derived flag tracks the presence of an SMS media item."""
+        v1, = set_resources_and_sync([make_video(media_id='1234')])
+        self.assertTrue(mpmodels.MediaItem.objects.get(jwp__key=v1.key).is_sms_derived)
+
+        # Simulate a SMS delete
+        del v1['custom']['sms_media_id']
+        v1['updated'] += 1
+        set_resources_and_sync([v1])
+
+        self.assertFalse(mpmodels.MediaItem.objects.get(jwp__key=v1.key).is_sms_derived)
+
+    def test_item_is_sms_derived_after_sms_media_id_moves(self):
+        """
+        The is_sms_derived flag is cleared on an unchanged item whose SMS media item is re-pointed
+        at another item.
+
+        """
+        v1, = set_resources_and_sync([make_video(media_id='1234')])
+        i1 = mpmodels.MediaItem.objects.get(jwp__key=v1.key)
+        self.assertTrue(i1.is_sms_derived)
+
+        # A new video claims the SMS media id while the first video is unchanged.
+        v1, v2 = set_resources_and_sync([v1, make_video(media_id='1234')])
+        i2 = mpmodels.MediaItem.objects.get(jwp__key=v2.key)
+        self.assertEqual(legacymodels.MediaItem.objects.get(id=1234).item_id, i2.id)
+        self.assertFalse(mpmodels.MediaItem.objects.get(id=i1.id).is_sms_derived)
+        self.assertTrue(mpmodels.MediaItem.objects.get(id=i2.id).is_sms_derived)
+
     def test_item_update_with_modifiying_cached_resource(self):
         """
         A change up the updated field in the Cached resource should re-sync the video.
@@ -350,6 +382,7 @@ class SyncTestCase(TestCase):
         set_resources_and_sync(videos, channels)
         c1 = mpmodels.Channel.objects.get(jwp__key=channels[0].key)
         self.assertEqual(c1.sms.id, 2)
+        self.assertTrue(c1.is_sms_derived)
         self.assertEqual(legacymodels.Collection.objects.filter(id=2).count(), 1)
 
         # check the Playlist has SMS object
@@ -364,12 +397,51 @@ class SyncTestCase(TestCase):
         # SMS object should've been deleted
         c1_v2 = mpmodels.Channel.objects.get(jwp__key=channels[0].key)
         self.assertFalse(hasattr(c1_v2, 'sms'))
+        self.assertFalse(c1_v2.is_sms_derived)
         self.assertEqual(legacymodels.Collection.objects.filter(id=2).count(), 0)
 
         # check the Playlist doesn't have SMS object
         playlist = mpmodels.Playlist.objects.get(id=playlist.id)
         self.assertFalse(hasattr(playlist, 'sms'))
 
+    def test_unchanged_channel_not_updated(self):
+        """A channel is only updated if its JWP channel changes or all objects are updated."""
+        videos = [make_video(media_id='1')]
+        channels = [make_channel(title='test channel', media_ids=['1'], collection_id='2')]
+        set_resources_and_sync(videos, channels)
+        mpmodels.Channel.objects.filter(jwp__key=channels[0].key).update(title='changed')
+
+        set_resources_and_sync(videos, channels)
+        self.assertEqual(mpmodels.Channel.objects.get(jwp__key=channels[0].key).title, 'changed')
+
+        set_resources_and_sync(videos, channels, update_kwargs={'update_all_videos': True})
+        self.assertEqual(
+            mpmodels.Channel.objects.get(jwp__key=channels[0].key).title, 'test channel')
+
+        channels[0]['title'] = 'new title'
+        set_resources_and_sync(videos, channels)
+        self.assertEqual(mpmodels.Channel.objects.get(jwp__key=channels[0].key).title, 'new title')
+        playlist = mpmodels.Playlist.objects.get(sms__id=2)
+        self.assertEqual(playlist.title, 'new title')
+
+    def test_channel_updated_when_item_appears(self):
+        """A channel is updated if an item with one of its SMS media ids appears."""
+        videos = [make_video(media_id='1')]
+        channels = [make_channel(title='test channel', media_ids=['1', '2'], collection_id='3')]
+        set_resources_and_sync(videos, channels)
+        c1 = mpmodels.Channel.objects.get(jwp__key=channels[0].key)
+        self.assertEqual(c1.items.count(), 1)
+
+        videos.append(make_video(media_id='2'))
+        set_resources_and_sync(videos, channels)
+        self.assertEqual(c1.items.count(), 2)
+        playlist = mpmodels.Playlist.objects.get(sms__id=3)
+        self.assertEqual(playlist.media_items, [
+            mpmodels.MediaItem.objects.get(sms__id=1).id,
+            mpmodels.MediaItem.objects.get(sms__id=2).id,
+        ])
+        self.assertTrue(playlist.view_permission.is_public)
+
     def test_only_sms_created(self):
         """Only videos with SMS media ids are autocreated."""
         v1, v2 = make_video(media_id='1234'), make_video()
@@ -394,6 +466,17 @@ class SyncTestCase(TestCase):
         self.assertIsNotNone(i1)
         self.assertEqual(i1.title, 'testing')
 
+    def test_sync_is_published(self):
+        """A change in JWP video status is reflected in the item's publication state."""
+        v1 = make_video(media_id='1234', status='ready')
+        set_resources_and_sync([v1])
+        self.assertTrue(mpmodels.MediaItem.objects.get(jwp__key=v1.key).is_published)
+
+        v1['status'] = 'processing'
+        v1['updated'] += 1
+        set_resources_and_sync([v1])
+        self.assertFalse(mpmodels.MediaItem.objects.get(jwp__key=v1.key).is_published)
+
     def assert_attribute_sync(self, video_attr, model_attr=None, test_value='testing'):
         """
         Assert that an attribute on the video dict is correctly transferred to the underlying
@@ -405,6 +488,55 @@ class SyncTestCase(TestCase):
         self.assertEqual(
             test_value, getattr(mpmodels.MediaItem.objects.get(jwp__key=v1.key), model_attr))
 
+    def test_chunked_metadata_update_matches_per_object_update(self):
+        """
+        Updating metadata in chunks gives the same results as updating each item in turn.
+
+        """
+        now = timezone.now()
+        videos = set_resources_and_sync([
+            make_video(
+                media_id='1', acl=['USER_spqr1'], keywords=['a', 'b'], language='eng',
+                copyright='me'),
+            make_video(media_id='2', last_updated_at=now),
+            make_video(media_id='3'),
+            make_video(media_id='4', acl=['WORLD']),
+            make_video(media_id='5', downloadable=True, mediatype='video'),
+        ])
+
+        # Change each video in a different way.
+        videos[0]['title'] = 'new title'
+        videos[0]['custom']['sms_acl'] = 'acl:GROUP_1234,INST_botolph,CAM:'
+        del videos[1]['custom']['sms_media_id']
+        videos[2]['custom']['sms_media_id'] = 'media:30:'
+        del videos[3]['date']
+        videos[4]['custom']['sms_keywords'] = 'keywords: X |y:'
+        videos[4]['custom']['sms_last_updated_at'] = 'last_updated_at:{}:'.format(
+            (now + datetime.timedelta(seconds=20)).isoformat())
+        for video in videos:
+            video['updated'] += 1
+        set_resources(videos, 'video')
+
+        # Update each item in turn and then roll back the changes.
+        class Rollback(Exception):
+            pass
+
+        try:
+            with transaction.atomic():
+                for item in mpmodels.MediaItem.objects.all().select_related('view_permission'):
+                    update_item_per_object(item, CachedResource.videos.get(key=item.jwp.key).data)
+                expected_state = media_items_state()
+                raise Rollback()
+        except Rollback:
+            pass
+
+        with mock.patch('mediaplatform_jwp.sync._METADATA_CHUNK_SIZE', 2):
+            sync.update_related_models_from_cache()
+
+        self.assertEqual(media_items_state(), expected_state)
+        self.assertFalse(legacymodels.MediaItem.objects.filter(id=2).exists())
+        self.assertFalse(legacymodels.MediaItem.objects.filter(id=30).exists())
+
 
 def set_resources_and_sync(videos, channels=[], update_kwargs={}):
     """
@@ -418,6 +550,82 @@ def set_resources_and_sync(videos, channels=[], update_kwargs={}):
     return videos
 
 
+def media_items_state():
+    """
+    Return a list describing the synchronised metadata of all media items, their view permissions
+    and their SMS media items.
+
+    """
+    return [
+        (
+            item.id, item.title, item.description, item.type, item.downloadable,
+            item.published_at, item.duration, item.language, item.copyright, item.tags,
+            item.view_permission.crsids, item.view_permission.lookup_groups,
+            item.view_permission.lookup_insts, item.view_permission.is_public,
+            item.view_permission.is_signed_in,
+            item.sms.id if hasattr(item, 'sms') else None,
+            item.sms.last_updated_at if hasattr(item, 'sms') else None,
+        )
+        for item in mpmodels.MediaItem.objects.all().order_by('id')
+    ]
+
+
+def update_item_per_object(item, data):
+    """
+    Update a media item, its view permission and its SMS media item from the passed JWP video
+    resource one object at a time. This is a reference implementation against which the chunked
+    update in update_related_models_from_cache() is checked.
+
+    """
+    video = jwp.Video(data)
+    custom = video.get('custom', {})
+    max_tag_length = mpmodels.MediaItem._meta.get_field('tags').base_field.max_length
+    type_map = {
+        'video': mpmodels.MediaItem.VIDEO,
+        'audio': mpmodels.MediaItem.AUDIO,
+        'unknown': mpmodels.MediaItem.UNKNOWN,
+    }
+
+    item.title = sync._default_if_none(video.get('title'), '')
+    item.description = sync._default_if_none(video.get('description'), '')
+    item.type = type_map[sync._default_if_none(video.get('mediatype'), 'unknown')]
+    item.downloadable = 'True' == jwp.parse_custom_field(
+        'downloadable', custom.get('sms_downloadable', 'downloadable:False:'))
+    if video.get('date') is not None:
+        item.published_at = utc_timestamp_to_datetime(video['date'])
+    item.duration = sync._default_if_none(video.get('duration'), 0.)
+    item.language = jwp.parse_custom_field(
+        'language', custom.get('sms_language', 'language::'))[:3]
+    item.copyright = jwp.parse_custom_field(
+        'copyright', custom.get('sms_copyright', 'copyright::'))
+    item.tags = [
+        tag.strip().lower()[:max_tag_length]
+        for tag in jwp.parse_custom_field(
+            'keywords', custom.get('sms_keywords', 'keywords::')).split('|')
+        if tag.strip() != ''
+    ]
+
+    item.view_permission.reset()
+    sync._set_permission_from_acl(item.view_permission, video.acl)
+    item.view_permission.save()
+
+    if video.media_id is not None:
+        if hasattr(item, 'sms') and item.sms is not None:
+            sms_media_item = item.sms
+        else:
+            sms_media_item = legacymodels.MediaItem(id=video.media_id)
+        last_updated = jwp.parse_custom_field(
+            'last_updated_at', custom.get('sms_last_updated_at', 'last_updated_at::'))
+        sms_media_item.item = item
+        sms_media_item.last_updated_at = (
+            dateutil.parser.parse(last_updated) if last_updated != '' else None)
+        sms_media_item.save()
+    elif hasattr(item, 'sms') and item.sms is not None:
+        item.sms.delete()
+
+    item.save()
+
+
 def make_video(**kwargs):
     """
     Create a new video resource fixture. The following keyword arguments are supported:
@@ -438,6 +646,7 @@ def make_video(**kwargs):
     * created_by - CRSid of creator. maps to custom.sms_created_by defaults to not being present
     * last_updated_at - last update datetime on SMS. maps to custom.sms_last_updated_at
         defaults to not being present
+    * status - JWP video status. defaults to not being present
 
     """
 
@@ -478,6 +687,9 @@ def make_video(**kwargs):
         'mediatype': kwargs.get('mediatype', 'unknown'),
     }
 
+    if 'status' in kwargs:
+        video['status'] = kwargs['status']
+
     if len(custom) > 0:
         video['custom'] = custom
 
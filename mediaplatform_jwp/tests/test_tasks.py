@@ -0,0 +1,70 @@
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from jwplatform.errors import JWPlatformRateLimitExceededError
+
+from .. import tasks
+
+
+@override_settings(JWP_FETCH_RATE=1000, JWP_FETCH_WORKERS=3)
+class FetchListTest(TestCase):
+    RESOURCES_FIXTURE = [{'key': f'resource{index}'} for index in range(11)]
+
+    def setUp(self):
+        page_size_patcher = mock.patch('mediaplatform_jwp.tasks._FETCH_PAGE_SIZE', 2)
+        page_size_patcher.start()
+        self.addCleanup(page_size_patcher.stop)
+        self.offsets = []
+
+    def list_resources(self, result_offset=0, result_limit=1000, **kwargs):
+        self.offsets.append(result_offset)
+        return {
+            'resources': self.RESOURCES_FIXTURE[result_offset:result_offset + result_limit],
+            'total': len(self.RESOURCES_FIXTURE),
+        }
+
+    def test_pages_in_order(self):
+        """If the total is known, pages are fetched concurrently and yielded in order."""
+        resources = list(tasks._fetch_list(self.list_resources, 'resources'))
+        self.assertEqual(resources, self.RESOURCES_FIXTURE)
+        self.assertEqual(sorted(self.offsets), [0, 2, 4, 6, 8, 10, 11])
+
+    def test_unknown_total(self):
+        """If the total is not known, pages are fetched until an empty page is returned."""
+        def list_resources(**kwargs):
+            response = self.list_resources(**kwargs)
+            del response['total']
+            return response
+
+        resources = list(tasks._fetch_list(list_resources, 'resources'))
+        self.assertEqual(resources, self.RESOURCES_FIXTURE)
+        self.assertEqual(self.offsets, [0, 2, 4, 6, 8, 10, 11])
+
+    def test_incremental_fetch_sequential(self):
+        """An incremental video fetch requests no pages beyond the first older video."""
+        videos = [{'key': f'video{index}', 'updated': 100 - index} for index in range(11)]
+
+        def list_videos(result_offset=0, result_limit=1000, **kwargs):
+            self.offsets.append(result_offset)
+            return {
+                'videos': videos[result_offset:result_offset + result_limit],
+                'total': len(videos),
+            }
+
+        client = mock.Mock()
+        client.videos.list = list_videos
+        self.assertEqual(list(tasks.fetch_videos(client, updated_since=97)), videos[:4])
+        self.assertEqual(self.offsets, [0, 2, 4])
+
+    def test_rate_limit_retried(self):
+        """Rate limited requests are retried."""
+        responses = [JWPlatformRateLimitExceededError('Rate limit exceeded')]
+
+        def list_resources(**kwargs):
+            if len(responses) > 0:
+                raise responses.pop()
+            return self.list_resources(**kwargs)
+
+        with mock.patch('mediaplatform_jwp.tasks.random.randrange', return_value=0):
+            resources = list(tasks._fetch_list(list_resources, 'resources'))
+        self.assertEqual(resources, self.RESOURCES_FIXTURE)
@@ -1,5 +1,8 @@
 from automationlookup.models import UserLookup
 from django.conf import settings
+from django.utils.functional import SimpleLazyObject
+
+import mediaplatform.models as mpmodels
 
 
 def user_lookup_middleware(get_response):
@@ -20,3 +23,21 @@ def user_lookup_middleware(get_response):
         return get_response(request)
 
     return middleware
+
+
+def capabilities_middleware(get_response):
+
+    def middleware(request):
+        """
+        This middleware sets request.capabilities to the effective
+        capabilities of the request user. See
+        :py:func:`mediaplatform.models.capabilities_for_user`. The
+        capabilities are only computed if they are used.
+        """
+
+        request.capabilities = SimpleLazyObject(
+            lambda: mpmodels.capabilities_for_user(request.user))
+
+        return get_response(request)
+
+    return middleware
@@ -63,6 +63,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'mediawebapp.middleware.user_lookup_middleware',
+    'mediawebapp.middleware.capabilities_middleware',
     'reversion.middleware.RevisionMiddleware',
 ]
 
@@ -120,6 +121,19 @@ for name, value in os.environ.items():
     DATABASES['default'][name] = value
 
 
+#: Cache configuration. The API response cache, the search ranking cache and the cross-request
+#: identity cache are invalidated or refreshed by Celery tasks and so the caches they use must be
+#: shared by the web and Celery worker processes. The default cache is therefore stored in the
+#: database rather than in the memory of each process. The cache table is created by the
+#: mediaplatform migrations.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'mediawebapp_cache',
+    }
+}
+
+
 #: Password validation
 #:
 #: .. seealso:: https://docs.djangoproject.com/en/2.0/ref/settings/#auth-password-validators
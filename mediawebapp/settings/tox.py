@@ -48,3 +48,12 @@ LOGGING = None
 
 #: Do not synchronise items using the JWP API unless tests expect it
 JWP_SYNC_ITEMS = False
+
+#: Do not share resolved lookup identities between tests unless they expect it
+IDENTITY_CACHE_TTL = 0
+
+#: Do not cache API responses between tests unless they expect it
+API_RESPONSE_CACHE_TTL = 0
+
+#: Do not cache ranked search results between tests unless they expect it
+API_SEARCH_CACHE_TTL = 0
@@ -114,7 +114,7 @@ class PlaylistRSSView(apiviews.PlaylistMixin, generics.RetrieveAPIView):
         obj = super().get_object()
         obj.downloadable_media_items = (
             self.filter_media_item_qs(obj.ordered_media_item_queryset)
-            .downloadable_by_user(self.request.user)
+            .downloadable_by_user(self.capabilities)
         )
         return obj
 
@@ -134,7 +134,7 @@ class PlaylistJWPlayerConfigurationView(apiviews.PlaylistMixin, generics.Retriev
         items = (
             playlist.ordered_media_item_queryset
             .filter(jwp__isnull=False)
-            .viewable_by_user(self.request.user)
+            .viewable_by_user(self.capabilities)
         )
 
         # Annotate the playlist with the items.